@@ -6,6 +6,7 @@ django.setup()
 
 from channels.routing import ProtocolTypeRouter, URLRouter
 from django.core.asgi import get_asgi_application
+import backend.routing
 import chats.routing
 import notifications.routing
 from backend.middleware import JWTAuthMiddlewareStack
@@ -14,6 +15,7 @@ application = ProtocolTypeRouter({
     "http": get_asgi_application(),
     "websocket": JWTAuthMiddlewareStack(
         URLRouter(
+            backend.routing.websocket_urlpatterns +
             chats.routing.websocket_urlpatterns +
             notifications.routing.websocket_urlpatterns
             
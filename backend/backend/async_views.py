@@ -0,0 +1,145 @@
+"""Minimal async counterpart of DRF's ``APIView`` for hot read endpoints.
+
+DRF 3.14 only dispatches synchronously, so under ASGI every DRF view holds a
+sync thread for its whole duration. ``AsyncAPIView`` authenticates with the
+same JWT + cached user resolution, returns JSON shaped like the DRF views it
+replaces and keeps the event loop free while queries run.
+
+Django's async ORM (``acount``, ``aget``, ``async for``) runs every query on
+the request's single thread-sensitive thread, so independent sections are
+dispatched with ``run_in_worker`` (the ``http`` executor) instead and awaited
+together with ``asyncio.gather`` to actually overlap. When that executor is
+saturated the view answers 503 instead of queueing without bound.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from backend.auth import aget_token_user
+from backend.executors import ExecutorSaturated, run_in_executor
+
+
+def run_in_worker(func, *args, **kwargs):
+    """Run sync ORM/serializer work on the ``http`` executor, returning its connection afterwards."""
+    return run_in_executor("http", func, *args, **kwargs)
+
+
+class AuthenticationError(Exception):
+    """Carries the JSON body DRF would have returned for the 401."""
+
+    def __init__(self, detail):
+        super().__init__(detail)
+        self.detail = detail
+
+
+async def authenticate(request):
+    """Resolve the request's user from a Bearer token, falling back to the session."""
+    jwt_auth = JWTAuthentication()
+    header = jwt_auth.get_header(request)
+    raw_token = jwt_auth.get_raw_token(header) if header else None
+    if raw_token is None:
+        return await request.auser()
+
+    try:
+        validated_token = jwt_auth.get_validated_token(raw_token)
+    except InvalidToken as e:
+        raise AuthenticationError(e.detail)
+
+    try:
+        return await aget_token_user(validated_token)
+    except (InvalidToken, AuthenticationFailed) as e:
+        raise AuthenticationError(e.detail)
+
+
+class AsyncAPIView(View):
+    """Async JSON view with JWT auth. Set ``sync_view`` to serve other methods with a DRF view."""
+    authentication_required = True
+    sync_view = None
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Like DRF's APIView: token-authenticated requests carry no CSRF cookie
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        method = request.method.lower()
+        if self.sync_view is not None and not hasattr(self, method):
+            # Read it off the class so the view function is not bound to this instance
+            return await sync_to_async(type(self).sync_view)(request, *args, **kwargs)
+
+        try:
+            request.user = await authenticate(request)
+        except AuthenticationError as e:
+            return JsonResponse(e.detail, status=401)
+
+        if self.authentication_required and not request.user.is_authenticated:
+            return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except ExecutorSaturated:
+            return JsonResponse({"detail": "Server is busy, please retry shortly."}, status=503, headers={"Retry-After": "1"})
+
+
+class AsyncPageNumberPagination:
+    """``PageNumberPagination``-compatible paging: count and page rows load concurrently."""
+    page_query_param = "page"
+
+    def __init__(self, page_size=None):
+        self.page_size = page_size or settings.REST_FRAMEWORK["PAGE_SIZE"]
+
+    def get_page_number(self, request):
+        try:
+            page_number = int(request.GET.get(self.page_query_param, 1))
+        except (TypeError, ValueError):
+            return None
+        return page_number if page_number >= 1 else None
+
+    async def paginate(self, queryset, request):
+        """Return the page's rows and set ``count``, or return None for an invalid page."""
+        page_number = self.get_page_number(request)
+        if page_number is None:
+            return None
+        self.request = request
+        self.page_number = page_number
+        offset = (page_number - 1) * self.page_size
+
+        self.count, rows = await asyncio.gather(
+            queryset.acount(),
+            run_in_worker(lambda: list(queryset[offset:offset + self.page_size])),
+        )
+        if not rows and page_number > 1:
+            return None
+        return rows
+
+    def get_next_link(self):
+        if self.page_number * self.page_size >= self.count:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.page_query_param, self.page_number + 1)
+
+    def get_previous_link(self):
+        if self.page_number <= 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page_number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.page_number - 1)
+
+    def get_paginated_response(self, data):
+        return JsonResponse({
+            "count": self.count,
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+
+def invalid_page_response():
+    return JsonResponse({"detail": "Invalid page."}, status=404)
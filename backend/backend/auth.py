@@ -0,0 +1,145 @@
+"""Cached token -> user resolution shared by HTTP (DRF) and WebSocket auth.
+
+Access tokens are still verified on every request (signature and expiry,
+no I/O); only the user row is cached, keyed by the token's user id, for
+``AUTH_USER_CACHE_TTL`` seconds. The cached instance holds just the fields
+auth and permission checks need; ``password`` is deferred and loaded on
+first access (e.g. by ``check_password``). With ``CHECK_REVOKE_TOKEN`` on,
+the password's fingerprint is cached instead, so the revoke check needs no
+query either.
+
+Entries are dropped whenever the user is saved or deleted (see
+``users.signals``), so password and ``is_active`` changes apply at once.
+``QuerySet.update()`` sends no signals: code that changes users that way
+must call ``invalidate_cached_users`` with their ids, or the change only
+applies once the entries expire.
+"""
+import logging
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+logger = logging.getLogger("django")
+
+User = get_user_model()
+
+CACHED_USER_FIELDS = (
+    "id",
+    "username",
+    "email",
+    "first_name",
+    "last_name",
+    "is_active",
+    "is_staff",
+    "is_superuser",
+    "last_login",
+    "date_joined",
+)
+
+
+def user_cache_key(user_id) -> str:
+    return f"auth:user:{user_id}"
+
+
+def _load_user(user_id):
+    fields = {*CACHED_USER_FIELDS, api_settings.USER_ID_FIELD}
+    if api_settings.CHECK_REVOKE_TOKEN:
+        fields.add("password")
+    user = User.objects.only(*fields).filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+    if user is not None and api_settings.CHECK_REVOKE_TOKEN:
+        user._password_md5 = get_md5_hash_password(user.password)
+        # Keep the hash itself out of the cache; it is deferred again
+        del user.__dict__["password"]
+    return user
+
+
+def resolve_user(user_id):
+    """Return the user with ``user_id`` (cached), or None if it does not exist."""
+    key = user_cache_key(user_id)
+    try:
+        user = cache.get(key)
+    except Exception as e:
+        logger.error(f"Auth user cache read failed for user {user_id}: {e}")
+        return _load_user(user_id)
+    if user is None:
+        user = _load_user(user_id)
+        if user is not None:
+            try:
+                cache.set(key, user, settings.AUTH_USER_CACHE_TTL)
+            except Exception as e:
+                logger.error(f"Auth user cache write failed for user {user_id}: {e}")
+    return user
+
+
+async def aresolve_user(user_id):
+    """Async counterpart of ``resolve_user``; only hits the database on a miss."""
+    key = user_cache_key(user_id)
+    try:
+        user = await cache.aget(key)
+    except Exception as e:
+        logger.error(f"Auth user cache read failed for user {user_id}: {e}")
+        user = None
+    if user is not None:
+        return user
+
+    @database_sync_to_async
+    def load():
+        close_old_connections()
+        return resolve_user(user_id)
+
+    return await load()
+
+
+def invalidate_cached_user(user_id):
+    invalidate_cached_users([user_id])
+
+
+def invalidate_cached_users(user_ids):
+    """Drop the cached users with these ids (``USER_ID_FIELD`` values)."""
+    try:
+        cache.delete_many([user_cache_key(user_id) for user_id in user_ids])
+    except Exception as e:
+        logger.error(f"Auth user cache invalidation failed for users {list(user_ids)}: {e}")
+
+
+def token_user_id(validated_token):
+    try:
+        return validated_token[api_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken(_("Token contained no recognizable user identification"))
+
+
+def check_token_user(user, validated_token):
+    """Apply ``JWTAuthentication.get_user``'s checks to a resolved (possibly cached) user."""
+    if user is None:
+        raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+    if not user.is_active:
+        raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+    if api_settings.CHECK_REVOKE_TOKEN:
+        password_md5 = getattr(user, "_password_md5", None) or get_md5_hash_password(user.password)
+        if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != password_md5:
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+    return user
+
+
+async def aget_token_user(validated_token):
+    """Return the user ``validated_token`` authenticates, for async callers (WebSocket, async views)."""
+    user = await aresolve_user(token_user_id(validated_token))
+    return check_token_user(user, validated_token)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` that resolves the token's user through the cache."""
+
+    def get_user(self, validated_token):
+        return check_token_user(resolve_user(token_user_id(validated_token)), validated_token)
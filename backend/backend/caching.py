@@ -0,0 +1,113 @@
+"""Short-lived shared results with stampede protection.
+
+``cached_json`` / ``acached_json`` keep a JSON value in Redis for ``ttl``
+seconds. On a miss only one caller (per key, across all workers) computes it
+while holding a ``SET NX`` lock; concurrent callers poll for its result for up
+to ``wait`` seconds instead of all hitting the database at once, then compute
+themselves if it still hasn't appeared. If Redis is unavailable the value is
+simply computed.
+
+The lock holds a random token and is released with a compare-and-delete, so a
+holder whose ``lock_ttl`` ran out never deletes the lock a later caller took.
+"""
+import asyncio
+import json
+import logging
+import secrets
+import time
+
+from backend.redis_client import get_async_redis, get_async_script, get_redis
+
+logger = logging.getLogger("django")
+
+POLL_INTERVAL = 0.05
+
+# Delete the lock only if it still holds our token
+UNLOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _lock_key(key) -> str:
+    return f"{key}:lock"
+
+
+def cached_json(key, compute, ttl, lock_ttl=5, wait=1.0):
+    """Return the cached value for ``key``, computing it with ``compute()`` on a miss."""
+    try:
+        client = get_redis()
+        raw = client.get(key)
+        if raw is not None:
+            return json.loads(raw)
+        token = secrets.token_hex(16)
+        locked = client.set(_lock_key(key), token, nx=True, ex=lock_ttl)
+    except Exception as e:
+        logger.error(f"Result cache read failed for {key}: {e}")
+        return compute()
+
+    if not locked:
+        deadline = time.monotonic() + wait
+        while time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            try:
+                raw = client.get(key)
+            except Exception:
+                break
+            if raw is not None:
+                return json.loads(raw)
+        return compute()
+
+    try:
+        value = compute()
+        try:
+            client.set(key, json.dumps(value), ex=ttl)
+        except Exception as e:
+            logger.error(f"Result cache write failed for {key}: {e}")
+        return value
+    finally:
+        try:
+            client.register_script(UNLOCK_SCRIPT)(keys=[_lock_key(key)], args=[token])
+        except Exception as e:
+            logger.error(f"Result cache unlock failed for {key}: {e}")
+
+
+async def acached_json(key, compute, ttl, lock_ttl=5, wait=1.0):
+    """Async ``cached_json``; ``compute`` is an async callable."""
+    try:
+        client = get_async_redis()
+        raw = await client.get(key)
+        if raw is not None:
+            return json.loads(raw)
+        token = secrets.token_hex(16)
+        locked = await client.set(_lock_key(key), token, nx=True, ex=lock_ttl)
+    except Exception as e:
+        logger.error(f"Result cache read failed for {key}: {e}")
+        return await compute()
+
+    if not locked:
+        deadline = time.monotonic() + wait
+        while time.monotonic() < deadline:
+            await asyncio.sleep(POLL_INTERVAL)
+            try:
+                raw = await client.get(key)
+            except Exception:
+                break
+            if raw is not None:
+                return json.loads(raw)
+        return await compute()
+
+    try:
+        value = await compute()
+        try:
+            await client.set(key, json.dumps(value), ex=ttl)
+        except Exception as e:
+            logger.error(f"Result cache write failed for {key}: {e}")
+        return value
+    finally:
+        try:
+            await get_async_script(UNLOCK_SCRIPT)(keys=[_lock_key(key)], args=[token])
+        except Exception as e:
+            logger.error(f"Result cache unlock failed for {key}: {e}")
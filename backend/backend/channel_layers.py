@@ -0,0 +1,121 @@
+"""Channel layer sharded across several Redis nodes with a consistent-hash ring.
+
+``channels_redis`` already spreads channels and groups over multiple hosts,
+but it splits the ``crc32`` key space into ``len(hosts)`` equal ranges, so adding or
+removing a node reshuffles almost every group and live socket. This layer
+places each host on a ring of virtual nodes (ketama style), so a topology
+change only moves the keys owned by the node that changed.
+
+Group membership lives on the group's shard. Messages are queued on the
+shard that owns each recipient channel, so a ``group_send`` writes to every
+shard that holds a member of the group.
+"""
+import bisect
+import hashlib
+import logging
+import time
+
+from channels_redis.core import RedisChannelLayer
+
+logger = logging.getLogger("django")
+
+GROUP_SEND_SCRIPT = """
+local over_capacity = 0
+local current_time = ARGV[#ARGV - 1]
+local expiry = ARGV[#ARGV]
+for i=1,#KEYS do
+    if redis.call('ZCOUNT', KEYS[i], '-inf', '+inf') < tonumber(ARGV[i + #KEYS]) then
+        redis.call('ZADD', KEYS[i], current_time, ARGV[i])
+        redis.call('EXPIRE', KEYS[i], expiry)
+    else
+        over_capacity = over_capacity + 1
+    end
+end
+return over_capacity
+"""
+
+
+def host_label(host: dict) -> str:
+    """Stable name for a decoded ``hosts`` entry, independent of its list position."""
+    if "address" in host:
+        return str(host["address"])
+    if "master_name" in host:
+        return f"sentinel:{host['master_name']}"
+    return f"{host.get('host', 'localhost')}:{host.get('port', 6379)}/{host.get('db', 0)}"
+
+
+class HashRing:
+    """Map keys to node indexes with ``replicas`` virtual points per node."""
+
+    def __init__(self, labels, replicas=160):
+        ring = []
+        for index, label in enumerate(labels):
+            for replica in range(replicas):
+                ring.append((self.hash(f"{label}#{replica}"), index))
+        ring.sort()
+        self.points = [point for point, _index in ring]
+        self.nodes = [index for _point, index in ring]
+
+    @staticmethod
+    def hash(value) -> int:
+        if isinstance(value, str):
+            value = value.encode("utf8")
+        return int.from_bytes(hashlib.md5(value).digest()[:8], "big")
+
+    def get_node(self, value) -> int:
+        position = bisect.bisect(self.points, self.hash(value))
+        if position == len(self.points):
+            position = 0
+        return self.nodes[position]
+
+
+class ShardedRedisChannelLayer(RedisChannelLayer):
+    def __init__(self, hosts=None, replicas=160, **kwargs):
+        super().__init__(hosts=hosts, **kwargs)
+        self.ring = HashRing([host_label(host) for host in self.hosts], replicas=replicas)
+
+    def consistent_hash(self, value):
+        if self.ring_size == 1:
+            return 0
+        return self.ring.get_node(value)
+
+    async def group_send(self, group, message):
+        """Send a message to every member of the group, one script per shard.
+
+        Same semantics as the parent, except that expired messages are pruned
+        on the shard that owns each channel rather than on the group's shard.
+        """
+        assert self.require_valid_group_name(group), "Group name not valid"
+        key = self._group_key(group)
+        group_connection = self.connection(self.consistent_hash(group))
+        # Discard old channels based on group_expiry
+        await group_connection.zremrangebyscore(key, min=0, max=int(time.time()) - self.group_expiry)
+
+        channel_names = [x.decode("utf8") for x in await group_connection.zrange(key, 0, -1)]
+        (
+            connection_to_channel_keys,
+            channel_keys_to_message,
+            channel_keys_to_capacity,
+        ) = self._map_channel_keys_to_connection(channel_names, message)
+
+        for connection_index, channel_redis_keys in connection_to_channel_keys.items():
+            connection = self.connection(connection_index)
+
+            # Discard old messages based on expiry
+            pipe = connection.pipeline()
+            for channel_key in channel_redis_keys:
+                pipe.zremrangebyscore(channel_key, min=0, max=int(time.time()) - int(self.expiry))
+            await pipe.execute()
+
+            args = [channel_keys_to_message[channel_key] for channel_key in channel_redis_keys]
+            args += [channel_keys_to_capacity[channel_key] for channel_key in channel_redis_keys]
+            args += [time.time(), self.expiry]
+
+            channels_over_capacity = await connection.eval(
+                GROUP_SEND_SCRIPT, len(channel_redis_keys), *channel_redis_keys, *args
+            )
+            if channels_over_capacity > 0:
+                logger.info(
+                    f"{channels_over_capacity} of {len(channel_names)} channels over capacity "
+                    f"in group {group} on shard {connection_index}"
+                )
@@ -0,0 +1,207 @@
+"""Single multiplexed WebSocket per client.
+
+One ``/ws/`` connection authenticates once and carries every realtime stream
+as typed JSON frames. Clients subscribe to topics instead of opening a socket
+per stream:
+
+    {"type": "subscribe", "topic": "inbox", "since": 42}
+    {"type": "subscribe", "topic": "notifications"}
+    {"type": "subscribe", "topic": "thread", "thread_id": 7}
+    {"type": "unsubscribe", "topic": "thread", "thread_id": 7}
+    {"type": "chat.send", "thread_id": 7, "text": "hi"}
+    {"type": "mark_read", "thread_id": 7}
+    {"type": "presence_ping"}
+
+Every server frame carries a ``topic`` (``inbox``, ``notifications`` or
+``thread:<id>``) so the client can route it.
+"""
+import logging
+
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from backend.events import INBOX, NOTIFICATIONS, group_for
+from backend.executors import ExecutorSaturated
+from chats.consumers import (
+    SERVER_BUSY_MESSAGE,
+    ChatThreadMixin,
+    presence_connected,
+    presence_disconnected,
+    replay_missed_events,
+)
+
+logger = logging.getLogger("django")
+
+TOPIC_KINDS = {
+    "inbox": INBOX,
+    "notifications": NOTIFICATIONS,
+}
+
+
+def thread_topic(thread_id) -> str:
+    return f"thread:{thread_id}"
+
+
+class MultiplexConsumer(ChatThreadMixin, AsyncJsonWebsocketConsumer):
+    async def connect(self):
+        user = self.scope["user"]
+        if user.is_anonymous:
+            await self.close(code=4001)
+            return
+
+        # topic -> channel-layer group joined for it
+        self.subscriptions = {}
+        await self.load_sender(user)
+        await self.accept()
+        await presence_connected(self.channel_layer, user)
+
+    async def disconnect(self, close_code):
+        if not hasattr(self, "subscriptions"):
+            return
+        for group_name in self.subscriptions.values():
+            await self.channel_layer.group_discard(group_name, self.channel_name)
+        self.subscriptions = {}
+
+        try:
+            await presence_disconnected(self.channel_layer, self.scope["user"])
+        except Exception as e:
+            logger.error(f"MultiplexConsumer disconnect error: {str(e)}")
+
+    async def send_error(self, message, **extra):
+        await self.send_json({"type": "error", "message": message, **extra})
+
+    def get_thread_id(self, content):
+        try:
+            return int(content["thread_id"])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    async def receive_json(self, content, **kwargs):
+        try:
+            await self.handle_frame(content)
+        except ExecutorSaturated:
+            await self.send_error(SERVER_BUSY_MESSAGE, retry=True, frame=content.get("type"))
+
+    async def handle_frame(self, content):
+        user = self.scope["user"]
+        frame_type = content.get("type")
+
+        if frame_type == "subscribe":
+            await self.subscribe(user, content)
+        elif frame_type == "unsubscribe":
+            await self.unsubscribe(content)
+        elif frame_type == "chat.send":
+            thread_id = self.get_thread_id(content)
+            text = (content.get("text") or "").strip()
+            if thread_id is None or thread_topic(thread_id) not in self.subscriptions:
+                await self.send_error("Subscribe to the thread before sending.", thread_id=thread_id)
+            elif text:
+                await self.handle_chat_text(thread_id, user, text)
+        elif frame_type == "mark_read":
+            thread_id = self.get_thread_id(content)
+            if thread_id is None or thread_topic(thread_id) not in self.subscriptions:
+                await self.send_error("Subscribe to the thread before marking it read.", thread_id=thread_id)
+            else:
+                await self.handle_mark_read(thread_id, user)
+        elif frame_type == "presence_ping":
+            await self.handle_presence_ping(user)
+        else:
+            await self.send_error(f"Unknown frame type: {frame_type}")
+
+    async def subscribe(self, user, content):
+        topic = content.get("topic")
+
+        if topic == "thread":
+            thread_id = self.get_thread_id(content)
+            if thread_id is None:
+                await self.send_error("thread_id is required.", topic=topic)
+                return
+            if not await self.user_in_thread(thread_id, user):
+                await self.send_error("Not a member of this thread.", topic=thread_topic(thread_id))
+                return
+            topic = thread_topic(thread_id)
+            await self.join(topic, f"chat_{thread_id}")
+            await self.send_json({"type": "subscribed", "topic": topic})
+            await self.mark_messages_as_read(thread_id, user)
+            return
+
+        if topic not in TOPIC_KINDS:
+            await self.send_error(f"Unknown topic: {topic}", topic=topic)
+            return
+
+        kind = TOPIC_KINDS[topic]
+        await self.join(topic, group_for(kind, user.id))
+        await self.send_json({"type": "subscribed", "topic": topic})
+
+        # Resumable sync, same semantics as ?since= on the legacy sockets
+        since = content.get("since")
+        if since is not None:
+            try:
+                await replay_missed_events(self, user.id, kind, int(since), topic=topic)
+            except Exception as e:
+                logger.error(f"Event replay error for user {user.id} on {topic}: {e}")
+                await self.send_json({"type": "resync_required", "topic": topic})
+
+    async def unsubscribe(self, content):
+        topic = content.get("topic")
+        if topic == "thread":
+            thread_id = self.get_thread_id(content)
+            if thread_id is None:
+                await self.send_error("thread_id is required.", topic=topic)
+                return
+            topic = thread_topic(thread_id)
+
+        group_name = self.subscriptions.pop(topic, None)
+        if group_name:
+            await self.channel_layer.group_discard(group_name, self.channel_name)
+        await self.send_json({"type": "unsubscribed", "topic": topic})
+
+    async def join(self, topic, group_name):
+        if topic in self.subscriptions:
+            return
+        await self.channel_layer.group_add(group_name, self.channel_name)
+        self.subscriptions[topic] = group_name
+
+    # Thread room events
+
+    async def chat_message(self, event):
+        user = self.scope["user"]
+        await self.send_json({
+            **event,
+            "topic": thread_topic(event.get("thread_id")),
+            "isOwn": event.get("sender_id") == user.id,
+        })
+
+    async def read_receipt(self, event):
+        await self.send_json({
+            "type": "read_receipt",
+            "topic": thread_topic(event.get("thread_id")),
+            "message_id": event["message_id"],
+            "reader_id": event["reader_id"],
+        })
+
+    # Inbox events
+
+    async def send_inbox(self, event):
+        await self.send_json({**event, "topic": "inbox"})
+
+    async def chat_update(self, event):
+        await self.send_inbox(event)
+
+    async def mark_read_update(self, event):
+        await self.send_inbox(event)
+
+    async def presence_update(self, event):
+        await self.send_inbox(event)
+
+    async def chat_removed(self, event):
+        await self.send_inbox(event)
+
+    # Notification events
+
+    async def send_notification(self, event):
+        await self.send_json({
+            "type": "notification",
+            "topic": "notifications",
+            "notification": event["notification"],
+            "seq": event.get("seq"),
+        })
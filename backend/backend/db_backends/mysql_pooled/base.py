@@ -0,0 +1,73 @@
+"""MySQL backend that reuses connections from a bounded per-process pool.
+
+``ENGINE: "backend.db_backends.mysql_pooled"`` plus an optional ``POOL`` dict
+in the database settings (see ``backend.db_backends.pool.ConnectionPool``).
+Django "closing" a connection (end of request, ``close_old_connections``
+around ``database_sync_to_async`` calls) returns it to the pool, so keep
+``CONN_MAX_AGE = 0``: the pool, not the thread, owns connection lifetime.
+"""
+from django.db.backends.mysql import base as mysql_base
+
+from backend.db_backends.pool import ConnectionPool, PoolExhausted, get_pool
+
+Database = mysql_base.Database
+
+
+class DatabaseWrapper(mysql_base.DatabaseWrapper):
+    _pool_reused = False
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self._create_pool)
+
+    def _create_pool(self):
+        options = self.settings_dict.get("POOL", {})
+        conn_params = self.get_connection_params()
+        return ConnectionPool(
+            connect=lambda: super(DatabaseWrapper, self).get_new_connection(conn_params),
+            ping=lambda connection: connection.ping(),
+            close=lambda connection: connection.close(),
+            max_size=options.get("MAX_SIZE", 10),
+            timeout=options.get("TIMEOUT", 10.0),
+            recycle=options.get("RECYCLE", 1800),
+            health_check_interval=options.get("HEALTH_CHECK_INTERVAL", 30),
+        )
+
+    def get_new_connection(self, conn_params):
+        try:
+            connection, self._pool_reused = self.pool.acquire()
+        except PoolExhausted as e:
+            raise Database.OperationalError(str(e))
+        return connection
+
+    def init_connection_state(self):
+        # Session variables set on first use survive on pooled connections
+        if not self._pool_reused:
+            super().init_connection_state()
+
+    def _set_autocommit(self, autocommit):
+        # Skip the round trip when a reused connection is already in the right mode;
+        # a handle closed inside atomic() is left to fail the way stock Django does
+        if self.closed_in_transaction or self.connection.get_autocommit() != autocommit:
+            super()._set_autocommit(autocommit)
+
+    def _close(self):
+        if self.connection is None:
+            return
+        connection = self.connection
+        if self.in_atomic_block:
+            # Django keeps using its reference until the outermost atomic() exits,
+            # so close it as stock Django does and only give its slot back
+            try:
+                super()._close()
+            finally:
+                self.pool.forget(connection)
+            return
+        reusable = not self.errors_occurred
+        if reusable and not connection.get_autocommit():
+            # Closed inside a transaction: never hand out a connection with open work
+            try:
+                connection.rollback()
+            except Database.Error:
+                reusable = False
+        self.pool.release(connection, reusable=reusable)
@@ -0,0 +1,178 @@
+"""Thread-safe, bounded pool of DB-API connections.
+
+Used by the ``mysql_pooled`` backend: each Django ``DatabaseWrapper`` (one
+per thread, including the thread-sensitive ``sync_to_async`` executor)
+checks a connection out when it connects and returns it when Django closes
+it. At most ``max_size`` connections exist per process and alias, so
+``workers * max_size`` bounds the load on the server.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger("django")
+
+
+class PoolExhausted(Exception):
+    pass
+
+
+class PooledConnectionInfo:
+    __slots__ = ("created_at", "last_used")
+
+    def __init__(self):
+        self.created_at = self.last_used = time.monotonic()
+
+
+class ConnectionPool:
+    """Bounded LIFO pool.
+
+    - ``max_size``: connections open at once (idle + checked out)
+    - ``timeout``: seconds ``acquire`` waits for a free slot
+    - ``recycle``: seconds after which a connection is replaced (stay under
+      the server's ``wait_timeout``)
+    - ``health_check_interval``: an idle connection older than this is pinged
+      before it is handed out
+    """
+
+    def __init__(self, connect, ping, close, max_size=10, timeout=10.0, recycle=1800, health_check_interval=30):
+        self.connect = connect
+        self.ping = ping
+        self.close = close
+        self.max_size = max_size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.health_check_interval = health_check_interval
+
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.lock = threading.Lock()
+        self.idle = deque()
+        self.info = {}
+
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+        self.failed_health_checks = 0
+        self.timeouts = 0
+        self.waits = 0
+        self.wait_time = 0.0
+
+    def acquire(self):
+        """Return ``(connection, reused)``; raise ``PoolExhausted`` after ``timeout``."""
+        if not self.slots.acquire(blocking=False):
+            started = time.monotonic()
+            acquired = self.slots.acquire(timeout=self.timeout)
+            with self.lock:
+                self.waits += 1
+                self.wait_time += time.monotonic() - started
+                if not acquired:
+                    self.timeouts += 1
+            if not acquired:
+                raise PoolExhausted(f"No database connection available within {self.timeout}s (max_size={self.max_size})")
+
+        try:
+            while True:
+                with self.lock:
+                    connection = self.idle.pop() if self.idle else None
+                if connection is None:
+                    break
+                if self.check(connection):
+                    self.info[id(connection)].last_used = time.monotonic()
+                    with self.lock:
+                        self.reused += 1
+                    return connection, True
+                self.discard(connection)
+
+            connection = self.connect()
+            self.info[id(connection)] = PooledConnectionInfo()
+            with self.lock:
+                self.created += 1
+            return connection, False
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def check(self, connection) -> bool:
+        info = self.info[id(connection)]
+        now = time.monotonic()
+        if now - info.created_at >= self.recycle:
+            return False
+        if now - info.last_used >= self.health_check_interval:
+            try:
+                self.ping(connection)
+            except Exception as e:
+                with self.lock:
+                    self.failed_health_checks += 1
+                logger.warning(f"Pooled database connection failed health check: {e}")
+                return False
+        return True
+
+    def release(self, connection, reusable=True):
+        """Return a checked-out connection; it is closed instead if not ``reusable``."""
+        try:
+            if reusable and id(connection) in self.info:
+                self.info[id(connection)].last_used = time.monotonic()
+                with self.lock:
+                    self.idle.append(connection)
+            else:
+                self.discard(connection)
+        finally:
+            self.slots.release()
+
+    def forget(self, connection):
+        """Give up a checked-out connection its holder closes itself; frees its slot."""
+        self.info.pop(id(connection), None)
+        with self.lock:
+            self.discarded += 1
+        self.slots.release()
+
+    def discard(self, connection):
+        self.info.pop(id(connection), None)
+        with self.lock:
+            self.discarded += 1
+        try:
+            self.close(connection)
+        except Exception:
+            pass
+
+    def metrics(self) -> dict:
+        with self.lock:
+            idle = len(self.idle)
+        size = len(self.info)
+        return {
+            "max_size": self.max_size,
+            "size": size,
+            "idle": idle,
+            "in_use": size - idle,
+            "created": self.created,
+            "reused": self.reused,
+            "discarded": self.discarded,
+            "failed_health_checks": self.failed_health_checks,
+            "waits": self.waits,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(self.wait_time / self.waits * 1000, 2) if self.waits else 0.0,
+        }
+
+
+# (pid, alias) -> ConnectionPool; keyed by pid so forked workers never share sockets
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, factory):
+    key = (os.getpid(), alias)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = factory()
+    return pool
+
+
+def get_pool_metrics() -> dict:
+    """Metrics of every pool in this process, by database alias."""
+    pid = os.getpid()
+    return {alias: pool.metrics() for (pool_pid, alias), pool in list(_pools.items()) if pool_pid == pid}
@@ -0,0 +1,133 @@
+"""Read-replica routing with read-your-writes stickiness.
+
+Safe-method (GET/HEAD/OPTIONS) requests to views or DRF actions marked with
+``@replica_reads`` read from a random ``DATABASE_REPLICAS`` alias; everything
+else uses ``default``.
+Once a request writes (an unsafe method, or any write through the router),
+the response sets a short-lived pin cookie and that client's reads stay on
+the primary for ``REPLICA_PIN_SECONDS``, so users always see their own
+writes despite replication lag. Within a request, reads after a write also
+go to the primary.
+"""
+import contextvars
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.urls import Resolver404, resolve
+
+PIN_COOKIE = "db_pin"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class RoutingState:
+    __slots__ = ("use_replica", "wrote")
+
+    def __init__(self):
+        self.use_replica = False
+        self.wrote = False
+
+
+_state = contextvars.ContextVar("db_routing_state", default=None)
+
+
+def replica_reads(view):
+    """Mark a view class, view method or DRF action as safe to read from a replica."""
+    view.replica_reads = True
+    return view
+
+
+def is_replica_view(view_func, method) -> bool:
+    # DRF views expose their class as ``cls``, plain Django views as ``view_class``
+    cls = getattr(view_func, "cls", None) or getattr(view_func, "view_class", None)
+    if cls is None:
+        return getattr(view_func, "replica_reads", False)
+    actions = getattr(view_func, "actions", None)
+    handler_name = actions.get(method.lower()) if actions else method.lower()
+    handler = getattr(cls, handler_name or "", None)
+    return getattr(cls, "replica_reads", False) or getattr(handler, "replica_reads", False)
+
+
+def is_pinned(request) -> bool:
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        replicas = settings.DATABASE_REPLICAS
+        if state is None or not state.use_replica or state.wrote or not replicas:
+            return "default"
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {"default", *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
+
+
+class ReplicaRoutingMiddleware:
+    """Set up per-request routing state. Works in both sync and async stacks."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self.get_state(request)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.pin(request, response, state)
+
+    async def __acall__(self, request):
+        state = self.get_state(request)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.pin(request, response, state)
+
+    def get_state(self, request):
+        state = RoutingState()
+        if request.method in SAFE_METHODS and not is_pinned(request):
+            try:
+                match = resolve(request.path_info, getattr(request, "urlconf", None))
+            except Resolver404:
+                match = None
+            state.use_replica = match is not None and is_replica_view(match.func, request.method)
+        return state
+
+    def pin(self, request, response, state):
+        if state.wrote or request.method not in SAFE_METHODS:
+            pin_seconds = settings.REPLICA_PIN_SECONDS
+            response.set_cookie(
+                PIN_COOKIE,
+                str(int(time.time() + pin_seconds) + 1),
+                max_age=pin_seconds + 1,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
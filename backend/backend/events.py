@@ -0,0 +1,149 @@
+"""Per-user realtime event log for resumable WebSocket sync.
+
+Every event pushed to a user (``chat_update``, ``mark_read_update``,
+``presence_update``, ``chat_removed``, notifications) is appended to a capped
+Redis Stream ``events:<user_id>`` with a per-user, monotonically increasing
+sequence number, then delivered to the user's channel-layer group with that
+``seq`` attached. A client that reconnects with ``?since=<seq>`` gets only the
+events it missed, or a ``resync_required`` frame when the gap was trimmed.
+
+Events are appended before they are sent live, so a reconnecting client may
+see an event both in the replay and live; clients dedupe on ``seq``.
+
+The stream expires ``EVENT_STREAM_TTL`` after the user's last event, but the
+counter ``events:seq:<user_id>`` deliberately never expires. If it did, seq
+numbers would restart at 1, and a client still holding a higher ``since``
+would later be "caught up" with events numbered after it while silently
+missing everything from the restart. Keeping the counter costs one integer
+per user. If a counter is lost anyway (flush, failover), ``since`` ends up
+ahead of it and the client is sent ``resync_required``.
+"""
+import json
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from backend.redis_client import get_redis, get_async_redis, get_async_script
+
+logger = logging.getLogger("django")
+
+# Event kinds and the channel-layer group each one is delivered to
+INBOX = "inbox"
+NOTIFICATIONS = "notifications"
+
+GROUPS = {
+    INBOX: "conversations_{user_id}",
+    NOTIFICATIONS: "user_{user_id}",
+}
+
+# KEYS: stream, sequence counter. ARGV: maxlen, ttl, kind, event json.
+# Stream ids are "<seq>-0" so entries can be addressed by sequence number.
+# Only the stream gets a TTL; the counter must persist (see module docstring).
+APPEND_SCRIPT = """
+local seq = redis.call('INCR', KEYS[2])
+redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[1], seq .. '-0', 'kind', ARGV[3], 'event', ARGV[4])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return seq
+"""
+
+
+def _stream_key(user_id: int) -> str:
+    return f"events:{user_id}"
+
+
+def _seq_key(user_id: int) -> str:
+    return f"events:seq:{user_id}"
+
+
+def group_for(kind: str, user_id: int) -> str:
+    return GROUPS[kind].format(user_id=user_id)
+
+
+def _append_args(user_id, kind, event):
+    keys = [_stream_key(user_id), _seq_key(user_id)]
+    args = [settings.EVENT_STREAM_MAXLEN, settings.EVENT_STREAM_TTL, kind, json.dumps(event)]
+    return keys, args
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _parse_entries(entries, kind):
+    events = []
+    for entry_id, fields in entries:
+        fields = {_decode(k): _decode(v) for k, v in fields.items()}
+        if kind and fields.get("kind") != kind:
+            continue
+        event = json.loads(fields["event"])
+        event["seq"] = int(_decode(entry_id).split("-")[0])
+        events.append(event)
+    return events
+
+
+def _first_seq(entries):
+    if not entries:
+        return None
+    return int(_decode(entries[0][0]).split("-")[0])
+
+
+def _gap_available(head, current_seq, since):
+    """Return True if every event after ``since`` is still in the stream."""
+    if since > current_seq:
+        # The sequence counter was reset; the client's position is meaningless
+        return False
+    if since == current_seq:
+        return True
+    first = _first_seq(head)
+    return first is not None and first <= since + 1
+
+
+def publish_user_event(user_id: int, kind: str, event: dict, channel_layer=None) -> int | None:
+    """Append ``event`` to the user's log and deliver it live. Returns its seq."""
+    seq = None
+    try:
+        keys, args = _append_args(user_id, kind, event)
+        seq = int(get_redis().register_script(APPEND_SCRIPT)(keys=keys, args=args))
+        event = {**event, "seq": seq}
+    except Exception as e:
+        logger.error(f"Failed to append {event.get('type')} to event log of user {user_id}: {e}")
+
+    channel_layer = channel_layer or get_channel_layer()
+    async_to_sync(channel_layer.group_send)(group_for(kind, user_id), event)
+    return seq
+
+
+async def apublish_user_event(user_id: int, kind: str, event: dict, channel_layer=None) -> int | None:
+    """Async counterpart of ``publish_user_event`` for consumers."""
+    seq = None
+    try:
+        keys, args = _append_args(user_id, kind, event)
+        seq = int(await get_async_script(APPEND_SCRIPT)(keys=keys, args=args))
+        event = {**event, "seq": seq}
+    except Exception as e:
+        logger.error(f"Failed to append {event.get('type')} to event log of user {user_id}: {e}")
+
+    channel_layer = channel_layer or get_channel_layer()
+    await channel_layer.group_send(group_for(kind, user_id), event)
+    return seq
+
+
+async def aread_events_since(user_id: int, since: int, kind: str | None = None, limit: int | None = None):
+    """Return ``(events, current_seq)`` for events after ``since``.
+
+    ``events`` is None when part of the gap is no longer in the stream, in
+    which case the client must do a full resync.
+    """
+    redis = get_async_redis()
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.get(_seq_key(user_id))
+        pipe.xrange(_stream_key(user_id), "-", "+", count=1)
+        pipe.xrange(_stream_key(user_id), f"{since + 1}-0", "+", count=limit)
+        current_seq, head, entries = await pipe.execute()
+
+    current_seq = int(current_seq or 0)
+    if not _gap_available(head, current_seq, since):
+        return None, current_seq
+    return _parse_entries(entries, kind), current_seq
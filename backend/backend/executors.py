@@ -0,0 +1,206 @@
+"""Bounded, instrumented thread pools for sync (ORM) work run off the caller's thread.
+
+asgiref's ``sync_to_async`` runs everything thread-sensitive on one shared
+executor whose size and backlog are invisible. Here each workload class
+(``EXECUTORS`` setting, e.g. ``chat`` for consumer persistence and ``http``
+for async views) gets its own pool with a fixed number of workers and a
+bounded queue:
+
+    @managed_sync_to_async("chat")
+    def save_message(...): ...
+
+    rows = await run_in_executor("http", load_rows, query)
+    users, tags = run_concurrently("http", (load_users, query), (load_tags, query))
+
+When a pool's workers are busy and its queue is full, new calls raise
+``ExecutorSaturated`` instead of piling up; callers turn that into a 503 or
+an error frame. Calls behave like ``database_sync_to_async``: stale
+connections are closed around each call and context variables (e.g. replica
+routing state) carry over into the worker thread.
+"""
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections
+
+logger = logging.getLogger("django")
+
+
+class ExecutorSaturated(Exception):
+    pass
+
+
+class ManagedExecutor:
+    """``ThreadPoolExecutor`` with a bounded queue and wait-time metrics.
+
+    - ``max_workers``: calls running at once
+    - ``max_queue``: calls allowed to wait for a worker before new ones are rejected
+    """
+
+    def __init__(self, name, max_workers=8, max_queue=100):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"executor-{name}")
+        self.lock = threading.Lock()
+
+        self.queued = 0
+        self.active = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.run_time = 0.0
+
+    def submit(self, func, *args, **kwargs):
+        """Schedule ``func``; raise ``ExecutorSaturated`` when workers and queue are full."""
+        with self.lock:
+            if self.queued + self.active >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise ExecutorSaturated(
+                    f"Executor '{self.name}' is saturated ({self.active} running, {self.queued} queued)"
+                )
+            self.queued += 1
+            self.submitted += 1
+        enqueued_at = time.monotonic()
+
+        def run():
+            started_at = time.monotonic()
+            wait = started_at - enqueued_at
+            with self.lock:
+                self.queued -= 1
+                self.active += 1
+                self.wait_time += wait
+                self.max_wait = max(self.max_wait, wait)
+            failed = False
+            try:
+                return func(*args, **kwargs)
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                with self.lock:
+                    self.active -= 1
+                    self.completed += 1
+                    self.failed += failed
+                    self.run_time += time.monotonic() - started_at
+
+        try:
+            future = self.executor.submit(run)
+        except BaseException:
+            with self.lock:
+                self.queued -= 1
+            raise
+        # A caller that gives up before a worker picks the call up cancels it, so ``run`` never starts
+        future.add_done_callback(self._forget_cancelled)
+        return future
+
+    def _forget_cancelled(self, future):
+        if future.cancelled():
+            with self.lock:
+                self.queued -= 1
+
+    def metrics(self) -> dict:
+        with self.lock:
+            started = self.submitted - self.queued
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "active": self.active,
+                "queue_depth": self.queued,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(self.wait_time / started * 1000, 2) if started else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 2),
+                "avg_run_ms": round(self.run_time / self.completed * 1000, 2) if self.completed else 0.0,
+            }
+
+
+# (pid, workload) -> ManagedExecutor; keyed by pid because worker threads do not survive a fork
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(workload) -> ManagedExecutor:
+    key = (os.getpid(), workload)
+    executor = _executors.get(key)
+    if executor is None:
+        with _executors_lock:
+            executor = _executors.get(key)
+            if executor is None:
+                try:
+                    options = settings.EXECUTORS[workload]
+                except KeyError:
+                    raise ImproperlyConfigured(f"No executor configured for workload '{workload}' in EXECUTORS")
+                executor = _executors[key] = ManagedExecutor(
+                    workload,
+                    max_workers=options.get("MAX_WORKERS", 8),
+                    max_queue=options.get("MAX_QUEUE", 100),
+                )
+    return executor
+
+
+def get_executor_metrics() -> dict:
+    """Metrics of every executor started in this process, by workload."""
+    pid = os.getpid()
+    return {workload: executor.metrics() for (executor_pid, workload), executor in list(_executors.items()) if executor_pid == pid}
+
+
+def submit(workload, func, *args, **kwargs):
+    """Schedule ``func(*args, **kwargs)`` on the ``workload`` pool; return its ``concurrent.futures.Future``."""
+    def call():
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    try:
+        return get_executor(workload).submit(contextvars.copy_context().run, call)
+    except ExecutorSaturated as e:
+        logger.warning(f"Shedding load: {e}")
+        raise
+
+
+async def run_in_executor(workload, func, *args, **kwargs):
+    """Await ``func(*args, **kwargs)`` on the ``workload`` pool."""
+    return await asyncio.wrap_future(submit(workload, func, *args, **kwargs))
+
+
+def run_concurrently(workload, *calls):
+    """Run ``(func, *args)`` calls on the ``workload`` pool from sync code; return results in order.
+
+    Calls the pool can't take right now run inline on the calling thread instead.
+    """
+    futures = []
+    for func, *args in calls:
+        try:
+            futures.append(submit(workload, func, *args))
+        except ExecutorSaturated:
+            futures.append(None)
+    return [
+        future.result() if future is not None else func(*args)
+        for future, (func, *args) in zip(futures, calls)
+    ]
+
+
+def managed_sync_to_async(workload):
+    """Decorator form of ``run_in_executor`` for sync functions and methods."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await run_in_executor(workload, func, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,33 +1,25 @@
 from channels.auth import AuthMiddlewareStack
-from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
-from django.db import close_old_connections
 from rest_framework_simplejwt.tokens import AccessToken
-from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
 from urllib.parse import parse_qs
-from django.contrib.auth import get_user_model
+from backend.auth import aget_token_user
 import logging
 
 # Setup logger
 logger = logging.getLogger('django')
 
-User = get_user_model()
-
-@database_sync_to_async
-def get_user_from_token(token):
+async def get_user_from_token(token):
     try:
         if not token:
             return AnonymousUser()
-            
-        close_old_connections()
-        access_token = AccessToken(token)
-        # Try to get user_id from the token, falling back to 'sub' which is the default field
-        # for user ID in JWT tokens
-        user_id = access_token.get("user_id", access_token.get("sub"))
-        if not user_id:
-            return AnonymousUser()
-        return User.objects.get(id=user_id)
-    except (TokenError, User.DoesNotExist, KeyError) as e:
+
+        # Same user checks as HTTP auth, through the shared cache; only hits the database on a miss
+        return await aget_token_user(AccessToken(token))
+    except AuthenticationFailed as e:
+        logger.error(f"Authentication error: {e.detail}")
+        return AnonymousUser()
+    except (TokenError, InvalidToken) as e:
         logger.error(f"Authentication error: {str(e)}")
         return AnonymousUser()
     except Exception as e:
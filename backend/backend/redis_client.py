@@ -0,0 +1,53 @@
+"""Shared Redis clients for realtime features (presence, per-user event log).
+
+``get_redis()`` returns the blocking client behind the "default" cache, for
+views, signals and management commands. ``get_async_redis()`` returns a pooled
+``redis.asyncio`` client for consumers, so they never block the event loop.
+Both point at the same database. When ``settings.FAKE_REDIS_SERVER`` is set
+(``backend.settings_local``), both talk to that in-process fake server instead.
+"""
+import asyncio
+import weakref
+
+import redis.asyncio as aioredis
+from django.conf import settings
+from django_redis import get_redis_connection
+
+# One asyncio client (and connection pool) per event loop: asyncio connections
+# can't be shared across loops, and uvicorn runs one loop per worker.
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aioredis.Redis]" = weakref.WeakKeyDictionary()
+_async_scripts: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = weakref.WeakKeyDictionary()
+
+
+def get_redis():
+    return get_redis_connection("default")
+
+
+def get_async_redis() -> aioredis.Redis:
+    """Return the pooled asyncio Redis client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None and getattr(settings, "FAKE_REDIS_SERVER", None) is not None:
+        import fakeredis
+
+        client = _async_clients[loop] = fakeredis.FakeAsyncRedis.from_url(
+            settings.REDIS_ASYNC_URL, server=settings.FAKE_REDIS_SERVER
+        )
+    if client is None:
+        # Blocking pool: callers wait for a free connection instead of erroring out
+        pool = aioredis.BlockingConnectionPool.from_url(
+            settings.REDIS_ASYNC_URL,
+            max_connections=settings.REDIS_ASYNC_MAX_CONNECTIONS,
+            timeout=5,
+        )
+        client = _async_clients[loop] = aioredis.Redis(connection_pool=pool)
+    return client
+
+
+def get_async_script(script: str):
+    """Return ``script`` registered on the running loop's asyncio client (cached)."""
+    loop = asyncio.get_running_loop()
+    scripts = _async_scripts.setdefault(loop, {})
+    if script not in scripts:
+        scripts[script] = get_async_redis().register_script(script)
+    return scripts[script]
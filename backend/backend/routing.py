@@ -0,0 +1,7 @@
+from django.urls import re_path
+from .consumers import MultiplexConsumer
+
+websocket_urlpatterns = [
+    # Single multiplexed socket; the per-stream endpoints below remain for older clients
+    re_path(r'^ws/?$', MultiplexConsumer.as_asgi()),
+]
@@ -67,12 +67,13 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'backend.db_router.ReplicaRoutingMiddleware',
 ]
 
 # REST Framework settings
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [  
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "backend.auth.CachedJWTAuthentication",
         "rest_framework.authentication.SessionAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
@@ -83,6 +84,29 @@ REST_FRAMEWORK = {
     
 }
 
+# Serve feed, explore, the conversation list and search with async views (backend.urls)
+ASYNC_READ_VIEWS = os.environ.get('ASYNC_READ_VIEWS', 'True') == 'True'
+
+# Thread pools for sync work called from async code (backend.executors), per workload.
+# Every worker may hold a DB connection, so keep the sum of MAX_WORKERS under DB_POOL_MAX_SIZE.
+EXECUTORS = {
+    # Chat persistence and lookups from the WebSocket consumers
+    'chat': {
+        'MAX_WORKERS': int(os.environ.get('EXECUTOR_CHAT_WORKERS', 8)),
+        'MAX_QUEUE': int(os.environ.get('EXECUTOR_CHAT_QUEUE', 200)),
+    },
+    # Query and serializer sections of the async HTTP views
+    'http': {
+        'MAX_WORKERS': int(os.environ.get('EXECUTOR_HTTP_WORKERS', 8)),
+        'MAX_QUEUE': int(os.environ.get('EXECUTOR_HTTP_QUEUE', 100)),
+    },
+    # Deferred writes (e.g. search history); one worker applies them in submission order
+    'background': {
+        'MAX_WORKERS': 1,
+        'MAX_QUEUE': int(os.environ.get('EXECUTOR_BACKGROUND_QUEUE', 1000)),
+    },
+}
+
 # Add CORS settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost",
@@ -108,11 +132,18 @@ ROOT_URLCONF = 'backend.urls'
 # ASGI configuration
 ASGI_APPLICATION = 'backend.asgi.application'
 # Channels settings
+# Comma-separated Redis URLs; channels and groups are consistently hashed across them
+CHANNEL_REDIS_HOSTS = [
+    host.strip()
+    for host in os.environ.get("CHANNEL_REDIS_HOSTS", "redis://redis:6379/0").split(",")
+    if host.strip()
+]
+
 CHANNEL_LAYERS = {
     "default": {
-        "BACKEND": "channels_redis.core.RedisChannelLayer",
+        "BACKEND": "backend.channel_layers.ShardedRedisChannelLayer",
         "CONFIG": {
-            "hosts": [("redis", 6379)],
+            "hosts": CHANNEL_REDIS_HOSTS,
         },
     },
 }
@@ -131,6 +162,16 @@ CACHES = {
 # Presence TTL (seconds). Used to expire presence counters when a user goes offline.
 PRESENCE_TTL = int(os.environ.get("PRESENCE_TTL", 120))
 
+# Redis used by asyncio callers (backend.redis_client.get_async_redis). Must point at
+# the same database as the "default" cache so sync and async callers share keys.
+REDIS_ASYNC_URL = os.environ.get("REDIS_ASYNC_URL", CACHES["default"]["LOCATION"])
+REDIS_ASYNC_MAX_CONNECTIONS = int(os.environ.get("REDIS_ASYNC_MAX_CONNECTIONS", 50))
+
+# Per-user realtime event log (backend.events): entries kept per user and how long
+# an idle user's stream survives. Clients further behind than this get a full resync.
+EVENT_STREAM_MAXLEN = int(os.environ.get("EVENT_STREAM_MAXLEN", 500))
+EVENT_STREAM_TTL = int(os.environ.get("EVENT_STREAM_TTL", 7 * 24 * 3600))
+
 
 TEMPLATES = [
     {
@@ -155,7 +196,7 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': os.environ.get('DB_ENGINE', 'django.db.backends.mysql'),
+        'ENGINE': os.environ.get('DB_ENGINE', 'backend.db_backends.mysql_pooled'),
         'NAME': os.environ.get('DB_NAME', 'instagram_clone'),
         'USER': os.environ.get('DB_USER', 'root'),
         'PASSWORD': os.environ.get('DB_PASSWORD', ''),
@@ -165,9 +206,52 @@ DATABASES = {
             'charset': 'utf8mb4',
             'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
         },
+        # Closing returns connections to the pool; the pool owns their lifetime
+        'CONN_MAX_AGE': 0,
+        # Per worker process: keep workers * MAX_SIZE below MySQL's max_connections (151 by default)
+        'POOL': {
+            'MAX_SIZE': int(os.environ.get('DB_POOL_MAX_SIZE', 20)),
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            'RECYCLE': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+            'HEALTH_CHECK_INTERVAL': int(os.environ.get('DB_POOL_HEALTH_CHECK_INTERVAL', 30)),
+        },
     }
 }
 
+# Read replicas: comma-separated "host[:port]" list, same credentials as the primary.
+# Views marked @replica_reads read from them (see backend.db_router).
+DATABASE_REPLICAS = []
+for _index, _host in enumerate(h.strip() for h in os.environ.get('DB_REPLICA_HOSTS', '').split(',') if h.strip()):
+    _name, _, _port = _host.partition(':')
+    DATABASES[f'replica_{_index}'] = {
+        **DATABASES['default'],
+        'HOST': _name,
+        'PORT': _port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{_index}')
+
+DATABASE_ROUTERS = ['backend.db_router.PrimaryReplicaRouter']
+
+# Seconds a client's reads stay on the primary after it writes (read-your-writes)
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 5))
+
+# Seconds search/all results for a query are shared between requests (typeahead repeats prefixes)
+SEARCH_RESULTS_CACHE_TTL = int(os.environ.get('SEARCH_RESULTS_CACHE_TTL', 5))
+
+# Recent searches (search.recent): entries shown in the drawer, entries kept per user in Redis,
+# and seconds an idle user's list stays cached before it is reloaded from SearchHistory
+RECENT_SEARCHES_LIMIT = 5
+RECENT_SEARCHES_CAP = int(os.environ.get('RECENT_SEARCHES_CAP', 20))
+RECENT_SEARCHES_TTL = int(os.environ.get('RECENT_SEARCHES_TTL', 7 * 24 * 3600))
+
+# Composer typeahead (search.typeahead): viewers whose follow-graph index each process keeps, and its max age in seconds
+TYPEAHEAD_INDEX_SIZE = int(os.environ.get('TYPEAHEAD_INDEX_SIZE', 1000))
+TYPEAHEAD_INDEX_TTL = int(os.environ.get('TYPEAHEAD_INDEX_TTL', 300))
+
+# Caption search (posts.search): a post this many days old ranks at half its text relevance
+CAPTION_SEARCH_DECAY_DAYS = float(os.environ.get('CAPTION_SEARCH_DECAY_DAYS', 30))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -203,6 +287,9 @@ USE_TZ = True
 # JWT Settings
 from datetime import timedelta
 
+# Seconds a resolved token user stays cached (backend.auth); dropped on user save/delete
+AUTH_USER_CACHE_TTL = int(os.environ.get("AUTH_USER_CACHE_TTL", 60))
+
 SIMPLE_JWT = {
     "AUTH_HEADER_TYPES": ("Bearer",),
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60),
@@ -0,0 +1,52 @@
+"""Self-contained settings for tests and benchmarks on a single machine.
+
+Usage: ``DJANGO_SETTINGS_MODULE=backend.settings_local``
+
+No MySQL or Redis is needed:
+- the channel layer is Channels' in-memory layer (one process)
+- the cache, presence counters and event log use an in-process fake Redis
+  (``fakeredis`` with Lua support), so TTLs, INCR/DECR and the Lua scripts
+  behave like the real server; sync and async clients share the same data
+- the database is SQLite
+"""
+import fakeredis
+
+from backend.settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('LOCAL_DB_NAME', os.path.join(BASE_DIR, 'local.sqlite3')),
+    }
+}
+
+# Routing target for the replica router tests, which check where reads would go without running
+# them there (a SQLite mirror would lock against the primary's test transaction). Unused while
+# DATABASE_REPLICAS is empty.
+DATABASES['replica'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}
+DATABASE_REPLICAS = []
+
+CHANNEL_LAYERS = {
+    "default": {
+        "BACKEND": "channels.layers.InMemoryChannelLayer",
+    },
+}
+
+# Shared by the "default" cache connection and backend.redis_client's asyncio clients
+FAKE_REDIS_SERVER = fakeredis.FakeServer()
+
+CACHES = {
+    "default": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": "redis://localhost:6379/1",
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            "CONNECTION_POOL_KWARGS": {
+                "connection_class": fakeredis.FakeRedisConnection,
+                "server": FAKE_REDIS_SERVER,
+            },
+        },
+    }
+}
+
+REDIS_ASYNC_URL = CACHES["default"]["LOCATION"]
@@ -0,0 +1,919 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from datetime import timedelta
+from importlib.util import find_spec
+from unittest import mock, skipUnless
+
+import fakeredis
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from django.contrib.auth.models import User
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import resolve
+from django.utils import timezone
+from fakeredis.aioredis import FakeConnection
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from backend.async_views import AsyncAPIView
+from backend.auth import CachedJWTAuthentication, invalidate_cached_users
+from backend.caching import acached_json, cached_json
+from backend.channel_layers import HashRing, ShardedRedisChannelLayer
+from backend.db_backends.pool import ConnectionPool, PoolExhausted
+from backend.executors import (
+    ExecutorSaturated,
+    ManagedExecutor,
+    _executors,
+    managed_sync_to_async,
+    run_concurrently,
+    run_in_executor,
+)
+from backend.consumers import MultiplexConsumer
+from backend.db_router import PIN_COOKIE, ReplicaRoutingMiddleware
+from backend.middleware import get_user_from_token
+from backend.events import (
+    INBOX,
+    NOTIFICATIONS,
+    apublish_user_event,
+    aread_events_since,
+    group_for,
+    publish_user_event,
+)
+from backend.redis_client import get_redis
+from chats.models import Message, Thread
+from chats.views import ConversationListView
+from posts.models import Post
+from posts.views import PostViewSet
+from search.models import SearchHistory
+from search.views import SearchAllAPIView
+from users.models import Follow, Profile
+
+
+class MultiplexConsumerTests(TransactionTestCase):
+    def setUp(self):
+        get_redis().flushdb()
+        self.user = User.objects.create_user(username="alice", password="x")
+        self.thread = Thread.objects.create()
+        self.thread.users.add(self.user)
+
+    async def open(self):
+        # channels.testing needs daphne, so speak ASGI to the consumer directly
+        scope = {"type": "websocket", "path": "/ws/", "headers": [], "subprotocols": [], "user": self.user}
+        communicator = ApplicationCommunicator(MultiplexConsumer.as_asgi(), scope)
+        await communicator.send_input({"type": "websocket.connect"})
+        self.assertEqual((await communicator.receive_output(5))["type"], "websocket.accept")
+        return communicator
+
+    async def send(self, communicator, frame):
+        await communicator.send_input({"type": "websocket.receive", "text": json.dumps(frame)})
+
+    async def receive(self, communicator, count=1):
+        return [json.loads((await communicator.receive_output(5))["text"]) for _ in range(count)]
+
+    async def close(self, communicator):
+        await communicator.send_input({"type": "websocket.disconnect", "code": 1000})
+        await communicator.wait(5)
+
+    async def exchange(self, *frames):
+        communicator = await self.open()
+        replies = []
+        for frame in frames:
+            await self.send(communicator, frame)
+            replies += await self.receive(communicator)
+        await self.close(communicator)
+        return replies
+
+    async def publish_inbox(self, text):
+        return await apublish_user_event(self.user.id, INBOX, {"type": "chat_update", "message": text})
+
+    def test_subscribe_to_streams(self):
+        replies = async_to_sync(self.exchange)(
+            {"type": "subscribe", "topic": "inbox"},
+            {"type": "subscribe", "topic": "notifications"},
+            {"type": "subscribe", "topic": "thread", "thread_id": self.thread.id},
+            {"type": "subscribe", "topic": "nope"},
+        )
+        self.assertEqual(replies, [
+            {"type": "subscribed", "topic": "inbox"},
+            {"type": "subscribed", "topic": "notifications"},
+            {"type": "subscribed", "topic": f"thread:{self.thread.id}"},
+            {"type": "error", "message": "Unknown topic: nope", "topic": "nope"},
+        ])
+
+    def test_only_members_can_subscribe_to_a_thread(self):
+        other = Thread.objects.create()
+        [reply] = async_to_sync(self.exchange)({"type": "subscribe", "topic": "thread", "thread_id": other.id})
+        self.assertEqual(reply, {"type": "error", "message": "Not a member of this thread.", "topic": f"thread:{other.id}"})
+
+    def test_unsubscribe_from_a_thread(self):
+        subscribed, unsubscribed = async_to_sync(self.exchange)(
+            {"type": "subscribe", "topic": "thread", "thread_id": self.thread.id},
+            {"type": "unsubscribe", "topic": "thread", "thread_id": self.thread.id},
+        )
+        self.assertEqual(subscribed, {"type": "subscribed", "topic": f"thread:{self.thread.id}"})
+        self.assertEqual(unsubscribed, {"type": "unsubscribed", "topic": f"thread:{self.thread.id}"})
+
+    def test_unsubscribe_from_a_thread_requires_thread_id(self):
+        for frame in ({"type": "subscribe", "topic": "thread"}, {"type": "unsubscribe", "topic": "thread"}):
+            with self.subTest(frame=frame["type"]):
+                [reply] = async_to_sync(self.exchange)(frame)
+                self.assertEqual(reply, {"type": "error", "message": "thread_id is required.", "topic": "thread"})
+
+    def test_inbox_and_notification_events_are_delivered_with_their_topic(self):
+        async def scenario():
+            communicator = await self.open()
+            await self.send(communicator, {"type": "subscribe", "topic": "inbox"})
+            await self.send(communicator, {"type": "subscribe", "topic": "notifications"})
+            await self.receive(communicator, 2)
+
+            await self.publish_inbox("hi")
+            await apublish_user_event(self.user.id, NOTIFICATIONS, {"type": "send_notification", "notification": {"id": 3}})
+            frames = await self.receive(communicator, 2)
+            await self.close(communicator)
+            return frames
+
+        inbox, notification = async_to_sync(scenario)()
+        self.assertEqual(inbox, {"type": "chat_update", "message": "hi", "seq": 1, "topic": "inbox"})
+        self.assertEqual(notification, {"type": "notification", "topic": "notifications", "notification": {"id": 3}, "seq": 2})
+
+    def test_chat_send_reaches_the_thread_and_the_inbox(self):
+        topic = f"thread:{self.thread.id}"
+
+        async def scenario():
+            communicator = await self.open()
+            await self.send(communicator, {"type": "chat.send", "thread_id": self.thread.id, "text": "too early"})
+            [rejected] = await self.receive(communicator)
+
+            await self.send(communicator, {"type": "subscribe", "topic": "inbox"})
+            await self.send(communicator, {"type": "subscribe", "topic": "thread", "thread_id": self.thread.id})
+            await self.receive(communicator, 2)
+            await self.send(communicator, {"type": "chat.send", "thread_id": self.thread.id, "text": " hello "})
+            frames = await self.receive(communicator, 2)
+            await self.close(communicator)
+            return rejected, frames
+
+        rejected, (message, update) = async_to_sync(scenario)()
+
+        self.assertEqual(rejected, {"type": "error", "message": "Subscribe to the thread before sending.", "thread_id": self.thread.id})
+        saved = Message.objects.get(thread=self.thread)
+        self.assertEqual(saved.text, "hello")
+        self.assertEqual(
+            (message["type"], message["topic"], message["id"], message["text"], message["isOwn"], message["readByIds"]),
+            ("chat_message", topic, saved.id, "hello", True, [self.user.id]),
+        )
+        self.assertEqual(
+            (update["type"], update["topic"], update["chat_id"], update["message"], update["is_sender"], update["unread_count"]),
+            ("chat_update", "inbox", self.thread.id, "hello", True, 0),
+        )
+
+    def test_reconnect_replays_missed_events(self):
+        async def scenario():
+            communicator = await self.open()
+            await self.send(communicator, {"type": "subscribe", "topic": "inbox"})
+            await self.receive(communicator)
+            await self.publish_inbox("seen")
+            [seen] = await self.receive(communicator)
+            await self.close(communicator)
+
+            # Delivered while the client was away
+            await self.publish_inbox("missed 1")
+            await self.publish_inbox("missed 2")
+
+            communicator = await self.open()
+            await self.send(communicator, {"type": "subscribe", "topic": "inbox", "since": seen["seq"]})
+            frames = await self.receive(communicator, 4)
+            await self.close(communicator)
+            return frames
+
+        subscribed, first, second, sync = async_to_sync(scenario)()
+        self.assertEqual(subscribed, {"type": "subscribed", "topic": "inbox"})
+        self.assertEqual([(first["message"], first["seq"]), (second["message"], second["seq"])], [("missed 1", 2), ("missed 2", 3)])
+        self.assertEqual({first["topic"], second["topic"]}, {"inbox"})
+        self.assertEqual(sync, {"type": "sync", "seq": 3, "topic": "inbox"})
+
+    def test_reconnect_after_the_gap_was_trimmed_requires_resync(self):
+        async def scenario():
+            for text in ("a", "b", "c"):
+                await self.publish_inbox(text)
+            get_redis().xtrim(f"events:{self.user.id}", maxlen=1, approximate=False)
+
+            communicator = await self.open()
+            await self.send(communicator, {"type": "subscribe", "topic": "inbox", "since": 0})
+            frames = await self.receive(communicator, 2)
+            await self.close(communicator)
+            return frames
+
+        self.assertEqual(async_to_sync(scenario)(), [
+            {"type": "subscribed", "topic": "inbox"},
+            {"type": "resync_required", "seq": 3, "topic": "inbox"},
+        ])
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    sync_path = "/api/search/typeahead/?q=a"
+    async_path = "/api/chats/conversations/"
+
+    def setUp(self):
+        get_redis().flushdb()
+        # simplejwt's override_settings hook rebinds its module global, which imported references never see
+        patcher = mock.patch.object(api_settings, "CHECK_REVOKE_TOKEN", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user(username="alice", password="old-password")
+        self.token = AccessToken.for_user(self.user)
+
+    def http_status(self, path):
+        return self.client.get(path, HTTP_AUTHORIZATION=f"Bearer {self.token}").status_code
+
+    def websocket_user(self):
+        return async_to_sync(get_user_from_token)(str(self.token))
+
+    def assert_accepted(self):
+        self.assertEqual(self.http_status(self.sync_path), 200)
+        self.assertEqual(self.http_status(self.async_path), 200)
+        self.assertEqual(self.websocket_user(), self.user)
+
+    def assert_rejected(self):
+        self.assertEqual(self.http_status(self.sync_path), 401)
+        self.assertEqual(self.http_status(self.async_path), 401)
+        self.assertTrue(self.websocket_user().is_anonymous)
+
+    def test_cache_hit_issues_no_query(self):
+        auth = CachedJWTAuthentication()
+        with self.assertNumQueries(1):
+            auth.get_user(self.token)
+        with self.assertNumQueries(0):
+            user = auth.get_user(self.token)
+            self.assertEqual((user.id, user.username), (self.user.id, "alice"))
+            self.assertEqual(self.websocket_user(), self.user)
+
+    def test_cached_user_does_not_hold_the_password_hash(self):
+        CachedJWTAuthentication().get_user(self.token)
+        with self.assertNumQueries(1):
+            user = CachedJWTAuthentication().get_user(self.token)
+            self.assertNotIn("password", user.__dict__)
+            self.assertTrue(user.check_password("old-password"))
+
+    def test_password_change_revokes_tokens(self):
+        self.assert_accepted()
+        self.user.set_password("new-password")
+        self.user.save()
+        self.assert_rejected()
+
+    def test_deactivation_is_applied_on_the_next_request(self):
+        self.assert_accepted()
+        self.user.is_active = False
+        self.user.save()
+        self.assert_rejected()
+
+    def test_queryset_updates_apply_once_invalidated(self):
+        self.assert_accepted()
+        User.objects.filter(id=self.user.id).update(is_active=False)
+        invalidate_cached_users([self.user.id])
+        self.assert_rejected()
+
+    def test_deleted_users_are_rejected(self):
+        self.assert_accepted()
+        self.user.delete()
+        self.assert_rejected()
+
+
+class AsyncReadViewParityTests(TransactionTestCase):
+    """Every async read view returns what the sync view it shadows would."""
+
+    # async path -> the sync view serving it when ASYNC_READ_VIEWS is off
+    sync_views = {
+        "/api/posts/feed/": PostViewSet.as_view({"get": "feed"}),
+        "/api/posts/explore/": PostViewSet.as_view({"get": "explore"}),
+        "/api/chats/conversations/": ConversationListView.as_view(),
+        "/api/search/": SearchAllAPIView.as_view(),
+    }
+
+    def setUp(self):
+        get_redis().flushdb()
+        self.viewer, self.alice, self.bob = (self.make_user(name) for name in ("viewer", "alice", "bob"))
+        Follow.objects.create(follower=self.viewer, following=self.alice)
+        Follow.objects.create(follower=self.alice, following=self.viewer)
+
+        now = timezone.now()
+        authors = [self.alice] * 12 + [self.bob] * 3 + [self.viewer] * 2
+        for age, author in enumerate(authors):
+            post = Post.objects.create(user=author, caption=f"#beach post {age}", location="Da Nang" if age % 4 == 0 else None)
+            # posted is auto_now_add, so backdate with update()
+            Post.objects.filter(id=post.id).update(posted=now - timedelta(minutes=age))
+            if age % 3 == 0:
+                post.likes.add(self.viewer, self.bob)
+
+        for other in (self.alice, self.bob):
+            thread, _ = Thread.objects.get_or_create_dm(self.viewer, other)
+            Message.objects.create(thread=thread, sender=other, text=f"hi from {other.username}")
+        mine = Message.objects.create(thread=thread, sender=self.viewer, text="hello bob")
+        mine.read_by.add(self.viewer)
+        SearchHistory.objects.create(user=self.viewer, searched_user=self.bob)
+
+    def make_user(self, username):
+        user = User.objects.create_user(username=username, password="x")
+        Profile.objects.create(user=user, full_name=username.title())
+        return user
+
+    def drop_caches(self):
+        """Start each side cold so neither reads what the other cached; the user search index stays."""
+        client = get_redis()
+        for key in client.scan_iter():
+            if not key.startswith(b"search:users:"):
+                client.delete(key)
+
+    def fetch_both(self, path, params=None):
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(self.viewer)}"}
+        self.drop_caches()
+        async_response = self.client.get(path, params or {}, **headers)
+
+        self.drop_caches()
+        sync_response = self.sync_views[path](RequestFactory().get(path, params or {}, **headers))
+        sync_response.render()
+        return (
+            (async_response.status_code, async_response.json()),
+            (sync_response.status_code, json.loads(sync_response.content)),
+        )
+
+    def assert_same(self, path, params=None):
+        async_result, sync_result = self.fetch_both(path, params)
+        self.assertEqual(async_result, sync_result)
+        return async_result[1]
+
+    def test_the_async_urls_are_routed_to_the_async_views(self):
+        for path in self.sync_views:
+            with self.subTest(path=path):
+                self.assertTrue(issubclass(resolve(path).func.view_class, AsyncAPIView))
+
+    def test_feed(self):
+        first = self.assert_same("/api/posts/feed/")
+        self.assertEqual((first["count"], len(first["results"])), (14, 10))
+        self.assertIsNotNone(first["next"])
+        self.assertEqual(len(self.assert_same("/api/posts/feed/", {"page": 2})["results"]), 4)
+
+    def test_explore(self):
+        self.assertEqual(self.assert_same("/api/posts/explore/")["count"], 15)
+        self.assertIsNotNone(self.assert_same("/api/posts/explore/", {"page": 2})["previous"])
+
+    def test_invalid_pages(self):
+        for path in ("/api/posts/feed/", "/api/posts/explore/"):
+            for page in (5, "x"):
+                with self.subTest(path=path, page=page):
+                    async_result, sync_result = self.fetch_both(path, {"page": page})
+                    self.assertEqual(async_result[0], 404)
+                    self.assertEqual(async_result, sync_result)
+
+    def test_conversations(self):
+        conversations = self.assert_same("/api/chats/conversations/")["conversations"]
+        self.assertEqual([conversation["username"] for conversation in conversations], ["bob", "alice"])
+
+    def test_search(self):
+        self.assertEqual([user["username"] for user in self.assert_same("/api/search/", {"q": "ali"})["users"]], ["alice"])
+        self.assertTrue(self.assert_same("/api/search/", {"q": "beach"})["tags"])
+        self.assertEqual([card["username"] for card in self.assert_same("/api/search/")["recent_searches"]], ["bob"])
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        time.sleep(0.005)
+
+
+class ManagedExecutorTests(SimpleTestCase):
+    def setUp(self):
+        self.executor = ManagedExecutor("test", max_workers=1, max_queue=1)
+        self.addCleanup(self.executor.executor.shutdown)
+        self.gate = threading.Event()
+        self.addCleanup(self.gate.set)
+
+    def occupy_worker(self):
+        future = self.executor.submit(self.gate.wait)
+        wait_until(lambda: self.executor.metrics()["active"] == 1)
+        return future
+
+    def test_calls_queue_behind_busy_workers_then_are_rejected(self):
+        self.occupy_worker()
+        queued = self.executor.submit(lambda: "queued")
+        self.assertEqual(self.executor.metrics()["queue_depth"], 1)
+
+        with self.assertRaises(ExecutorSaturated):
+            self.executor.submit(lambda: "rejected")
+
+        self.gate.set()
+        self.assertEqual(queued.result(5), "queued")
+        metrics = self.executor.metrics()
+        self.assertEqual(
+            {key: metrics[key] for key in ("active", "queue_depth", "submitted", "completed", "rejected")},
+            {"active": 0, "queue_depth": 0, "submitted": 2, "completed": 2, "rejected": 1},
+        )
+
+    def test_wait_and_failure_counters(self):
+        self.occupy_worker()
+        queued = self.executor.submit(lambda: 1 / 0)
+        time.sleep(0.05)
+        self.gate.set()
+
+        with self.assertRaises(ZeroDivisionError):
+            queued.result(5)
+        wait_until(lambda: self.executor.metrics()["completed"] == 2)
+        metrics = self.executor.metrics()
+        self.assertEqual(metrics["failed"], 1)
+        self.assertGreaterEqual(metrics["max_wait_ms"], 40)
+        self.assertGreater(metrics["avg_wait_ms"], 0)
+
+    def test_cancelled_calls_give_their_queue_slot_back(self):
+        self.occupy_worker()
+        queued = self.executor.submit(lambda: "never runs")
+        self.assertTrue(queued.cancel())
+
+        self.assertEqual(self.executor.metrics()["queue_depth"], 0)
+        accepted = self.executor.submit(lambda: "accepted")
+        self.gate.set()
+        self.assertEqual(accepted.result(5), "accepted")
+        self.assertEqual(self.executor.metrics()["completed"], 2)
+
+
+@override_settings(EXECUTORS={"test": {"MAX_WORKERS": 1, "MAX_QUEUE": 1}})
+class ExecutorHelperTests(SimpleTestCase):
+    def setUp(self):
+        self.addCleanup(self.drop_executor)
+        self.gate = threading.Event()
+        self.addCleanup(self.gate.set)
+
+    def drop_executor(self):
+        executor = _executors.pop((os.getpid(), "test"), None)
+        if executor:
+            executor.executor.shutdown()
+
+    def metrics(self):
+        return _executors[(os.getpid(), "test")].metrics()
+
+    def test_cancelling_the_awaiting_task_drops_the_queued_call(self):
+        async def scenario():
+            busy = asyncio.ensure_future(run_in_executor("test", self.gate.wait))
+            await asyncio.sleep(0)
+            wait_until(lambda: self.metrics()["active"] == 1)
+            waiting = asyncio.ensure_future(run_in_executor("test", lambda: "never runs"))
+            await asyncio.sleep(0)
+            queued = self.metrics()["queue_depth"]
+
+            waiting.cancel()
+            await asyncio.gather(waiting, return_exceptions=True)
+            after_cancel = self.metrics()["queue_depth"]
+            self.gate.set()
+            await busy
+            return queued, after_cancel
+
+        self.assertEqual(async_to_sync(scenario)(), (1, 0))
+        self.assertEqual(self.metrics()["completed"], 1)
+
+    def test_run_concurrently_runs_calls_the_pool_cannot_take_inline(self):
+        self.assertEqual(run_concurrently("test", (lambda x: x * 2, 2), (lambda: "b",)), [4, "b"])
+
+        def thread_name():
+            return threading.current_thread().name
+
+        busy = _executors[(os.getpid(), "test")].submit(self.gate.wait)
+        wait_until(lambda: self.metrics()["active"] == 1)
+        # run_concurrently waits for the queued call, so free the worker from elsewhere
+        timer = threading.Timer(0.1, self.gate.set)
+        timer.start()
+        self.addCleanup(timer.cancel)
+        names = run_concurrently("test", (thread_name,), (thread_name,))
+        busy.result(5)
+
+        # One call fits the queue; the other is rejected and runs on the calling thread
+        self.assertTrue(names[0].startswith("executor-test"))
+        self.assertEqual(names[1], threading.current_thread().name)
+        self.assertEqual(self.metrics()["rejected"], 1)
+
+    def test_managed_sync_to_async_runs_on_the_pool(self):
+        @managed_sync_to_async("test")
+        def thread_name():
+            return threading.current_thread().name
+
+        self.assertTrue(async_to_sync(thread_name)().startswith("executor-test"))
+
+
+class HashRingTests(SimpleTestCase):
+    keys = [f"asgi:group:chat_{i}" for i in range(5000)]
+
+    def placement(self, labels):
+        ring = HashRing(labels)
+        return {key: labels[ring.get_node(key)] for key in self.keys}
+
+    def test_placement_does_not_depend_on_host_order(self):
+        labels = ["redis-a:6379/0", "redis-b:6379/0", "redis-c:6379/0"]
+        self.assertEqual(self.placement(labels), self.placement(list(reversed(labels))))
+
+    def test_keys_spread_over_every_node(self):
+        labels = ["redis-a:6379/0", "redis-b:6379/0", "redis-c:6379/0"]
+        counts = {label: 0 for label in labels}
+        for label in self.placement(labels).values():
+            counts[label] += 1
+        for label, count in counts.items():
+            self.assertAlmostEqual(count / len(self.keys), 1 / 3, delta=0.08, msg=label)
+
+    def test_adding_a_node_only_moves_keys_onto_it(self):
+        before = self.placement(["redis-a:6379/0", "redis-b:6379/0", "redis-c:6379/0"])
+        after = self.placement(["redis-a:6379/0", "redis-b:6379/0", "redis-c:6379/0", "redis-d:6379/0"])
+
+        moved = [key for key in self.keys if before[key] != after[key]]
+        self.assertEqual({after[key] for key in moved}, {"redis-d:6379/0"})
+        self.assertAlmostEqual(len(moved) / len(self.keys), 1 / 4, delta=0.08)
+
+    def test_removing_a_node_only_moves_its_keys(self):
+        before = self.placement(["redis-a:6379/0", "redis-b:6379/0", "redis-c:6379/0", "redis-d:6379/0"])
+        after = self.placement(["redis-a:6379/0", "redis-b:6379/0", "redis-c:6379/0"])
+
+        moved = [key for key in self.keys if before[key] != after[key]]
+        self.assertEqual({before[key] for key in moved}, {"redis-d:6379/0"})
+        self.assertEqual(len(moved), list(before.values()).count("redis-d:6379/0"))
+
+
+class ShardedRedisChannelLayerTests(SimpleTestCase):
+    def setUp(self):
+        self.servers = [fakeredis.FakeServer() for _ in range(3)]
+
+    def make_layer(self):
+        return ShardedRedisChannelLayer(hosts=[
+            {"host": f"redis-{index}", "port": 6379, "connection_class": FakeConnection, "server": server}
+            for index, server in enumerate(self.servers)
+        ])
+
+    def keys_on(self, index, pattern):
+        return fakeredis.FakeRedis(server=self.servers[index]).keys(pattern)
+
+    def test_group_send_reaches_members_on_every_shard(self):
+        # One layer per worker process: each process's channels live on the shard its prefix hashes to
+        workers = [self.make_layer() for _ in range(12)]
+
+        async def scenario():
+            channels = [await worker.new_channel() for worker in workers]
+            for channel in channels:
+                await workers[0].group_add("chat_7", channel)
+            await workers[0].group_send("chat_7", {"type": "chat.message", "text": "hi"})
+
+            queued = {index for index in range(len(self.servers)) if self.keys_on(index, "asgispecific.*")}
+            received = [await worker.receive(channel) for worker, channel in zip(workers, channels)]
+            for worker in workers:
+                await worker.close_pools()
+            return channels, queued, received
+
+        channels, queued, received = async_to_sync(scenario)()
+
+        self.assertEqual(received, [{"type": "chat.message", "text": "hi"}] * len(channels))
+        self.assertGreater(len(queued), 1)
+        group_shard = workers[0].consistent_hash("chat_7")
+        for index in range(len(self.servers)):
+            self.assertEqual(bool(self.keys_on(index, "asgi:group:chat_7")), index == group_shard)
+
+    def test_group_discard_stops_delivery(self):
+        workers = [self.make_layer() for _ in range(6)]
+
+        async def scenario():
+            channels = [await worker.new_channel() for worker in workers]
+            for channel in channels:
+                await workers[0].group_add("chat_7", channel)
+            await workers[0].group_discard("chat_7", channels[0])
+            await workers[0].group_send("chat_7", {"type": "chat.message", "text": "hi"})
+            received = [await worker.receive(channel) for worker, channel in zip(workers[1:], channels[1:])]
+            # The discarded channel's worker never received, so a delivered message would still be queued
+            discarded_key = "asgi" + workers[0].non_local_name(channels[0])
+            pending = sum(len(self.keys_on(index, discarded_key)) for index in range(len(self.servers)))
+            for worker in workers:
+                await worker.close_pools()
+            return received, pending
+
+        received, pending = async_to_sync(scenario)()
+        self.assertEqual([message["text"] for message in received], ["hi"] * 5)
+        self.assertEqual(pending, 0)
+
+
+class RecordingChannelLayer:
+    def __init__(self):
+        self.sent = []
+
+    async def group_send(self, group, message):
+        self.sent.append((group, message))
+
+
+class EventLogTests(SimpleTestCase):
+    user_id = 7
+
+    def setUp(self):
+        get_redis().flushdb()
+        self.layer = RecordingChannelLayer()
+
+    def publish(self, kind, text):
+        return publish_user_event(self.user_id, kind, {"type": "chat_update", "text": text}, self.layer)
+
+    def read(self, since, kind=None):
+        return async_to_sync(aread_events_since)(self.user_id, since, kind=kind)
+
+    def test_seq_increases_per_user_and_is_sent_live(self):
+        seqs = [self.publish(INBOX, "a"), self.publish(NOTIFICATIONS, "b"), self.publish(INBOX, "c")]
+        self.assertEqual(seqs, [1, 2, 3])
+        self.assertEqual(publish_user_event(8, INBOX, {"type": "chat_update"}, self.layer), 1)
+
+        self.assertEqual(self.layer.sent[0], (group_for(INBOX, self.user_id), {"type": "chat_update", "text": "a", "seq": 1}))
+        self.assertEqual(self.layer.sent[1][0], group_for(NOTIFICATIONS, self.user_id))
+
+    def test_replay_returns_only_events_after_since(self):
+        for text in "abc":
+            self.publish(INBOX, text)
+        self.publish(NOTIFICATIONS, "d")
+
+        events, current_seq = self.read(1, kind=INBOX)
+        self.assertEqual([(event["text"], event["seq"]) for event in events], [("b", 2), ("c", 3)])
+        self.assertEqual(current_seq, 4)
+        self.assertEqual(self.read(4), ([], 4))
+
+    def test_trimmed_gap_requires_resync(self):
+        for text in "abc":
+            self.publish(INBOX, text)
+        get_redis().xtrim(f"events:{self.user_id}", maxlen=1, approximate=False)
+
+        self.assertEqual(self.read(0), (None, 3))
+        self.assertEqual(self.read(1), (None, 3))
+        self.assertEqual([event["seq"] for event in self.read(2)[0]], [3])
+
+    def test_since_ahead_of_the_counter_requires_resync(self):
+        self.publish(INBOX, "a")
+        self.assertEqual(self.read(5), (None, 1))
+
+    def test_only_the_stream_expires(self):
+        self.publish(INBOX, "a")
+        self.assertGreater(get_redis().ttl(f"events:{self.user_id}"), 0)
+        self.assertEqual(get_redis().ttl(f"events:seq:{self.user_id}"), -1)
+
+
+class FakeDBConnection:
+    """The parts of a MySQLdb connection the pool and the pooled backend use."""
+
+    def __init__(self):
+        self.in_autocommit = True
+        self.closed = False
+        self.rollbacks = 0
+        self.alive = True
+
+    def get_autocommit(self):
+        if self.closed:
+            raise AssertionError("used after close")
+        return self.in_autocommit
+
+    def autocommit(self, value):
+        self.in_autocommit = value
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def ping(self):
+        if not self.alive:
+            raise ConnectionError("gone away")
+
+    def close(self):
+        self.closed = True
+
+
+def make_pool(**options):
+    return ConnectionPool(
+        connect=FakeDBConnection,
+        ping=lambda connection: connection.ping(),
+        close=lambda connection: connection.close(),
+        **{"max_size": 2, "timeout": 0.05, **options},
+    )
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def test_released_connections_are_reused(self):
+        pool = make_pool()
+        first, reused = pool.acquire()
+        self.assertFalse(reused)
+        pool.release(first)
+
+        self.assertEqual(pool.acquire(), (first, True))
+        self.assertEqual((pool.metrics()["created"], pool.metrics()["reused"]), (1, 1))
+
+    def test_acquire_waits_then_fails_at_max_size(self):
+        pool = make_pool()
+        first, _ = pool.acquire()
+        pool.acquire()
+
+        with self.assertRaises(PoolExhausted):
+            pool.acquire()
+        metrics = pool.metrics()
+        self.assertEqual((metrics["size"], metrics["in_use"], metrics["waits"], metrics["timeouts"]), (2, 2, 1, 1))
+
+        pool.release(first)
+        self.assertEqual(pool.acquire(), (first, True))
+
+    def test_unreusable_connections_are_closed(self):
+        pool = make_pool()
+        first, _ = pool.acquire()
+        pool.release(first, reusable=False)
+
+        self.assertTrue(first.closed)
+        second, reused = pool.acquire()
+        self.assertIsNot(second, first)
+        self.assertFalse(reused)
+
+    def test_forgotten_connections_free_their_slot_but_stay_open(self):
+        pool = make_pool(max_size=1)
+        first, _ = pool.acquire()
+        pool.forget(first)
+
+        self.assertFalse(first.closed)
+        second, reused = pool.acquire()
+        self.assertIsNot(second, first)
+        self.assertEqual(pool.metrics()["size"], 1)
+
+    def test_stale_and_dead_connections_are_replaced(self):
+        pool = make_pool(recycle=0)
+        first, _ = pool.acquire()
+        pool.release(first)
+        self.assertIsNot(pool.acquire()[0], first)
+        self.assertTrue(first.closed)
+
+        pool = make_pool(health_check_interval=0)
+        first, _ = pool.acquire()
+        first.alive = False
+        pool.release(first)
+        with self.assertLogs("django", "WARNING"):
+            self.assertIsNot(pool.acquire()[0], first)
+        self.assertEqual(pool.metrics()["failed_health_checks"], 1)
+
+
+@skipUnless(find_spec("MySQLdb"), "the pooled backend needs mysqlclient")
+class PooledDatabaseWrapperTests(SimpleTestCase):
+    def setUp(self):
+        from backend.db_backends.mysql_pooled.base import DatabaseWrapper
+
+        self.pool = make_pool(max_size=1)
+        patcher = mock.patch.object(DatabaseWrapper, "pool", new_callable=mock.PropertyMock, return_value=self.pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.wrapper = DatabaseWrapper({**connection.settings_dict, "ENGINE": "backend.db_backends.mysql_pooled"}, "pooled")
+
+    def connect(self):
+        raw = self.wrapper.get_new_connection({})
+        self.wrapper.connection = raw
+        return raw
+
+    def test_close_returns_the_connection_for_reuse(self):
+        raw = self.connect()
+        self.wrapper.close()
+
+        self.assertIsNone(self.wrapper.connection)
+        self.assertEqual(self.connect(), raw)
+        self.assertTrue(self.wrapper._pool_reused)
+
+    def test_open_transaction_is_rolled_back_before_reuse(self):
+        raw = self.connect()
+        raw.in_autocommit = False
+        self.wrapper.close()
+
+        self.assertEqual((raw.rollbacks, raw.closed), (1, False))
+        self.assertIs(self.pool.acquire()[0], raw)
+
+    def test_connections_with_errors_are_discarded(self):
+        raw = self.connect()
+        self.wrapper.errors_occurred = True
+        self.wrapper.close()
+
+        self.assertTrue(raw.closed)
+        self.assertIsNot(self.pool.acquire()[0], raw)
+
+    def test_close_inside_atomic_is_left_to_django(self):
+        raw = self.connect()
+        self.wrapper.in_atomic_block = True
+        self.wrapper.close()
+
+        # Django keeps the (closed) handle until the outermost atomic() exits; its slot is free already
+        self.assertTrue(raw.closed)
+        self.assertIs(self.wrapper.connection, raw)
+        self.assertTrue(self.wrapper.closed_in_transaction)
+        self.assertIsNot(self.pool.acquire()[0], raw)
+        # The mode check is skipped; the closed handle itself reports the error
+        self.wrapper._set_autocommit(True)
+        self.assertTrue(raw.in_autocommit)
+
+
+def read_alias():
+    """The alias a read made now would use."""
+    return User.objects.all().db
+
+
+@override_settings(DATABASE_REPLICAS=["replica"], REPLICA_PIN_SECONDS=5)
+class ReplicaRoutingTests(TestCase):
+    databases = {"default", "replica"}
+    replica_path = "/api/search/"  # a @replica_reads view
+    primary_path = "/api/admin/executors/"
+
+    def handle(self, method, path, view=read_alias, cookies=None):
+        """Run ``view`` behind the middleware; return the response and what ``view`` returned."""
+        request = getattr(RequestFactory(), method.lower())(path)
+        request.COOKIES.update(cookies or {})
+        result = []
+
+        def get_response(request):
+            result.append(view())
+            return HttpResponse()
+
+        response = ReplicaRoutingMiddleware(get_response)(request)
+        return response, result[0]
+
+    def test_safe_methods_on_replica_views_read_from_the_replica(self):
+        for method in ("GET", "HEAD", "OPTIONS"):
+            with self.subTest(method=method):
+                response, alias = self.handle(method, self.replica_path)
+                self.assertEqual(alias, "replica")
+                self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_unsafe_methods_and_other_views_read_from_the_primary(self):
+        self.assertEqual(self.handle("POST", self.replica_path)[1], "default")
+        self.assertEqual(self.handle("GET", self.primary_path)[1], "default")
+
+    def test_writes_go_to_the_primary_and_pin_the_client(self):
+        for method in ("GET", "POST"):
+            def view():
+                user = User.objects.create_user(username=method.lower(), password="x")
+                return user._state.db, read_alias()
+
+            with self.subTest(method=method):
+                response, (written, read) = self.handle(method, self.replica_path, view)
+                self.assertEqual(written, "default")
+                # Reads after a write in the same request stay on the primary too
+                self.assertEqual(read, "default")
+                self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_pinned_client_reads_from_the_primary(self):
+        response, _alias = self.handle("POST", self.replica_path)
+        pin = response.cookies[PIN_COOKIE].value
+
+        self.assertEqual(self.handle("GET", self.replica_path, cookies={PIN_COOKIE: pin})[1], "default")
+        # An expired pin sends reads back to the replica
+        self.assertEqual(self.handle("GET", self.replica_path, cookies={PIN_COOKIE: "1"})[1], "replica")
+
+
+class CachedJsonTests(SimpleTestCase):
+    def setUp(self):
+        get_redis().flushdb()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return {"calls": self.calls}
+
+    async def acompute(self):
+        return self.compute()
+
+    def test_value_is_computed_once_then_cached(self):
+        self.assertEqual(cached_json("k", self.compute, ttl=60), {"calls": 1})
+        self.assertEqual(cached_json("k", self.compute, ttl=60), {"calls": 1})
+        self.assertEqual(async_to_sync(acached_json)("k", self.acompute, ttl=60), {"calls": 1})
+        self.assertFalse(get_redis().exists("k:lock"))
+
+    def test_waiters_reuse_the_lock_holders_result(self):
+        get_redis().set("k:lock", "holder")
+        timer = threading.Timer(0.1, lambda: get_redis().set("k", json.dumps({"calls": 0})))
+        timer.start()
+        try:
+            self.assertEqual(cached_json("k", self.compute, ttl=60, wait=2), {"calls": 0})
+        finally:
+            timer.cancel()
+        self.assertEqual(self.calls, 0)
+
+    def test_waiters_compute_themselves_after_wait(self):
+        get_redis().set("k:lock", "holder")
+        self.assertEqual(cached_json("k", self.compute, ttl=60, wait=0.1), {"calls": 1})
+        self.assertEqual(get_redis().get("k:lock"), b"holder")
+
+    def test_expired_lock_taken_by_another_caller_is_not_released(self):
+        def slow_compute():
+            # Our lock_ttl runs out mid-compute and another caller takes the lock
+            get_redis().set("k:lock", "next-holder")
+            return self.compute()
+
+        async def aslow_compute():
+            return slow_compute()
+
+        cached_json("k", slow_compute, ttl=60)
+        self.assertEqual(get_redis().get("k:lock"), b"next-holder")
+
+        get_redis().delete("k", "k:lock")
+        async_to_sync(acached_json)("k", aslow_compute, ttl=60)
+        self.assertEqual(get_redis().get("k:lock"), b"next-holder")
+
+    def test_redis_errors_fall_back_to_computing(self):
+        with mock.patch("backend.caching.get_redis", side_effect=ConnectionError("down")), \
+                self.assertLogs("django", "ERROR"):
+            self.assertEqual(cached_json("k", self.compute, ttl=60), {"calls": 1})
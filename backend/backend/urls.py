@@ -21,10 +21,22 @@ from django.urls import path, include
 from rest_framework_simplejwt.views import TokenRefreshView
 
 from backend.routers import router
+from backend.views import DatabasePoolMetricsView, ExecutorMetricsView
 from users.views import UserRegistrationView ,CustomTokenObtainPairView  
+from posts.views import FeedView, ExploreView
+from chats.views import ConversationListAsyncView
+from search.views import SearchAllAsyncView
 
 
-urlpatterns = [
+# Async implementations of the heaviest read endpoints; they shadow the sync routes below
+async_read_urlpatterns = [
+    path('api/posts/feed/', FeedView.as_view(), name='posts-feed-async'),
+    path('api/posts/explore/', ExploreView.as_view(), name='posts-explore-async'),
+    path('api/chats/conversations/', ConversationListAsyncView.as_view(), name='conversation-list-async'),
+    path('api/search/', SearchAllAsyncView.as_view(), name='search-all-async'),
+]
+
+urlpatterns = (async_read_urlpatterns if settings.ASYNC_READ_VIEWS else []) + [
     path('admin/', admin.site.urls),
     path('api/', include(router.urls) ),
     path('api/register/', UserRegistrationView.as_view(), name='user_register'),
@@ -33,6 +45,8 @@ urlpatterns = [
     
     path('api/chats/', include('chats.urls')),
     path('api/search/', include('search.urls')),
+    path('api/admin/db-pool/', DatabasePoolMetricsView.as_view(), name='db_pool_metrics'),
+    path('api/admin/executors/', ExecutorMetricsView.as_view(), name='executor_metrics'),
 ]
 
 # This is used for
@@ -0,0 +1,22 @@
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from backend.db_backends.pool import get_pool_metrics
+from backend.executors import get_executor_metrics
+
+
+class DatabasePoolMetricsView(APIView):
+    """Connection pool metrics of the worker process serving this request."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(get_pool_metrics())
+
+
+class ExecutorMetricsView(APIView):
+    """Queue depth, wait times and rejections of this worker process's executors."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(get_executor_metrics())
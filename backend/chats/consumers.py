@@ -1,180 +1,251 @@
 from channels.generic.websocket import AsyncWebsocketConsumer
 import json
+import time
 from .models import Message, Thread
-from asgiref.sync import sync_to_async
+from django.db.models import Count, Exists, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.utils.timezone import localtime
 from django.contrib.auth.models import AnonymousUser
 from django.contrib.auth.models import User
 from django.utils import timezone
 from users.models import Profile
+from backend.events import apublish_user_event, aread_events_since, INBOX
+from backend.executors import ExecutorSaturated, managed_sync_to_async, run_in_executor
+from urllib.parse import parse_qs
 
 import logging
 
 logger = logging.getLogger("django")
 
-class ChatConsumer(AsyncWebsocketConsumer):
-    async def connect(self):
-        self.thread_id = self.scope['url_route']['kwargs']['thread_id']
-        self.room_group_name = f'chat_{self.thread_id}'
-        user = self.scope["user"]
+SERVER_BUSY_MESSAGE = "Server is busy, please retry shortly."
 
-        if user.is_anonymous:
-            await self.close(code=4001)
-            return
 
-        thread_exists = await sync_to_async(Thread.objects.filter(id=self.thread_id, users=user).exists)()
-        if not thread_exists:
-            await self.close(code=4003)
-            return
+async def broadcast_presence(channel_layer, user_id, online, last_active=None):
+    """Send a presence_update for ``user_id`` to everyone sharing a thread with them."""
+    from users.presence_async import get_presence_audience
 
-        await self.channel_layer.group_add(self.room_group_name, self.channel_name)
-        await self.accept()
-        await self.mark_messages_as_read(user)
+    event = {
+        "type": "presence_update",
+        "user_id": user_id,
+        "online": online,
+    }
+    if last_active:
+        event["last_active"] = last_active
+
+    for partner_id in await get_presence_audience(user_id):
+        await apublish_user_event(partner_id, INBOX, event, channel_layer)
+
+
+async def presence_connected(channel_layer, user):
+    """Count a new connection for ``user`` and broadcast if they just came online."""
+    # Presence: increment counter and broadcast status if transitioned to online
+    try:
+        from users.presence_async import increment_presence
+        new_count = await increment_presence(user.id)
+        logger.info(f"User {user.id} presence incremented to {new_count}")
+
+        # If this connection made the user go from 0 -> 1, broadcast online status
+        if new_count == 1:
+            await broadcast_presence(channel_layer, user.id, online=True)
+    except Exception as e:
+        logger.error(f"Presence increment error: {e}")
 
-    async def disconnect(self, close_code):
-        if hasattr(self, 'room_group_name'):
-            await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
 
-    @sync_to_async
-    def save_message(self, user, text):
+async def presence_disconnected(channel_layer, user):
+    """Drop a connection for ``user``; on the last one record last_seen and broadcast offline."""
+    # Presence: decrement counter and broadcast if transitioned to offline
+    try:
+        from users.presence_async import decrement_presence
+        new_count = await decrement_presence(user.id)
+        logger.info(f"User {user.id} presence decremented to {new_count}")
+
+        if new_count == 0:
+            # Update last_seen first so we can include it in the presence payload
+            now = timezone.now()
+            try:
+                # Use a direct update to avoid possible profile related attribute errors
+                await run_in_executor("chat", Profile.objects.filter(user=user).update, last_seen=now)
+                logger.info(f"Set last_seen for user {user.id} to {now}")
+            except Exception as e:
+                logger.error(f"Failed to set last_seen for user {user.id}: {e}")
+
+            # Broadcast presence update including last_active timestamp
+            await broadcast_presence(channel_layer, user.id, online=False, last_active=now.isoformat())
+    except Exception as e:
+        logger.error(f"Presence decrement error: {e}")
+
+
+def get_since_param(scope):
+    """Return the ``since`` sequence number from the socket's query string, if any."""
+    query_params = parse_qs(scope.get("query_string", b"").decode())
+    try:
+        return int(query_params["since"][0])
+    except (KeyError, IndexError, ValueError):
+        return None
+
+
+async def replay_missed_events(consumer, user_id, kind, since, topic=None):
+    """Send events after ``since`` through the consumer's own handlers.
+
+    Sends ``resync_required`` when the gap is no longer available, otherwise
+    a ``sync`` frame carrying the latest sequence number after the replay.
+    ``topic`` is added to those frames on the multiplexed socket.
+    """
+    events, current_seq = await aread_events_since(user_id, since, kind=kind)
+    extra = {"topic": topic} if topic else {}
+    if events is None:
+        await consumer.send(text_data=json.dumps({"type": "resync_required", "seq": current_seq, **extra}))
+        return
+    for event in events:
+        handler = getattr(consumer, event["type"].replace(".", "_"), None)
+        if handler:
+            await handler(event)
+    await consumer.send(text_data=json.dumps({"type": "sync", "seq": current_seq, **extra}))
+
+
+class ChatThreadMixin:
+    """Thread operations shared by ChatConsumer and the multiplexed socket.
+
+    Every method takes the thread id explicitly so one connection can serve
+    several thread rooms. Expects ``self.channel_layer``.
+    """
+
+    @managed_sync_to_async("chat")
+    def user_in_thread(self, thread_id, user):
+        return Thread.objects.filter(id=thread_id, users=user).exists()
+
+    sender_avatar = None
+
+    @managed_sync_to_async("chat")
+    def get_avatar_url(self, user):
+        profile = Profile.objects.only("avatar").filter(user=user).first()
+        return profile.avatar.url if profile and profile.avatar else None
+
+    async def load_sender(self, user):
+        """Cache the connected user's profile data used in every message they send."""
+        self.sender_avatar = await self.get_avatar_url(user)
+
+    @managed_sync_to_async("chat")
+    def save_message(self, thread_id, user, text):
         message = Message.objects.create(
-            thread_id=self.thread_id,
+            thread_id=thread_id,
             sender=user,
             text=text,
         )
-        message.read_by.add(user)
-        avatar = getattr(getattr(user, "profile", None), "avatar", None)
+        # The message is new, so insert the read state directly instead of read_by.add()'s select-then-insert
+        Message.read_by.through.objects.create(message_id=message.id, user_id=user.id)
         return {
             "id": message.id,
             "text": message.text,
             "time": localtime(message.timestamp).strftime("%I:%M %p").lstrip("0"),
             "sender": user.username,
-            "sender_avatar": avatar.url if avatar else None,
+            "sender_avatar": self.sender_avatar,
             "timestamp": localtime(message.timestamp).isoformat(),
             "sender_id": user.id,  # This is important for identifying who sent the message
             "read_by_ids": [user.id],
         }
 
-    @sync_to_async
-    def get_thread_users(self):
-        return list(Thread.objects.get(id=self.thread_id).users.all())
-
-    @sync_to_async
-    def get_unread_messages(self, user):
+    @managed_sync_to_async("chat")
+    def get_member_unread_counts(self, thread_id):
+        """``[(user_id, unread_count)]`` for every member of the thread, in one query."""
+        read = Message.read_by.through.objects.filter(
+            message_id=OuterRef("pk"),
+            user_id=OuterRef(OuterRef("pk")),
+        )
+        unread = Message.objects.filter(thread_id=thread_id).exclude(
+            sender_id=OuterRef("pk")
+        ).exclude(Exists(read)).order_by().values("thread_id").annotate(count=Count("id")).values("count")
         return list(
-            Message.objects.filter(
-                thread_id=self.thread_id
-            ).exclude(sender=user).exclude(read_by=user)
+            User.objects.filter(thread=thread_id).annotate(
+                unread=Coalesce(Subquery(unread), 0)
+            ).values_list("id", "unread")
         )
 
-    @sync_to_async
-    def get_unread_count(self, thread_id, user):
-        return Message.objects.filter(
-            thread_id=thread_id
-        ).exclude(sender=user).exclude(read_by=user).count()
+    @managed_sync_to_async("chat")
+    def mark_thread_read(self, thread_id, user):
+        """Add ``user`` to read_by of every unread message with one insert; return the newest id marked."""
+        message_ids = list(
+            Message.objects.filter(
+                thread_id=thread_id
+            ).exclude(sender=user).exclude(read_by=user).values_list("id", flat=True)
+        )
+        ReadBy = Message.read_by.through
+        ReadBy.objects.bulk_create(
+            [ReadBy(message_id=message_id, user_id=user.id) for message_id in message_ids],
+            ignore_conflicts=True,
+        )
+        return max(message_ids, default=0)
 
-    async def mark_messages_as_read(self, user):
-        unread_messages = await self.get_unread_messages(user)
-        logger.info(f"Marking {len(unread_messages)} messages as read by user {user.id}")
-        
+    async def mark_messages_as_read(self, thread_id, user):
         # Instagram-style: Only send one read receipt for the latest message
-        # This improves performance and better matches Instagram behavior
-        latest_message_id = 0
-        
-        for message in unread_messages:
-            await sync_to_async(message.read_by.add)(user)
-            logger.info(f"Message {message.id} marked as read by user {user.id}")
-            if message.id > latest_message_id:
-                latest_message_id = message.id
-        
-        # Only send one read receipt for the latest message
         # This will cause the frontend to mark all messages as read up to this point
+        latest_message_id = await self.mark_thread_read(thread_id, user)
         if latest_message_id > 0:
-            logger.info(f"Sending read receipt for latest message {latest_message_id}")
+            logger.info(f"Sending read receipt for latest message {latest_message_id} read by user {user.id}")
             await self.channel_layer.group_send(
-                self.room_group_name,
+                f"chat_{thread_id}",
                 {
                     "type": "read_receipt",
+                    "thread_id": int(thread_id),
                     "message_id": latest_message_id,
                     "reader_id": user.id,
                 }
             )
 
-    async def receive(self, text_data):
-        data = json.loads(text_data)
-        user = self.scope['user']
-
-        if data.get("type") == "mark_read":
-            logger.info(f"User {user.id} ({user.username}) marking messages as read in thread {self.thread_id}")
-            await self.mark_messages_as_read(user)
-            
-            # Send a mark_read update to the conversation list consumer
-            # This will update the conversation list UI in real-time
-            thread_users = await self.get_thread_users()
-            for u in thread_users:
-                unread_count = await self.get_unread_count(self.thread_id, u)
-                await self.channel_layer.group_send(
-                    f"conversations_{u.id}",
-                    {
-                        "type": "mark_read_update",
-                        "chat_id": self.thread_id,
-                        "unread_count": unread_count,
-                        "reader_id": user.id,
-                    }
-                )
-            return
+    async def handle_mark_read(self, thread_id, user):
+        logger.info(f"User {user.id} ({user.username}) marking messages as read in thread {thread_id}")
+        await self.mark_messages_as_read(thread_id, user)
+        
+        # Send a mark_read update to the conversation list consumer
+        # This will update the conversation list UI in real-time
+        for member_id, unread_count in await self.get_member_unread_counts(thread_id):
+            await apublish_user_event(
+                member_id,
+                INBOX,
+                {
+                    "type": "mark_read_update",
+                    "chat_id": thread_id,
+                    "unread_count": unread_count,
+                    "reader_id": user.id,
+                },
+                self.channel_layer,
+            )
 
+    async def handle_presence_ping(self, user):
         # Heartbeat from client to refresh presence TTL (does not increment counter)
-        if data.get("type") == "presence_ping":
-            try:
-                from users.presence import refresh_presence
-
-                new_count = refresh_presence(user.id)
-                logger.debug(f"Presence ping for user {user.id}, count={new_count}")
-
-                # If key was missing and we set it to 1, broadcast online status
-                if new_count == 1:
-                    # Notify all participants in threads with this user
-                    thread_list = await sync_to_async(list)(Thread.objects.filter(users=user))
-                    for thread in thread_list:
-                        participants = await sync_to_async(list)(thread.users.exclude(id=user.id))
-                        for p in participants:
-                            await self.channel_layer.group_send(
-                                f"conversations_{p.id}",
-                                {
-                                    "type": "presence_update",
-                                    "user_id": user.id,
-                                    "online": True,
-                                }
-                            )
-            except Exception as e:
-                logger.error(f"Presence ping error: {e}")
-            return
+        try:
+            from users.presence_async import refresh_presence
 
-        text = data.get("text", "").strip()
-        if not text:
-            return
+            new_count, created = await refresh_presence(user.id)
+            logger.debug(f"Presence ping for user {user.id}, count={new_count}")
 
-        payload = await self.save_message(user, text)
+            # If the key had expired and was recreated, broadcast online status
+            if created:
+                await broadcast_presence(self.channel_layer, user.id, online=True)
+        except Exception as e:
+            logger.error(f"Presence ping error: {e}")
+
+    async def handle_chat_text(self, thread_id, user, text):
+        started = time.perf_counter()
+        payload = await self.save_message(thread_id, user, text)
         payload["readByIds"] = payload.pop("read_by_ids")  # Fix naming for frontend
 
         await self.channel_layer.group_send(
-            self.room_group_name,
+            f"chat_{thread_id}",
             {
                 "type": "chat_message",
+                "thread_id": int(thread_id),
                 **payload,
             }
         )
 
-        users = await self.get_thread_users()
-        for u in users:
-            unread_count = await self.get_unread_count(self.thread_id, u)
-
-            await self.channel_layer.group_send(
-                f"conversations_{u.id}",
+        for member_id, unread_count in await self.get_member_unread_counts(thread_id):
+            await apublish_user_event(
+                member_id,
+                INBOX,
                 {
                     "type": "chat_update",
-                    "chat_id": self.thread_id,
+                    "chat_id": thread_id,
                     "message": payload["text"],
                     "sender": {
                         "username": user.username,
@@ -182,11 +253,63 @@ class ChatConsumer(AsyncWebsocketConsumer):
                         "id": user.id
                     },
                     "timestamp": payload["timestamp"],
-                    "is_sender": u.id == user.id,
+                    "is_sender": member_id == user.id,
                     "unread_count": unread_count
-                }
+                },
+                self.channel_layer,
             )
 
+        logger.debug(f"Chat message {payload['id']} in thread {thread_id} sent in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+class ChatConsumer(ChatThreadMixin, AsyncWebsocketConsumer):
+    async def connect(self):
+        self.thread_id = self.scope['url_route']['kwargs']['thread_id']
+        self.room_group_name = f'chat_{self.thread_id}'
+        user = self.scope["user"]
+
+        if user.is_anonymous:
+            await self.close(code=4001)
+            return
+
+        if not await self.user_in_thread(self.thread_id, user):
+            await self.close(code=4003)
+            return
+
+        await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+        await self.load_sender(user)
+        await self.accept()
+        try:
+            await self.mark_messages_as_read(self.thread_id, user)
+        except ExecutorSaturated as e:
+            # Not fatal: the client marks the thread read again once it is idle
+            logger.warning(f"Skipped marking thread {self.thread_id} read on connect: {e}")
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'room_group_name'):
+            await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+
+    async def receive(self, text_data):
+        data = json.loads(text_data)
+        user = self.scope['user']
+
+        if data.get("type") == "presence_ping":
+            await self.handle_presence_ping(user)
+            return
+
+        try:
+            if data.get("type") == "mark_read":
+                await self.handle_mark_read(self.thread_id, user)
+                return
+
+            text = data.get("text", "").strip()
+            if not text:
+                return
+
+            await self.handle_chat_text(self.thread_id, user, text)
+        except ExecutorSaturated:
+            await self.send(text_data=json.dumps({"type": "error", "message": SERVER_BUSY_MESSAGE, "retry": True}))
+
     async def chat_message(self, event):
         user = self.scope['user']
         is_own = user.username == event.get('sender') if user and not isinstance(user, AnonymousUser) else False
@@ -197,7 +320,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
             sender_username = event.get('sender')
             if sender_username:
                 try:
-                    sender = await sync_to_async(User.objects.get)(username=sender_username)
+                    sender = await run_in_executor("chat", User.objects.get, username=sender_username)
                     event['sender_id'] = sender.id
                 except Exception as e:
                     logger.error(f"Failed to get sender_id: {e}")
@@ -226,30 +349,16 @@ class ConversationConsumer(AsyncWebsocketConsumer):
             await self.channel_layer.group_add(self.room_group_name, self.channel_name)
             await self.accept()
 
-            # Presence: increment counter and broadcast status if transitioned to online
-            try:
-                from users.presence import increment_presence, is_user_online
-                new_count = increment_presence(user.id)
-                logger.info(f"User {user.id} presence incremented to {new_count}")
-
-                # If this connection made the user go from 0 -> 1, broadcast online status
-                if new_count == 1:
-                    # Notify all participants in threads with this user
-                    from .models import Thread
-                    thread_list = await sync_to_async(list)(Thread.objects.filter(users=user))
-                    for thread in thread_list:
-                        participants = await sync_to_async(list)(thread.users.exclude(id=user.id))
-                        for p in participants:
-                            await self.channel_layer.group_send(
-                                f"conversations_{p.id}",
-                                {
-                                    "type": "presence_update",
-                                    "user_id": user.id,
-                                    "online": True,
-                                }
-                            )
-            except Exception as e:
-                logger.error(f"Presence increment error: {e}")
+            # Resumable sync: replay what the client missed since its last seen seq
+            since = get_since_param(self.scope)
+            if since is not None:
+                try:
+                    await replay_missed_events(self, user.id, INBOX, since)
+                except Exception as e:
+                    logger.error(f"Event replay error for user {user.id}: {e}")
+                    await self.send(text_data=json.dumps({"type": "resync_required"}))
+
+            await presence_connected(self.channel_layer, user)
 
         except Exception as e:
             logger.error(f"ConversationConsumer connect error: {str(e)}")
@@ -260,43 +369,7 @@ class ConversationConsumer(AsyncWebsocketConsumer):
             if hasattr(self, 'room_group_name'):
                 await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
 
-            # Presence: decrement counter and broadcast if transitioned to offline
-            try:
-                from users.presence import decrement_presence, is_user_online
-                new_count = decrement_presence(self.scope['user'].id)
-                logger.info(f"User {self.scope['user'].id} presence decremented to {new_count}")
-
-                if new_count == 0:
-                    from .models import Thread
-                    # Update last_seen first so we can include it in the presence payload
-                    now = timezone.now()
-                    try:
-                        def set_last_seen(user, at_time):
-                            # Use a direct update to avoid possible profile related attribute errors
-                            Profile.objects.filter(user=user).update(last_seen=at_time)
-
-                        await sync_to_async(set_last_seen)(self.scope['user'], now)
-                        logger.info(f"Set last_seen for user {self.scope['user'].id} to {now}")
-                    except Exception as e:
-                        logger.error(f"Failed to set last_seen for user {self.scope['user'].id}: {e}")
-
-                    # Broadcast presence update including last_active timestamp
-                    last_active_iso = now.isoformat()
-                    thread_list = await sync_to_async(list)(Thread.objects.filter(users=self.scope['user']))
-                    for thread in thread_list:
-                        participants = await sync_to_async(list)(thread.users.exclude(id=self.scope['user'].id))
-                        for p in participants:
-                            await self.channel_layer.group_send(
-                                f"conversations_{p.id}",
-                                {
-                                    "type": "presence_update",
-                                    "user_id": self.scope['user'].id,
-                                    "online": False,
-                                    "last_active": last_active_iso,
-                                }
-                            )
-            except Exception as e:
-                logger.error(f"Presence decrement error: {e}")
+            await presence_disconnected(self.channel_layer, self.scope['user'])
 
         except Exception as e:
             logger.error(f"ConversationConsumer disconnect error: {str(e)}")
@@ -308,7 +381,8 @@ class ConversationConsumer(AsyncWebsocketConsumer):
                 "type": "mark_read_update",
                 "chat_id": event["chat_id"],
                 "unread_count": event["unread_count"],
-                "reader_id": event["reader_id"]
+                "reader_id": event["reader_id"],
+                "seq": event.get("seq"),
             }))
         except Exception as e:
             logger.error(f"ConversationConsumer mark_read_update error: {str(e)}")
@@ -330,7 +404,15 @@ class ConversationConsumer(AsyncWebsocketConsumer):
             # If a last_active timestamp was included, forward it to clients
             if event.get("last_active"):
                 payload["last_active"] = event.get("last_active")
+            if event.get("seq"):
+                payload["seq"] = event["seq"]
 
             await self.send(text_data=json.dumps(payload))
         except Exception as e:
-            logger.error(f"ConversationConsumer presence_update error: {str(e)}")
\ No newline at end of file
+            logger.error(f"ConversationConsumer presence_update error: {str(e)}")
+
+    async def chat_removed(self, event):
+        try:
+            await self.send(text_data=json.dumps(event))
+        except Exception as e:
+            logger.error(f"ConversationConsumer chat_removed error: {str(e)}")
@@ -7,6 +7,7 @@ class Migration(migrations.Migration):
 
     dependencies = [
         ('chats', '0004_message_file_message_image_alter_message_text'),
+        ('posts', '0001_initial'),
     ]
 
     operations = [
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.2 on 2026-10-19 09:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0005_add_shared_post'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['thread', 'id'], name='chats_msg_thread_id_idx'),
+        ),
+    ]
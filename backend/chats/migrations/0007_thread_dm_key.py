@@ -0,0 +1,49 @@
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def merge_duplicate_dm_threads(apps, schema_editor):
+    """Merge threads between the same two users into the oldest one and key it."""
+    Thread = apps.get_model('chats', 'Thread')
+    Message = apps.get_model('chats', 'Message')
+    Membership = Thread.users.through
+
+    members = defaultdict(set)
+    for thread_id, user_id in Membership.objects.values_list('thread_id', 'user_id').iterator():
+        members[thread_id].add(user_id)
+
+    threads_by_key = defaultdict(list)
+    for thread_id, user_ids in members.items():
+        if len(user_ids) != 2:
+            continue
+        low, high = sorted(user_ids)
+        threads_by_key[f"{low}:{high}"].append(thread_id)
+
+    for key, thread_ids in threads_by_key.items():
+        thread_ids.sort()
+        keep, duplicates = thread_ids[0], thread_ids[1:]
+        if duplicates:
+            latest = Thread.objects.filter(id__in=thread_ids).aggregate(latest=Max('updated'))['latest']
+            Message.objects.filter(thread_id__in=duplicates).update(thread_id=keep)
+            Thread.objects.filter(id__in=duplicates).delete()
+            Thread.objects.filter(id=keep).update(dm_key=key, updated=latest)
+        else:
+            Thread.objects.filter(id=keep).update(dm_key=key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0006_message_thread_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='thread',
+            name='dm_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True),
+        ),
+        migrations.RunPython(merge_duplicate_dm_threads, migrations.RunPython.noop),
+    ]
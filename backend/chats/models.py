@@ -1,11 +1,41 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
 from django.contrib.auth.models import User
 from django.utils import timezone
 
 
+def dm_key_for(user_id, other_id):
+    """Canonical key of the direct-message thread between two users (order-independent)."""
+    low, high = sorted((int(user_id), int(other_id)))
+    return f"{low}:{high}"
+
+
+class ThreadManager(models.Manager):
+    def get_or_create_dm(self, user, other):
+        """Return ``(thread, created)`` for the direct-message thread between two users.
+
+        Looks the thread up by its unique ``dm_key``; concurrent creators race on
+        that unique index and the loser simply fetches the winner's thread.
+        """
+        key = dm_key_for(user.id, other.id)
+        thread = self.filter(dm_key=key).first()
+        if thread:
+            return thread, False
+        try:
+            with transaction.atomic():
+                thread = self.create(dm_key=key)
+                thread.users.add(user, other)
+            return thread, True
+        except IntegrityError:
+            return self.get(dm_key=key), False
+
+
 class Thread(models.Model):
     users = models.ManyToManyField(User)
     updated = models.DateTimeField(auto_now=True)
+    # "<min_user_id>:<max_user_id>" for direct-message threads
+    dm_key = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
+
+    objects = ThreadManager()
 
     def last_message(self):
         return self.messages.order_by('-timestamp').first()
@@ -20,6 +50,12 @@ class Message(models.Model):
     shared_post = models.ForeignKey('posts.Post', on_delete=models.CASCADE, null=True, blank=True)
     timestamp = models.DateTimeField(default=timezone.now)
     read_by = models.ManyToManyField(User, related_name='read_messages', blank=True)
-    
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of a thread's history (before_id / after_id cursors)
+            models.Index(fields=['thread', 'id'], name='chats_msg_thread_id_idx'),
+        ]
+
     def is_read_by(self, user):
         return self.read_by.filter(id=user.id).exists()
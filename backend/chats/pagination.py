@@ -1,5 +1,101 @@
-from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
-class MessagePagination(LimitOffsetPagination):
+
+class MessageCursorPagination(BasePagination):
+    """Keyset pagination over ``(thread_id, id)`` for message history.
+
+    - no cursor: the latest ``limit`` messages
+    - ``?before_id=N``: up to ``limit`` messages older than N (scroll back)
+    - ``?after_id=N``: up to ``limit`` messages newer than N (catch up)
+
+    Each page is returned oldest-first and no COUNT query is issued.
+    """
     default_limit = 20
     max_limit = 100
+    limit_query_param = 'limit'
+    before_query_param = 'before_id'
+    after_query_param = 'after_id'
+
+    def _get_int_param(self, request, name):
+        value = request.query_params.get(name)
+        if value in (None, ''):
+            return None
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            raise ValidationError({name: 'Must be an integer.'})
+        if value < 0:
+            raise ValidationError({name: 'Must be a positive integer.'})
+        return value
+
+    def get_limit(self, request):
+        limit = self._get_int_param(request, self.limit_query_param)
+        if not limit:
+            return self.default_limit
+        return min(limit, self.max_limit)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        before_id = self._get_int_param(request, self.before_query_param)
+        after_id = self._get_int_param(request, self.after_query_param)
+        if before_id is not None and after_id is not None:
+            raise ValidationError({'detail': 'Use either before_id or after_id, not both.'})
+
+        # Fetch one extra row to know whether another page exists in that direction
+        if after_id is not None:
+            rows = list(queryset.filter(id__gt=after_id).order_by('id')[:self.limit + 1])
+            self.has_newer = len(rows) > self.limit
+            rows = rows[:self.limit]
+            # Everything up to the cursor is older than this page
+            self.has_older = queryset.filter(id__lte=after_id).exists()
+        else:
+            older = queryset if before_id is None else queryset.filter(id__lt=before_id)
+            rows = list(older.order_by('-id')[:self.limit + 1])
+            self.has_older = len(rows) > self.limit
+            rows = rows[:self.limit]
+            rows.reverse()
+            self.has_newer = before_id is not None and queryset.filter(id__gte=before_id).exists()
+
+        self.page = rows
+        return rows
+
+    def _link(self, param, value):
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.before_query_param)
+        url = remove_query_param(url, self.after_query_param)
+        return replace_query_param(url, param, value)
+
+    def get_previous_link(self):
+        if not self.page or not self.has_older:
+            return None
+        return self._link(self.before_query_param, self.page[0].id)
+
+    def get_next_link(self):
+        if not self.page or not self.has_newer:
+            return None
+        return self._link(self.after_query_param, self.page[-1].id)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'has_older': self.has_older,
+            'has_newer': self.has_newer,
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'has_older': {'type': 'boolean'},
+                'has_newer': {'type': 'boolean'},
+                'results': schema,
+            },
+        }
@@ -1,8 +1,83 @@
 from rest_framework import serializers
 from .models import Thread, Message
+from django.db.models import Count, OuterRef, Subquery
 from django.utils import timezone
 from users.models import Profile
 
+
+def get_read_by_map(message_ids):
+    """Return {message_id: [user_id, ...]} for the given messages in one query."""
+    read_by = {message_id: [] for message_id in message_ids}
+    rows = Message.read_by.through.objects.filter(
+        message_id__in=message_ids
+    ).values_list('message_id', 'user_id')
+    for message_id, user_id in rows:
+        read_by[message_id].append(user_id)
+    return read_by
+
+
+def get_conversation_partners(thread_ids, user_id):
+    """Return {thread_id: other user (with profile)} for the given threads in one query."""
+    rows = Thread.users.through.objects.filter(
+        thread_id__in=thread_ids
+    ).exclude(user_id=user_id).select_related('user__profile').order_by('id')
+    partners = {}
+    for row in rows:
+        partners.setdefault(row.thread_id, row.user)
+    return partners
+
+
+def get_last_messages(thread_ids):
+    """Return {thread_id: latest Message} for the given threads in two queries."""
+    latest_ids = Thread.objects.filter(id__in=thread_ids).annotate(
+        last_message_id=Subquery(
+            Message.objects.filter(thread=OuterRef('pk')).order_by('-timestamp', '-id').values('id')[:1]
+        )
+    ).values_list('last_message_id', flat=True)
+    messages = Message.objects.filter(
+        id__in=[message_id for message_id in latest_ids if message_id]
+    ).select_related('sender', 'shared_post')
+    return {message.thread_id: message for message in messages}
+
+
+def get_unread_counts(thread_ids, user):
+    """Return {thread_id: unread count} for ``user`` in one grouped query."""
+    rows = Message.objects.filter(
+        thread_id__in=thread_ids
+    ).exclude(sender=user).exclude(read_by=user).values('thread_id').annotate(unread=Count('id'))
+    counts = {thread_id: 0 for thread_id in thread_ids}
+    for row in rows:
+        counts[row['thread_id']] = row['unread']
+    return counts
+
+
+def get_conversation_context(threads, user):
+    """Batch-load everything ConversationSerializer needs for ``threads``."""
+    from users.presence import get_online_user_ids
+
+    thread_ids = [thread.id for thread in threads]
+    partners = get_conversation_partners(thread_ids, user.id)
+    return {
+        'partners': partners,
+        'last_messages': get_last_messages(thread_ids),
+        'unread_counts': get_unread_counts(thread_ids, user),
+        'online_ids': get_online_user_ids([partner.id for partner in partners.values()]),
+    }
+
+
+class MessageListSerializer(serializers.ListSerializer):
+    """Batch-load read state for a page of messages before serializing it.
+
+    Senders and shared posts are expected to be loaded with
+    ``select_related('sender', 'shared_post__user')`` on the queryset.
+    """
+
+    def to_representation(self, data):
+        messages = list(data.all() if hasattr(data, 'all') else data)
+        self.child.context['read_by_map'] = get_read_by_map([m.id for m in messages])
+        return super().to_representation(messages)
+
+
 class MessageSerializer(serializers.ModelSerializer):
     sender = serializers.SerializerMethodField()
     sender_id = serializers.SerializerMethodField()
@@ -16,22 +91,24 @@ class MessageSerializer(serializers.ModelSerializer):
     class Meta:
         model = Message
         fields = ['id', 'sender', 'sender_id', 'text', 'image', 'file', 'shared_post', 'time', 'isOwn', 'readByIds']
+        list_serializer_class = MessageListSerializer
 
     def get_sender(self, obj):
         return obj.sender.username
         
     def get_sender_id(self, obj):
-        return obj.sender.id
+        return obj.sender_id
 
     def get_isOwn(self, obj):
         request = self.context.get('request')
-        return request and obj.sender == request.user
+        return bool(request) and obj.sender_id == request.user.id
     
     def get_readByIds(self, obj):
         # Return the IDs of users who have read this message
-        read_by_ids = list(obj.read_by.values_list('id', flat=True))
-        print(f"Message {obj.id} readByIds: {read_by_ids}")  # Add debug log
-        return read_by_ids
+        read_by_map = self.context.get('read_by_map')
+        if read_by_map is not None and obj.id in read_by_map:
+            return read_by_map[obj.id]
+        return list(obj.read_by.values_list('id', flat=True))
     
     def get_image(self, obj):
         if obj.image:
@@ -51,7 +128,7 @@ class MessageSerializer(serializers.ModelSerializer):
         return local_dt.strftime("%-I:%M %p")
 
     def get_shared_post(self, obj):
-        if not obj.shared_post:
+        if not obj.shared_post_id:
             return None
         request = self.context.get('request')
         post = obj.shared_post
@@ -85,9 +162,25 @@ class ConversationSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'fullName', 'avatar', 'lastMessage', 'time', 'unread_count', 'online', 'last_active', 'partner_id']
 
     def get_other_user(self, obj):
+        partners = self.context.get('partners')
+        if partners is not None:
+            return partners.get(obj.id)
         user = self.context['request'].user
         return obj.users.exclude(id=user.id).first()
 
+    def get_last_message(self, obj):
+        last_messages = self.context.get('last_messages')
+        if last_messages is not None:
+            return last_messages.get(obj.id)
+        return obj.last_message()
+
+    def is_online(self, user_id):
+        online_ids = self.context.get('online_ids')
+        if online_ids is not None:
+            return user_id in online_ids
+        from users.presence import is_user_online
+        return is_user_online(user_id)
+
     def get_username(self, obj):
         other = self.get_other_user(obj)
         return other.username if other else "Unknown"
@@ -112,7 +205,7 @@ class ConversationSerializer(serializers.ModelSerializer):
         return None
 
     def get_lastMessage(self, obj):
-        last = obj.last_message()
+        last = self.get_last_message(obj)
         if not last:
             return ""
         
@@ -121,42 +214,45 @@ class ConversationSerializer(serializers.ModelSerializer):
         # If the last message is a shared post, show an attachment-like preview
         if getattr(last, 'shared_post', None):
             verb = 'sent an attachment.'
-            if current_user and last.sender == current_user:
+            if current_user and last.sender_id == current_user.id:
                 return f"You {verb}"
             return f"{self.get_short_name(obj)} {verb}"
 
         # If the last message contains an image or file, show a friendly preview
         if getattr(last, 'image', None):
             verb = 'sent a photo.'
-            if current_user and last.sender == current_user:
+            if current_user and last.sender_id == current_user.id:
                 return f"You {verb}"
             return f"{self.get_short_name(obj)} {verb}"
 
         if getattr(last, 'file', None):
             verb = 'sent a file.'
-            if current_user and last.sender == current_user:
+            if current_user and last.sender_id == current_user.id:
                 return f"You {verb}"
             return f"{self.get_short_name(obj)} {verb}"
 
         # Fallback to text if present
         if last.text:
-            if current_user and last.sender == current_user:
+            if current_user and last.sender_id == current_user.id:
                 return f"You: {last.text}"
             return last.text
 
         # Default fallback when no text/image/file
-        if current_user and last.sender == current_user:
+        if current_user and last.sender_id == current_user.id:
             return "You sent a file"
         return f"{self.get_short_name(obj)} sent a file."
 
     def get_time(self, obj):
-        last = obj.last_message()
+        last = self.get_last_message(obj)
         if last and last.timestamp:
             local_dt = timezone.localtime(last.timestamp)
             return local_dt.strftime("%-I:%M %p")
         return ""
 
     def get_unread_count(self, obj):
+        unread_counts = self.context.get('unread_counts')
+        if unread_counts is not None:
+            return unread_counts.get(obj.id, 0)
         user = self.context['request'].user
         # Only count messages from other users that haven't been read by the current user
         unread_count = obj.messages.exclude(sender=user).exclude(read_by=user).count()
@@ -169,8 +265,7 @@ class ConversationSerializer(serializers.ModelSerializer):
             other = self.get_other_user(obj)
             if not other:
                 return False
-            from users.presence import is_user_online
-            return is_user_online(other.id)
+            return self.is_online(other.id)
         except Exception:
             # Fallback to False on any error
             return False
@@ -182,8 +277,7 @@ class ConversationSerializer(serializers.ModelSerializer):
             if not other:
                 return None
             # If user is currently online, we can optionally return "now" or None
-            from users.presence import is_user_online
-            if is_user_online(other.id):
+            if self.is_online(other.id):
                 return None
 
             profile = getattr(other, 'profile', None)
@@ -201,9 +295,7 @@ class ConversationSerializer(serializers.ModelSerializer):
         
     def get_partner_id(self, obj):
         other_user = self.get_other_user(obj)
-        partner_id = other_user.id if other_user else None
-        print(f"Thread {obj.id}: partner_id = {partner_id}")
-        return partner_id
+        return other_user.id if other_user else None
     
 class MinimalUserSerializer(serializers.ModelSerializer):
     avatar = serializers.SerializerMethodField()
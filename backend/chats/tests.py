@@ -1,3 +1,212 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from backend.redis_client import get_redis
+from chats.consumers import ChatThreadMixin
+from chats.models import Message, Thread, dm_key_for
+from chats.serializers import MessageSerializer
+from posts.models import Post
+
+
+def auth_headers(user) -> dict:
+    return {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(user)}"}
+
+
+class MessageCursorPaginationTests(TestCase):
+    def setUp(self):
+        get_redis().flushdb()
+        self.user = User.objects.create_user(username="alice", password="x")
+        other = User.objects.create_user(username="bob", password="x")
+        self.thread = Thread.objects.create()
+        self.thread.users.add(self.user, other)
+        self.ids = [Message.objects.create(thread=self.thread, sender=self.user, text=str(i)).id for i in range(5)]
+        self.url = f"/api/chats/threads/{self.thread.id}/messages/"
+
+    def page(self, **params):
+        response = self.client.get(self.url, {"limit": 2, **params}, **auth_headers(self.user))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return [message["id"] for message in data["results"]], data["has_older"], data["has_newer"]
+
+    def test_latest_page(self):
+        self.assertEqual(self.page(), (self.ids[3:], True, False))
+
+    def test_scroll_back_to_the_first_message(self):
+        self.assertEqual(self.page(before_id=self.ids[3]), (self.ids[1:3], True, True))
+        self.assertEqual(self.page(before_id=self.ids[1]), (self.ids[:1], False, True))
+
+    def test_catch_up_reports_whether_older_messages_exist(self):
+        self.assertEqual(self.page(after_id=self.ids[0]), (self.ids[1:3], True, True))
+        self.assertEqual(self.page(after_id=self.ids[2]), (self.ids[3:], True, False))
+        # A cursor before the thread's first message has nothing older
+        self.assertEqual(self.page(after_id=0), (self.ids[:2], False, True))
+
+    def test_cursor_past_the_newest_message_has_nothing_newer(self):
+        self.assertEqual(self.page(before_id=self.ids[-1] + 100), (self.ids[3:], True, False))
+
+
+class MessageSerializerQueryTests(TestCase):
+    def setUp(self):
+        get_redis().flushdb()
+        self.user = User.objects.create_user(username="alice", password="x")
+        self.other = User.objects.create_user(username="bob", password="x")
+        self.thread = Thread.objects.create()
+        self.thread.users.add(self.user, self.other)
+        post = Post.objects.create(user=self.other, caption="shared")
+        for i in range(6):
+            message = Message.objects.create(
+                thread=self.thread, sender=self.user if i % 2 else self.other, text=str(i),
+                shared_post=post if i % 3 == 0 else None,
+            )
+            message.read_by.add(self.user, self.other)
+
+    def serialize(self, size):
+        request = RequestFactory().get("/", HTTP_HOST="localhost")
+        request.user = self.user
+        messages = Message.objects.filter(thread=self.thread).select_related(
+            "sender", "shared_post__user"
+        ).order_by("-id")[:size]
+        return MessageSerializer(messages, many=True, context={"request": request}).data
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        for size in (1, 3, 6):
+            with self.subTest(size=size), self.assertNumQueries(2):
+                data = self.serialize(size)
+            self.assertEqual(len(data), size)
+            self.assertEqual([set(message["readByIds"]) for message in data], [{self.user.id, self.other.id}] * size)
+
+
+class ChatConsumerQueryTests(TestCase):
+    """The consumers' per-message database work takes a fixed number of queries."""
+
+    def setUp(self):
+        get_redis().flushdb()
+        self.users = [User.objects.create_user(username=f"user{i}", password="x") for i in range(4)]
+        self.thread = Thread.objects.create()
+        self.thread.users.add(*self.users)
+        self.consumer = ChatThreadMixin()
+
+    def call(self, method, *args):
+        # Undecorated, so the queries run on this thread's connection instead of the chat executor's
+        return getattr(ChatThreadMixin, method).__wrapped__(self.consumer, *args)
+
+    def test_save_message(self):
+        sender = self.users[0]
+        with self.assertNumQueries(2):
+            payload = self.call("save_message", self.thread.id, sender, "hi")
+        message = Message.objects.get(id=payload["id"])
+        self.assertEqual(list(message.read_by.all()), [sender])
+
+    def test_member_unread_counts(self):
+        for sender in self.users[:3]:
+            for _ in range(3):
+                self.call("save_message", self.thread.id, sender, "hi")
+
+        with self.assertNumQueries(1):
+            counts = dict(self.call("get_member_unread_counts", self.thread.id))
+        self.assertEqual(counts, {self.users[0].id: 6, self.users[1].id: 6, self.users[2].id: 6, self.users[3].id: 9})
+
+    def test_mark_thread_read_does_not_grow_with_unread_messages(self):
+        reader = self.users[3]
+        for count in (1, 5):
+            with self.subTest(unread=count):
+                ids = [self.call("save_message", self.thread.id, self.users[0], "hi")["id"] for _ in range(count)]
+                with self.assertNumQueries(2):
+                    self.assertEqual(self.call("mark_thread_read", self.thread.id, reader), ids[-1])
+                self.assertFalse(Message.objects.filter(thread=self.thread).exclude(read_by=reader).exists())
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.call("mark_thread_read", self.thread.id, reader), 0)
+
+
+class DirectThreadTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username="alice", password="x")
+        self.bob = User.objects.create_user(username="bob", password="x")
+
+    def test_either_user_gets_the_same_thread(self):
+        thread, created = Thread.objects.get_or_create_dm(self.alice, self.bob)
+        self.assertTrue(created)
+        self.assertEqual(thread.dm_key, dm_key_for(self.bob.id, self.alice.id))
+        self.assertEqual(Thread.objects.get_or_create_dm(self.bob, self.alice), (thread, False))
+
+    def test_losing_a_creation_race_returns_the_winners_thread(self):
+        winner = Thread.objects.create(dm_key=dm_key_for(self.alice.id, self.bob.id))
+        winner.users.add(self.alice, self.bob)
+
+        # The lookup ran before the other request committed, so the insert hits the unique dm_key
+        with mock.patch("django.db.models.query.QuerySet.first", return_value=None):
+            thread, created = Thread.objects.get_or_create_dm(self.alice, self.bob)
+
+        self.assertEqual((thread, created), (winner, False))
+        self.assertEqual(Thread.objects.count(), 1)
+
+
+class MergeDuplicateDmThreadsMigrationTests(TransactionTestCase):
+    before = [("chats", "0006_message_thread_id_index")]
+    after = [("chats", "0007_thread_dm_key")]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_duplicate_threads_are_merged_into_the_oldest(self):
+        apps = self.migrate(self.before)
+        User = apps.get_model("auth", "User")
+        Thread = apps.get_model("chats", "Thread")
+        Message = apps.get_model("chats", "Message")
+        alice, bob, carol = (User.objects.create(username=name) for name in ("alice", "bob", "carol"))
+
+        oldest, duplicate, other = (Thread.objects.create() for _ in range(3))
+        oldest.users.add(alice, bob)
+        duplicate.users.add(bob, alice)
+        other.users.add(alice, carol)
+        group = Thread.objects.create()
+        group.users.add(alice, bob, carol)
+        first = Message.objects.create(thread=oldest, sender=alice, text="first")
+        second = Message.objects.create(thread=duplicate, sender=bob, text="second")
+        latest = timezone.now() + timedelta(days=1)
+        Thread.objects.filter(id=duplicate.id).update(updated=latest)
+
+        apps = self.migrate(self.after)
+        Thread = apps.get_model("chats", "Thread")
+        Message = apps.get_model("chats", "Message")
+
+        self.assertFalse(Thread.objects.filter(id=duplicate.id).exists())
+        merged = Thread.objects.get(id=oldest.id)
+        self.assertEqual(merged.dm_key, dm_key_for(alice.id, bob.id))
+        self.assertEqual(merged.updated, latest)
+        self.assertEqual(set(merged.users.values_list("id", flat=True)), {alice.id, bob.id})
+        self.assertEqual(
+            set(Message.objects.filter(id__in=[first.id, second.id]).values_list("thread_id", flat=True)),
+            {oldest.id},
+        )
+        self.assertEqual(Thread.objects.get(id=other.id).dm_key, dm_key_for(alice.id, carol.id))
+        # Group threads are not direct messages
+        self.assertIsNone(Thread.objects.get(id=group.id).dm_key)
+
+
+class ConversationListTests(TestCase):
+    def test_start_conversation_with_a_token_needs_no_csrf_cookie(self):
+        # api/chats/conversations/ is fronted by the async view, which hands POST to ConversationListView
+        user = User.objects.create_user(username="alice", password="x")
+        other = User.objects.create_user(username="bob", password="x")
+        client = Client(enforce_csrf_checks=True)
+
+        response = client.post("/api/chats/conversations/", {"user_id": other.id}, **auth_headers(user))
+
+        self.assertEqual(response.status_code, 201)
+        thread = Thread.objects.get(id=response.json()["thread_id"])
+        self.assertEqual(set(thread.users.all()), {user, other})
@@ -6,80 +6,90 @@ from rest_framework import status
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from .models import Thread, Message
-from .serializers import ConversationSerializer, MessageSerializer, MinimalUserSerializer
-from .pagination import MessagePagination
+from .serializers import (
+    ConversationSerializer,
+    MessageSerializer,
+    MinimalUserSerializer,
+    get_conversation_context,
+    get_conversation_partners,
+    get_last_messages,
+    get_unread_counts,
+)
+from .pagination import MessageCursorPagination
 from django.contrib.auth.models import User
 from users.models import Profile
 from django.db.models import Q, Exists, OuterRef
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
+from backend.events import publish_user_event, INBOX
+from backend.db_router import replica_reads
+from backend.async_views import AsyncAPIView, run_in_worker
+from django.http import JsonResponse
+from users.presence_async import get_online_user_ids
+import asyncio
 import logging
 
 logger = logging.getLogger("django")
 
-class ConversationListView(APIView):
-    permission_classes = [IsAuthenticated]
 
-    def get(self, request):
+def build_conversation_list(threads, context):
+    """Sort and serialize threads for the conversation list. Returns (payload, status)."""
+    last_messages = context['last_messages']
+
+    def last_activity(thread):
+        last_message = last_messages.get(thread.id)
+        timestamp = last_message.timestamp if last_message else thread.updated
+        return timestamp.timestamp() if timestamp else 0
+
+    # Sort ONLY by most recent message timestamp (descending)
+    sorted_threads = sorted(threads, key=last_activity, reverse=True)
+
+    # Attempt to serialize each thread individually so we can log and skip failures
+    results = []
+    errors = []
+    for thread in sorted_threads:
         try:
-            # Get all threads for the user
-            threads = Thread.objects.filter(users=request.user)
-
-            # Build a list of thread metadata with safe timestamp handling
-            threads_list = []
-            for thread in threads:
-                # Get the last message in the thread
-                last_message = thread.last_message()
-
-                # Check if current user has unread messages in this thread
-                unread_count = Message.objects.filter(
-                    thread=thread
-                ).exclude(sender=request.user).exclude(read_by=request.user).count()
-
-                threads_list.append({
-                    'thread': thread,
-                    'last_message_timestamp': last_message.timestamp if last_message else thread.updated,
-                    'unread_count': unread_count
-                })
-
-            # Sort ONLY by most recent message timestamp (descending)
-            # Use safe fallback if timestamp is None
-            threads_list.sort(
-                key=lambda x: -(x['last_message_timestamp'].timestamp() if x['last_message_timestamp'] else 0)
-            )
+            ser = ConversationSerializer(thread, many=False, context=context)
+            results.append(ser.data)
+        except Exception as ex:
+            logger.exception(f"Failed to serialize thread {getattr(thread, 'id', 'unknown')}")
+            errors.append({'thread_id': getattr(thread, 'id', None), 'error': str(ex)})
 
-            # Extract just the threads
-            sorted_threads = [item['thread'] for item in threads_list]
+    # If nothing serialized successfully and we have errors, return 500
+    # But if there are no threads (empty results) and no errors, return an empty list (200 OK)
+    if not results and errors:
+        logger.error("No conversations serialized successfully", extra={'errors': errors})
+        return {'error': 'Failed to serialize conversations', 'details': errors}, status.HTTP_500_INTERNAL_SERVER_ERROR
+
+    # Return results (may be empty) and include any thread-level errors for visibility
+    response_payload = {'conversations': results}
+    if errors:
+        response_payload['errors'] = errors
+    return response_payload, status.HTTP_200_OK
 
-            # Attempt to serialize each thread individually so we can log and skip failures
-            results = []
-            errors = []
-            for thread in sorted_threads:
-                try:
-                    ser = ConversationSerializer(thread, many=False, context={'request': request})
-                    results.append(ser.data)
-                except Exception as ex:
-                    logger.exception(f"Failed to serialize thread {getattr(thread, 'id', 'unknown')}")
-                    errors.append({'thread_id': getattr(thread, 'id', None), 'error': str(ex)})
 
-            # If nothing serialized successfully and we have errors, return 500
-            # But if there are no threads (empty results) and no errors, return an empty list (200 OK)
-            if not results and errors:
-                logger.error("No conversations serialized successfully", extra={'errors': errors})
-                return Response({'error': 'Failed to serialize conversations', 'details': errors}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+def conversation_list_error(e):
+    # Provide minimal debug info in development; hide details in production
+    detail = str(e) if getattr(__import__('os'), 'environ', {}).get('DJANGO_DEBUG', 'False') == 'True' else 'Internal server error'
+    return {'error': 'Failed to load conversations', 'detail': detail}, status.HTTP_500_INTERNAL_SERVER_ERROR
 
-            # Return results (may be empty) and include any thread-level errors for visibility
-            response_payload = {'conversations': results}
-            if errors:
-                response_payload['errors'] = errors
 
-            return Response(response_payload)
+class ConversationListView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @replica_reads
+    def get(self, request):
+        try:
+            # Get all threads for the user and batch-load what the serializer needs
+            threads = list(Thread.objects.filter(users=request.user))
+            context = {'request': request, **get_conversation_context(threads, request.user)}
+            payload, status_code = build_conversation_list(threads, context)
+            return Response(payload, status=status_code)
 
         except Exception as e:
             logger.exception("Failed to load conversations")
-            # Provide minimal debug info in development; hide details in production
-            detail = str(e) if getattr(__import__('os'), 'environ', {}).get('DJANGO_DEBUG', 'False') == 'True' else 'Internal server error'
-            return Response({'error': 'Failed to load conversations', 'detail': detail}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            payload, status_code = conversation_list_error(e)
+            return Response(payload, status=status_code)
     
     def post(self, request):
         user_id = request.data.get('user_id')
@@ -91,26 +101,60 @@ class ConversationListView(APIView):
         except User.DoesNotExist:
             return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
             
-        # Check if a thread already exists between these users
-        threads = Thread.objects.filter(users=request.user).filter(users=other_user)
-        
-        if threads.exists():
-            thread = threads.first()
-        else:
-            # Create a new thread
-            thread = Thread.objects.create()
-            thread.users.add(request.user, other_user)
+        # Reuse the existing thread between these users or create it
+        thread, _ = Thread.objects.get_or_create_dm(request.user, other_user)
             
         return Response({"thread_id": thread.id}, status=status.HTTP_201_CREATED)
 
+
+class ConversationListAsyncView(AsyncAPIView):
+    """Async GET for the conversation list; POST is served by ConversationListView."""
+    sync_view = ConversationListView.as_view()
+
+    @replica_reads
+    async def get(self, request):
+        try:
+            user = request.user
+            threads = [thread async for thread in Thread.objects.filter(users=user)]
+            thread_ids = [thread.id for thread in threads]
+
+            # Independent lookups run concurrently on worker threads
+            partners, last_messages, unread_counts = await asyncio.gather(
+                run_in_worker(get_conversation_partners, thread_ids, user.id),
+                run_in_worker(get_last_messages, thread_ids),
+                run_in_worker(get_unread_counts, thread_ids, user),
+            )
+            online_ids = await get_online_user_ids([partner.id for partner in partners.values()])
+
+            context = {
+                'request': request,
+                'partners': partners,
+                'last_messages': last_messages,
+                'unread_counts': unread_counts,
+                'online_ids': online_ids,
+            }
+            # Everything is preloaded, so serializing does no I/O
+            payload, status_code = build_conversation_list(threads, context)
+            return JsonResponse(payload, status=status_code)
+
+        except Exception as e:
+            logger.exception("Failed to load conversations")
+            payload, status_code = conversation_list_error(e)
+            return JsonResponse(payload, status=status_code)
+
+
 class ThreadMessageListView(ListAPIView):
     serializer_class = MessageSerializer
     permission_classes = [IsAuthenticated]
-    pagination_class = MessagePagination
+    pagination_class = MessageCursorPagination
     
     def get_queryset(self):
         thread_id = self.kwargs['thread_id']
-        return Message.objects.filter(thread_id=thread_id).order_by('timestamp')
+        # Ordering is applied by the paginator (latest-first keyset on id);
+        # read state is batch-loaded by MessageListSerializer
+        return Message.objects.filter(thread_id=thread_id).select_related(
+            'sender', 'shared_post__user'
+        )
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -188,13 +232,7 @@ class SendFirstMessageView(APIView):
                 return Response({"error": "User not found"}, status=404)
 
             # Tạo hoặc lấy Thread between two users
-            # Check if a thread already exists between these two users
-            thread = Thread.objects.filter(users=request.user).filter(users=other_user).first()
-            
-            if not thread:
-                # Create new thread if it doesn't exist
-                thread = Thread.objects.create()
-                thread.users.add(request.user, other_user)
+            thread, _ = Thread.objects.get_or_create_dm(request.user, other_user)
 
             # Tạo message
             message = Message.objects.create(thread=thread, sender=request.user, text=text)
@@ -206,6 +244,7 @@ class SendFirstMessageView(APIView):
                     f"chat_{thread.id}",
                     {
                         "type": "chat_message",
+                        "thread_id": thread.id,
                         "message": message.text,
                         "message_id": message.id,
                         "sender_id": request.user.id,
@@ -310,6 +349,7 @@ class SendMessageWithFileView(APIView):
                     f"chat_{thread.id}",
                     {
                         "type": "chat_message",
+                        "thread_id": thread.id,
                         "message": text if text else ("[Image]" if image_url else (f"[File: {file_info['name']}]" if file_info else "")),
                         "image": image_url,
                         "file": file_info,
@@ -326,8 +366,9 @@ class SendMessageWithFileView(APIView):
                 for u in users:
                     try:
                         unread_count = Message.objects.filter(thread=thread).exclude(sender=u).exclude(read_by=u).count()
-                        async_to_sync(channel_layer.group_send)(
-                            f"conversations_{u.id}",
+                        publish_user_event(
+                            u.id,
+                            INBOX,
                             {
                                 "type": "chat_update",
                                 "chat_id": thread.id,
@@ -343,7 +384,8 @@ class SendMessageWithFileView(APIView):
                                 "timestamp": str(message.timestamp),
                                 "is_sender": u.id == request.user.id,
                                 "unread_count": unread_count
-                            }
+                            },
+                            channel_layer,
                         )
                     except Exception as e:
                         print(f"Failed to send conversation update to user {u.id}: {e}")
@@ -406,6 +448,7 @@ class SharePostView(APIView):
                     f"chat_{thread.id}",
                     {
                         'type': 'chat_message',
+                        'thread_id': thread.id,
                         'message': f"Shared a post",
                         'shared_post': shared_payload,
                         'message_id': message.id,
@@ -419,8 +462,9 @@ class SharePostView(APIView):
                 for u in users:
                     try:
                         unread_count = Message.objects.filter(thread=thread).exclude(sender=u).exclude(read_by=u).count()
-                        async_to_sync(channel_layer.group_send)(
-                            f"conversations_{u.id}",
+                        publish_user_event(
+                            u.id,
+                            INBOX,
                             {
                                 'type': 'chat_update',
                                 'chat_id': thread.id,
@@ -434,7 +478,8 @@ class SharePostView(APIView):
                                 'timestamp': str(message.timestamp),
                                 'is_sender': u.id == request.user.id,
                                 'unread_count': unread_count
-                            }
+                            },
+                            channel_layer,
                         )
                     except Exception as e:
                         print(f"Failed to send conversation update to user {u.id}: {e}")
@@ -464,12 +509,14 @@ class DeleteThreadView(APIView):
             try:
                 channel_layer = get_channel_layer()
                 for u in users:
-                    async_to_sync(channel_layer.group_send)(
-                        f"conversations_{u.id}",
+                    publish_user_event(
+                        u.id,
+                        INBOX,
                         {
                             "type": "chat_removed",
                             "chat_id": thread_id_val,
-                        }
+                        },
+                        channel_layer,
                     )
             except Exception as e:
                 print(f"Failed to notify participants about deleted thread: {e}")
@@ -1,4 +1,6 @@
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from backend.events import NOTIFICATIONS
+from chats.consumers import get_since_param, replay_missed_events
 import logging
 
 logger = logging.getLogger("django")
@@ -18,6 +20,15 @@ class NotificationConsumer(AsyncJsonWebsocketConsumer):
             await self.accept()
             logger.info(f"Notification WebSocket connected for user {user.id} ({user.username})")
 
+            # Resumable sync: replay notifications missed since the client's last seq
+            since = get_since_param(self.scope)
+            if since is not None:
+                try:
+                    await replay_missed_events(self, user.id, NOTIFICATIONS, since)
+                except Exception as e:
+                    logger.error(f"Notification replay error for user {user.id}: {e}")
+                    await self.send_json({"type": "resync_required"})
+
     async def disconnect(self, code):
         if hasattr(self, 'group_name'):
             logger.info(f"Disconnecting user from notification group: {self.group_name}")
@@ -27,4 +38,7 @@ class NotificationConsumer(AsyncJsonWebsocketConsumer):
 
     async def send_notification(self, event):
         logger.info(f"Sending notification: {event.get('notification', {}).get('type', 'unknown')}")
-        await self.send_json(event["notification"])
+        notification = event["notification"]
+        if event.get("seq"):
+            notification = {**notification, "seq": event["seq"]}
+        await self.send_json(notification)
@@ -1,7 +1,7 @@
 import os
 from .models import Notification
 from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from backend.events import publish_user_event, NOTIFICATIONS
 from .serializers import NotificationSerializer
 
 def create_notification(sender, recipient, type, post=None, content=""):
@@ -38,12 +38,14 @@ def create_notification(sender, recipient, type, post=None, content=""):
 
         request = MockRequest(recipient)
         serializer = NotificationSerializer(notification, context={"request": request})
-        async_to_sync(channel_layer.group_send)(
-            f"user_{recipient.id}",
+        publish_user_event(
+            recipient.id,
+            NOTIFICATIONS,
             {
                 "type": "send.notification",
                 "notification": serializer.data,
             },
+            channel_layer,
         )
     except Exception as e:
         print(f"Error sending notification: {e}")  # for debugging
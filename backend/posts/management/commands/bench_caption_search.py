@@ -0,0 +1,94 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from faker import Faker
+
+from posts.models import Post
+from posts.search import search_captions, uses_fulltext
+from users.models import Profile
+
+User = get_user_model()
+
+BENCH_USERNAME = "caption_bench"
+
+
+class Command(BaseCommand):
+    help = "Seed a caption corpus and compare caption search against an icontains scan."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=0, help="Posts to add to the corpus first (e.g. 1000000)")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Posts per bulk insert while seeding")
+        parser.add_argument("--query", action="append", dest="queries", help="Query to time (repeatable)")
+        parser.add_argument("--runs", type=int, default=20, help="Timed runs per query")
+        parser.add_argument("--page-size", type=int, default=10, help="Results fetched per search")
+        parser.add_argument("--skip-baseline", action="store_true", help="Don't time the icontains scan")
+        parser.add_argument("--cleanup", action="store_true", help="Delete the seeded corpus and exit")
+
+    def handle(self, *args, **options):
+        user, created = User.objects.get_or_create(username=BENCH_USERNAME)
+        if created:
+            user.set_unusable_password()
+            user.save()
+            Profile.objects.get_or_create(user=user)
+
+        if options["cleanup"]:
+            deleted, _ = Post.objects.filter(user=user).delete()
+            self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} seeded rows"))
+            return
+
+        fake = Faker()
+        Faker.seed(42)
+        random.seed(42)
+        # Zipf-like word frequencies, so queries range from very common to rare words
+        vocabulary = sorted(set(fake.words(nb=5000)))
+        random.shuffle(vocabulary)
+        weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+
+        if options["seed"]:
+            self.seed_corpus(user, vocabulary, weights, options["seed"], options["batch_size"])
+
+        queries = options["queries"] or [
+            vocabulary[0],
+            vocabulary[len(vocabulary) // 10],
+            vocabulary[-1],
+            f"{vocabulary[1]} {vocabulary[20]}",
+            vocabulary[5][:3],
+        ]
+        total = Post.objects.count()
+        engine = "FULLTEXT" if uses_fulltext() else "icontains fallback (no FULLTEXT on this database)"
+        self.stdout.write(f"{total} posts, caption search uses {engine}")
+        self.stdout.write(f"{'query':<28}{'mode':<10}{'p50 ms':>10}{'p95 ms':>10}{'hits':>8}")
+        for query in queries:
+            modes = [("search", lambda q=query: search_captions(q))]
+            if not options["skip_baseline"]:
+                modes.append(("icontains", lambda q=query: Post.objects.filter(caption__icontains=q).order_by("-posted")))
+            for mode, build in modes:
+                latencies = []
+                for _ in range(options["runs"]):
+                    started = time.perf_counter()
+                    hits = len(list(build()[:options["page_size"]]))
+                    latencies.append((time.perf_counter() - started) * 1000)
+                latencies.sort()
+                p95 = latencies[max(int(len(latencies) * 0.95) - 1, 0)]
+                self.stdout.write(f"{query:<28}{mode:<10}{statistics.median(latencies):>10.1f}{p95:>10.1f}{hits:>8}")
+
+    def seed_corpus(self, user, vocabulary, weights, count, batch_size):
+        self.stdout.write(f"Seeding {count} posts...")
+        started = time.perf_counter()
+        for offset in range(0, count, batch_size):
+            size = min(batch_size, count - offset)
+            Post.objects.bulk_create(
+                [
+                    Post(user=user, caption=" ".join(random.choices(vocabulary, weights, k=random.randint(5, 25))))
+                    for _ in range(size)
+                ],
+                batch_size=batch_size,
+            )
+            self.stdout.write(f"  {offset + size}/{count}")
+        self.stdout.write(
+            f"Seeded in {time.perf_counter() - started:.0f}s. For very large loads on MySQL, dropping the "
+            f"caption index first and running `build_caption_index` afterwards is faster."
+        )
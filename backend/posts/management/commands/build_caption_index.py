@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = "Build the MySQL FULLTEXT index that backs caption search."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default", help="Database alias to build the index on")
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Drop and recreate the index (after bulk loads, or a change to the ft_min_token_size or stopword settings)",
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        if connection.vendor != "mysql":
+            raise CommandError(f"Caption search needs MySQL; {connection.vendor} uses the unindexed fallback")
+
+        if search.fulltext_index_exists(connection):
+            if not options["rebuild"]:
+                self.stdout.write("Caption index already exists (use --rebuild to recreate it)")
+                return
+            self.stdout.write("Dropping caption index...")
+            search.drop_fulltext_index(connection)
+
+        self.stdout.write("Building caption index, this takes a while on large tables...")
+        search.create_fulltext_index(connection)
+        self.stdout.write(self.style.SUCCESS("Caption index built"))
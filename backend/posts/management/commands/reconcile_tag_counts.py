@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import PostTag, Tag
+
+
+class Command(BaseCommand):
+    help = "Recompute Tag.post_count from PostTag rows and fix any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only report tags whose stored count is wrong")
+
+    def handle(self, *args, **options):
+        counts = PostTag.objects.filter(tag=OuterRef("pk")).order_by().values("tag").annotate(n=Count("id")).values("n")
+        drifted = Tag.objects.annotate(actual=Coalesce(Subquery(counts), 0)).exclude(post_count=F("actual"))
+
+        fixed = 0
+        for tag in drifted.only("id", "name", "post_count").iterator():
+            self.stdout.write(f"#{tag.name}: stored {tag.post_count}, actual {tag.actual}")
+            if not options["dry_run"]:
+                # Recount at write time so posts tagged since the scan are included
+                Tag.objects.filter(pk=tag.pk).update(post_count=Coalesce(Subquery(counts), 0))
+            fixed += 1
+
+        action = "Found" if options["dry_run"] else "Fixed"
+        self.stdout.write(self.style.SUCCESS(f"{action} {fixed} tags with a wrong post count"))
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+INDEX_NAME = "posts_post_caption_ft"
+
+
+def add_caption_fulltext_index(apps, schema_editor):
+    # FULLTEXT is MySQL-only; other databases use the icontains fallback in posts.search
+    if schema_editor.connection.vendor != "mysql":
+        return
+    table = schema_editor.quote_name(apps.get_model("posts", "Post")._meta.db_table)
+    schema_editor.execute(f"ALTER TABLE {table} ADD FULLTEXT INDEX {INDEX_NAME} (caption)")
+
+
+def drop_caption_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "mysql":
+        return
+    table = schema_editor.quote_name(apps.get_model("posts", "Post")._meta.db_table)
+    schema_editor.execute(f"ALTER TABLE {table} DROP INDEX {INDEX_NAME}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_post_alt_and_flags'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_caption_fulltext_index, drop_caption_fulltext_index),
+    ]
@@ -76,6 +76,16 @@ class Post(models.Model):
 
 class Tag(models.Model):
     name = models.CharField(max_length=255, unique=True)
+    # Posts carrying this tag; kept current by posts.signals, repaired by reconcile_tag_counts
+    post_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Top tags by prefix: one range scan on name, with counts read from the index
+            models.Index(fields=['name', 'post_count'], name='posts_tag_name_count_idx'),
+            # Trending tags
+            models.Index(fields=['-post_count'], name='posts_tag_count_idx'),
+        ]
 
     def __str__(self):
         return f"#{self.name}"
@@ -0,0 +1,84 @@
+"""Caption search backed by MySQL's FULLTEXT index on ``Post.caption``.
+
+InnoDB keeps the inverted index up to date on every insert, update and
+delete, so posts are searchable as soon as they are saved. Matches are ranked
+by relevance, decayed with age so newer posts win between similar matches:
+
+    rank = relevance / (1 + age_in_days / CAPTION_SEARCH_DECAY_DAYS)
+
+Each query word must appear, as a word or a word prefix ("beac" finds
+"beach"). Other databases (local SQLite) have no FULLTEXT support and fall
+back to a ``caption__icontains`` scan ordered by recency.
+"""
+import re
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+
+from posts.models import Post
+
+FULLTEXT_INDEX_NAME = "posts_post_caption_ft"
+
+_WORD = re.compile(r"\w+")
+
+
+def query_words(query) -> list:
+    # Keep word characters only: +, -, *, quotes and parentheses are boolean-mode operators
+    return _WORD.findall(query or "")
+
+
+def boolean_query(words) -> str:
+    return " ".join(f"+{word}*" for word in words)
+
+
+def uses_fulltext(using=None) -> bool:
+    using = using or router.db_for_read(Post)
+    return connections[using].vendor == "mysql"
+
+
+def fulltext_index_exists(connection) -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM information_schema.statistics"
+            " WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s LIMIT 1",
+            [Post._meta.db_table, FULLTEXT_INDEX_NAME],
+        )
+        return cursor.fetchone() is not None
+
+
+def create_fulltext_index(connection):
+    table = connection.ops.quote_name(Post._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {table} ADD FULLTEXT INDEX {FULLTEXT_INDEX_NAME} (caption)")
+
+
+def drop_fulltext_index(connection):
+    table = connection.ops.quote_name(Post._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {table} DROP INDEX {FULLTEXT_INDEX_NAME}")
+
+
+def search_captions(query, queryset=None):
+    """Posts whose caption contains every word of ``query``, best matches first."""
+    queryset = Post.objects.all() if queryset is None else queryset
+    words = query_words(query)
+    if not words:
+        return queryset.none()
+
+    if not uses_fulltext(queryset.db):
+        for word in words:
+            queryset = queryset.filter(caption__icontains=word)
+        return queryset.order_by("-posted")
+
+    table = connections[queryset.db].ops.quote_name(Post._meta.db_table)
+    match = f"MATCH({table}.`caption`) AGAINST (%s IN BOOLEAN MODE)"
+    return queryset.annotate(
+        relevance=RawSQL(match, (boolean_query(words),), output_field=FloatField()),
+        rank=RawSQL(
+            f"{match} / (1 + TIMESTAMPDIFF(SECOND, {table}.`posted`, UTC_TIMESTAMP()) / 86400.0 / %s)",
+            (boolean_query(words), settings.CAPTION_SEARCH_DECAY_DAYS),
+            output_field=FloatField(),
+        ),
+    ).filter(relevance__gt=0).order_by("-rank", "-posted")
@@ -92,7 +92,7 @@ class PostSerializer(serializers.ModelSerializer):
         return False
     
 class TagSerializer(serializers.ModelSerializer):
-    postCount = serializers.IntegerField(read_only=True)
+    postCount = serializers.IntegerField(source='post_count', read_only=True)
 
     class Meta:
         model = Tag
@@ -2,7 +2,8 @@ import re
 from django.db.models.signals import post_save, m2m_changed, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from posts.models import Post
+from django.db.models import F
+from posts.models import Post, PostTag, Tag
 from notifications.models import Notification
 from notifications.utils import create_notification
 
@@ -56,4 +57,16 @@ def delete_like_notification(sender, instance, action, pk_set, **kwargs):
             
 @receiver(post_delete, sender=Post)
 def delete_post_notifications(sender, instance, **kwargs):
-    Notification.objects.filter(post=instance).delete()
\ No newline at end of file
+    Notification.objects.filter(post=instance).delete()
+
+
+# Keep Tag.post_count current; post deletions cascade to PostTag and fire post_delete per row
+@receiver(post_save, sender=PostTag)
+def increment_tag_post_count(sender, instance, created, **kwargs):
+    if created:
+        Tag.objects.filter(pk=instance.tag_id).update(post_count=F("post_count") + 1)
+
+
+@receiver(post_delete, sender=PostTag)
+def decrement_tag_post_count(sender, instance, **kwargs):
+    Tag.objects.filter(pk=instance.tag_id, post_count__gt=0).update(post_count=F("post_count") - 1)
@@ -1,3 +1,142 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+from unittest import skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from backend.redis_client import get_redis
+from posts import search
+from posts.models import Post, Tag
+from search.views import search_tags
+from users.models import Profile
+
+
+def make_user(username):
+    user = User.objects.create_user(username=username, password="x")
+    Profile.objects.create(user=user)
+    return user
+
+
+def auth_headers(user) -> dict:
+    return {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(user)}"}
+
+
+def make_post(user, caption, age_days=0):
+    post = Post.objects.create(user=user, caption=caption)
+    # posted is auto_now_add, so backdate with update()
+    Post.objects.filter(id=post.id).update(posted=timezone.now() - timedelta(days=age_days))
+    return post
+
+
+class CaptionQueryTests(TestCase):
+    def test_boolean_mode_operators_are_stripped(self):
+        words = search.query_words('+sunset -"beach" (trip)*')
+        self.assertEqual(words, ["sunset", "beach", "trip"])
+        self.assertEqual(search.boolean_query(words), "+sunset* +beach* +trip*")
+
+    def test_index_command_needs_mysql(self):
+        if connection.vendor == "mysql":
+            self.skipTest("builds a real index on MySQL")
+        with self.assertRaises(CommandError):
+            call_command("build_caption_index")
+
+
+class CaptionSearchTests(TransactionTestCase):
+    # InnoDB only indexes committed rows, hence TransactionTestCase
+
+    def setUp(self):
+        get_redis().flushdb()
+        self.user = make_user("alice")
+        self.old_match = make_post(self.user, "Sunset at the beach", age_days=3)
+        self.new_match = make_post(self.user, "Another BEACH sunset", age_days=1)
+        self.partial = make_post(self.user, "Beach volleyball")
+
+    def search(self, query):
+        response = self.client.get("/api/posts/search/", {"q": query}, **auth_headers(self.user))
+        self.assertEqual(response.status_code, 200)
+        return [post["id"] for post in response.json()["results"]]
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.search("sunset beach"), [str(self.new_match.id), str(self.old_match.id)])
+
+    def test_word_prefixes_match(self):
+        self.assertEqual(self.search("volley"), [str(self.partial.id)])
+
+    def test_blank_or_operator_only_queries_match_nothing(self):
+        self.assertEqual(self.search(""), [])
+        self.assertEqual(self.search('+-"'), [])
+
+
+@skipUnless(connection.vendor == "mysql", "FULLTEXT search needs MySQL")
+class FulltextCaptionSearchTests(TransactionTestCase):
+    def setUp(self):
+        get_redis().flushdb()
+        user = make_user("alice")
+        self.old_match = make_post(user, "beach beach beach sunset", age_days=400)
+        self.new_match = make_post(user, "beach sunset")
+        make_post(user, "mountain sunset")
+
+    def test_relevance_decays_with_age(self):
+        self.assertEqual(list(search.search_captions("beach sun")), [self.new_match, self.old_match])
+
+
+class TagCountTests(TestCase):
+    def setUp(self):
+        get_redis().flushdb()
+        self.alice = make_user("alice")
+        self.bob = make_user("bob")
+
+    def counts(self):
+        return dict(Tag.objects.values_list("name", "post_count"))
+
+    def test_counts_follow_post_creates_and_deletes(self):
+        first = make_post(self.alice, "#Beach #sunset")
+        make_post(self.alice, "#beach again #beach")
+        make_post(self.bob, "#beach")
+        self.assertEqual(self.counts(), {"beach": 3, "sunset": 1})
+
+        first.delete()
+        self.assertEqual(self.counts(), {"beach": 2, "sunset": 0})
+
+        # Deleting a user cascades to their posts' PostTag rows
+        self.bob.delete()
+        self.assertEqual(self.counts(), {"beach": 1, "sunset": 0})
+
+    def test_counts_never_go_negative(self):
+        post = make_post(self.alice, "#beach")
+        Tag.objects.update(post_count=0)
+        post.delete()
+        self.assertEqual(self.counts(), {"beach": 0})
+
+    def test_reconcile_repairs_drift(self):
+        make_post(self.alice, "#beach #sunset")
+        make_post(self.bob, "#beach")
+        Tag.objects.filter(name="beach").update(post_count=7)
+        Tag.objects.filter(name="sunset").update(post_count=0)
+        Tag.objects.create(name="unused", post_count=4)
+
+        out = StringIO()
+        call_command("reconcile_tag_counts", "--dry-run", stdout=out)
+        self.assertIn("Found 3 tags", out.getvalue())
+        self.assertEqual(self.counts()["beach"], 7)
+
+        call_command("reconcile_tag_counts", stdout=StringIO())
+        self.assertEqual(self.counts(), {"beach": 2, "sunset": 1, "unused": 0})
+
+        out = StringIO()
+        call_command("reconcile_tag_counts", stdout=out)
+        self.assertIn("Fixed 0 tags", out.getvalue())
+
+    def test_tag_search_matches_prefixes_most_used_first(self):
+        make_post(self.alice, "#beachlife")
+        make_post(self.alice, "#beach")
+        make_post(self.bob, "#beach #beachlife #beaches")
+        make_post(self.bob, "#beach")
+
+        self.assertEqual([tag["name"] for tag in search_tags("#Beach")], ["beach", "beachlife", "beaches"])
+        self.assertEqual([tag["name"] for tag in search_tags("sun")], [])
@@ -5,7 +5,10 @@ from posts.models import Post, Tag, PostImage
 from posts.serializers import PostSerializer
 from rest_framework.response import Response
 from posts.serializers import TagSerializer
+from posts.search import search_captions
 from django.db.models import Count
+from backend.db_router import replica_reads
+from backend.async_views import AsyncAPIView, AsyncPageNumberPagination, invalid_page_response, run_in_worker
 
 class PostViewSet(viewsets.ModelViewSet):
     serializer_class = PostSerializer
@@ -100,6 +103,7 @@ class PostViewSet(viewsets.ModelViewSet):
 
         return response
 
+    @replica_reads
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def feed(self, request):
         user = request.user
@@ -119,6 +123,7 @@ class PostViewSet(viewsets.ModelViewSet):
         serializer = PostSerializer(posts, many=True, context=self.get_serializer_context())
         return Response(serializer.data)
     
+    @replica_reads
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def explore(self, request):
         user = request.user
@@ -137,6 +142,24 @@ class PostViewSet(viewsets.ModelViewSet):
         serializer = PostSerializer(posts, many=True, context=self.get_serializer_context())
         return Response(serializer.data)
         
+    @replica_reads
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Caption search (``?q=``), ranked by relevance and recency."""
+        query = request.query_params.get('q', '').strip()
+        posts = search_captions(
+            query,
+            Post.objects.select_related('user', 'user__profile').prefetch_related('tags', 'likes'),
+        )
+
+        page = self.paginate_queryset(posts)
+        if page is not None:
+            serializer = PostSerializer(page, many=True, context=self.get_serializer_context())
+            return self.get_paginated_response(serializer.data)
+
+        serializer = PostSerializer(posts, many=True, context=self.get_serializer_context())
+        return Response(serializer.data)
+
     @action(detail=True, methods=['POST'], permission_classes=[permissions.IsAuthenticated])
     def like(self, request, pk=None):
         post = self.get_object()
@@ -201,12 +224,49 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
 
+    @replica_reads
     @action(detail=False, methods=['get'], url_path='trending')
     def trending(self, request):
-        tags = (
-            Tag.objects.annotate(postCount=Count("posts"))
-            .filter(postCount__gt=0)
-            .order_by("-postCount")[:20]
-        )
+        tags = Tag.objects.filter(post_count__gt=0).order_by("-post_count")[:20]
         serializer = self.get_serializer(tags, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(serializer.data)
+
+
+async def paginated_posts_response(request, posts):
+    """Async counterpart of the paginated post list responses in PostViewSet."""
+    paginator = AsyncPageNumberPagination()
+    page = await paginator.paginate(posts, request)
+    if page is None:
+        return invalid_page_response()
+
+    data = await run_in_worker(lambda: PostSerializer(page, many=True, context={'request': request}).data)
+    return paginator.get_paginated_response(data)
+
+
+@replica_reads
+class FeedView(AsyncAPIView):
+    """Async PostViewSet.feed."""
+
+    async def get(self, request):
+        user = request.user
+        # Lấy danh sách ID người dùng mà mình đang follow + chính mình
+        following_ids = [
+            following_id async for following_id in user.following.values_list('following__id', flat=True)
+        ]
+        following_ids.append(user.id)  # thêm bài viết của chính mình
+        posts = Post.objects.filter(
+            user__id__in=following_ids
+        ).select_related('user', 'user__profile').prefetch_related('tags', 'likes').order_by('-posted')
+        return await paginated_posts_response(request, posts)
+
+
+@replica_reads
+class ExploreView(AsyncAPIView):
+    """Async PostViewSet.explore."""
+
+    async def get(self, request):
+        # Lọc các bài viết KHÔNG phải của user hiện tại
+        posts = Post.objects.exclude(user=request.user).select_related(
+            'user', 'user__profile'
+        ).prefetch_related('tags', 'likes').order_by('-posted')
+        return await paginated_posts_response(request, posts)
@@ -0,0 +1,203 @@
+"""Prefix index for user search, kept in Redis sorted sets.
+
+Every username, username part (split on ``.``, ``_`` and ``-``) and full-name
+word is normalized (lowercased, accents stripped) and each of its prefixes
+gets a sorted set ``search:users:p:<prefix>`` scored by follower count:
+
+    search:users:p:ng   -> {12: 340, 7: 95, ...}
+    search:users:p:ngu  -> {12: 340, ...}
+
+A query is answered with one ``ZREVRANGE`` (or ``ZINTERSTORE`` for several
+words), so it costs the same whatever the size of the ``Profile`` table.
+``search:users:terms`` remembers each user's indexed terms, so a rename only
+touches the prefixes that changed.
+
+The index is maintained by ``search.signals`` and built from scratch by the
+``rebuild_user_autocomplete`` command. A rebuild writes ``search:users:build:*``
+keys and renames them over the live ones at the end, so searches are answered
+from the old index until then.
+"""
+import re
+import unicodedata
+
+from backend.redis_client import get_redis
+
+PREFIX_KEY = "search:users:p:"
+TERMS_KEY = "search:users:terms"
+BUILD_PREFIX_KEY = "search:users:build:p:"
+BUILD_TERMS_KEY = "search:users:build:terms"
+# Longer prefixes are not indexed; longer query words are checked against the terms instead
+MAX_PREFIX_LENGTH = 20
+
+_TERM_SPLIT = re.compile(r"[\s._\-]+")
+
+
+def normalize(text) -> str:
+    """Lowercase ``text`` and strip accents, so "Nguyễn Đức" matches "nguyen duc"."""
+    text = (text or "").lower().replace("đ", "d")
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def user_terms(username, full_name) -> set:
+    username = normalize(username)
+    terms = {username} if username else set()
+    terms.update(_TERM_SPLIT.split(username))
+    terms.update(_TERM_SPLIT.split(normalize(full_name)))
+    terms.discard("")
+    return terms
+
+
+def prefixes(terms) -> set:
+    return {term[:length] for term in terms for length in range(1, min(len(term), MAX_PREFIX_LENGTH) + 1)}
+
+
+def query_words(query) -> list:
+    return [word for word in _TERM_SPLIT.split(normalize(query)) if word]
+
+
+def index_user(user_id, username, full_name, follower_count, client=None):
+    """Add or refresh one user in the index."""
+    client = client or get_redis()
+    terms = user_terms(username, full_name)
+    old = client.hget(TERMS_KEY, user_id)
+    old_terms = set(old.decode().split()) if old else set()
+
+    pipe = client.pipeline(transaction=False)
+    for prefix in prefixes(old_terms) - prefixes(terms):
+        pipe.zrem(PREFIX_KEY + prefix, user_id)
+    for prefix in prefixes(terms):
+        pipe.zadd(PREFIX_KEY + prefix, {user_id: follower_count})
+    pipe.hset(TERMS_KEY, user_id, " ".join(sorted(terms)))
+    pipe.execute()
+
+
+def index_users(rows, client=None, prefix_key=PREFIX_KEY, terms_key=TERMS_KEY):
+    """Bulk-add ``(user_id, username, full_name, follower_count)`` rows to an empty index."""
+    client = client or get_redis()
+    pipe = client.pipeline(transaction=False)
+    for user_id, username, full_name, follower_count in rows:
+        terms = user_terms(username, full_name)
+        for prefix in prefixes(terms):
+            pipe.zadd(prefix_key + prefix, {user_id: follower_count})
+        pipe.hset(terms_key, user_id, " ".join(sorted(terms)))
+    pipe.execute()
+
+
+def _delete_matching(client, pattern, keep=frozenset()) -> int:
+    deleted = 0
+    batch = []
+    for key in client.scan_iter(match=pattern, count=1000):
+        if key in keep:
+            continue
+        batch.append(key)
+        if len(batch) >= 1000:
+            deleted += client.delete(*batch)
+            batch = []
+    if batch:
+        deleted += client.delete(*batch)
+    return deleted
+
+
+def start_rebuild(client=None):
+    """Drop the keys of an interrupted rebuild; the live index is left alone."""
+    client = client or get_redis()
+    _delete_matching(client, BUILD_PREFIX_KEY + "*")
+    client.delete(BUILD_TERMS_KEY)
+
+
+def build_users(rows, client=None):
+    """``index_users`` into the rebuild keys."""
+    index_users(rows, client, prefix_key=BUILD_PREFIX_KEY, terms_key=BUILD_TERMS_KEY)
+
+
+def finish_rebuild(client=None) -> int:
+    """Rename the rebuilt keys over the live index and drop stale prefixes; return the prefix count.
+
+    Each ``RENAME`` replaces one prefix atomically, so a search running during
+    the swap sees the old or the new set for every prefix, never an empty one.
+    """
+    client = client or get_redis()
+    # SCAN may return a key twice, and renaming it a second time would fail
+    built = list(dict.fromkeys(client.scan_iter(match=BUILD_PREFIX_KEY + "*", count=1000)))
+    live = [PREFIX_KEY.encode() + key[len(BUILD_PREFIX_KEY):] for key in built]
+
+    for start in range(0, len(built), 1000):
+        pipe = client.pipeline(transaction=False)
+        for key, live_key in zip(built[start:start + 1000], live[start:start + 1000]):
+            pipe.rename(key, live_key)
+        pipe.execute()
+
+    if client.exists(BUILD_TERMS_KEY):
+        client.rename(BUILD_TERMS_KEY, TERMS_KEY)
+    else:
+        client.delete(TERMS_KEY)
+    # Prefixes of names nobody has any more
+    _delete_matching(client, PREFIX_KEY + "*", keep=set(live))
+    return len(built)
+
+
+def remove_user(user_id, client=None):
+    client = client or get_redis()
+    old = client.hget(TERMS_KEY, user_id)
+    if old is None:
+        return
+    pipe = client.pipeline(transaction=False)
+    for prefix in prefixes(old.decode().split()):
+        pipe.zrem(PREFIX_KEY + prefix, user_id)
+    pipe.hdel(TERMS_KEY, user_id)
+    pipe.execute()
+
+
+def add_followers(user_id, delta, client=None):
+    """Shift a user's rank by ``delta`` followers in every prefix they are indexed under."""
+    client = client or get_redis()
+    old = client.hget(TERMS_KEY, user_id)
+    if old is None:
+        return
+    pipe = client.pipeline(transaction=False)
+    for prefix in prefixes(old.decode().split()):
+        pipe.zadd(PREFIX_KEY + prefix, {user_id: delta}, xx=True, incr=True)
+    pipe.execute()
+
+
+def search_user_ids(query, limit=10, exclude_id=None, offset=0, within=None) -> list:
+    """Ids of users whose terms start with every word of ``query``, most followed first.
+
+    ``within`` is the key of another sorted set of user ids (e.g. a user's mutual
+    follows) that results must also belong to; the intersection runs in Redis.
+    """
+    words = query_words(query)
+    if not words:
+        return []
+    client = get_redis()
+    # Fetch from the top so exclusion and term checks can't shift pages
+    fetch = offset + limit + (1 if exclude_id is not None else 0)
+    keys = [PREFIX_KEY + word[:MAX_PREFIX_LENGTH] for word in dict.fromkeys(words)]
+    needs_check = any(len(word) > MAX_PREFIX_LENGTH for word in words)
+    if needs_check:
+        # Truncated prefixes over-match: fetch extra candidates to filter below
+        fetch *= 5
+
+    if len(keys) == 1 and within is None:
+        ids = client.zrevrange(keys[0], 0, fetch - 1)
+    else:
+        # Words may hit different terms ("nguyen van" -> first and last name): intersect.
+        # ``within`` gets weight 0 so the follower-count scores still rank the result.
+        weights = {key: 1 for key in keys}
+        if within is not None:
+            weights[within] = 0
+        temp_key = f"search:users:tmp:{'|'.join(weights)}"
+        pipe = client.pipeline()
+        pipe.zinterstore(temp_key, weights, aggregate="MAX")
+        pipe.zrevrange(temp_key, 0, fetch - 1)
+        pipe.delete(temp_key)
+        ids = pipe.execute()[1]
+
+    ids = [int(user_id) for user_id in ids if int(user_id) != exclude_id]
+    if needs_check and ids:
+        terms = client.hmget(TERMS_KEY, ids)
+        ids = [
+            user_id for user_id, indexed in zip(ids, terms)
+            if indexed and all(any(term.startswith(word) for term in indexed.decode().split()) for word in words)
+        ]
+    return ids[offset:offset + limit]
@@ -0,0 +1,149 @@
+"""Per-user recent searches cached in Redis in front of ``SearchHistory``.
+
+``search:recent:<user_id>`` is a list of display-ready cards (id, username,
+full name, avatar path, verified flag) as JSON, newest first and capped at
+``RECENT_SEARCHES_CAP`` entries, so opening the search drawer is a single
+``LRANGE`` with no database work. The list always ends with ``LOADED_MARKER``,
+which caches an empty history too. A missing list is rebuilt from
+``SearchHistory``, which stays the durable record: the API writes the cache
+first and queues the matching ``SearchHistory`` write on the single-worker
+``background`` executor, which applies writes in order.
+
+``search:recent:by:<searched_user_id>`` is the set of users whose lists hold
+that user's card. ``search.signals`` evicts those lists when the user renames,
+changes their profile or is deleted, and the next read reloads them.
+"""
+import json
+
+from django.conf import settings
+
+from backend.executors import ExecutorSaturated, submit
+from backend.redis_client import get_redis
+from search.models import SearchHistory
+
+LOADED_MARKER = "_loaded"
+
+
+def recent_key(user_id) -> str:
+    return f"search:recent:{user_id}"
+
+
+def searched_by_key(searched_user_id) -> str:
+    return f"search:recent:by:{searched_user_id}"
+
+
+def card(profile) -> dict:
+    return {
+        "id": profile.user_id,
+        "username": profile.user.username,
+        "full_name": profile.full_name,
+        "avatar": profile.get_avatar,
+        "is_verified": profile.is_verified,
+    }
+
+
+def _store(user_id, cards, client):
+    key = recent_key(user_id)
+    pipe = client.pipeline()
+    pipe.delete(key)
+    pipe.rpush(key, *[json.dumps(entry) for entry in cards], LOADED_MARKER)
+    pipe.expire(key, settings.RECENT_SEARCHES_TTL)
+    for entry in cards:
+        pipe.sadd(searched_by_key(entry["id"]), user_id)
+        pipe.expire(searched_by_key(entry["id"]), settings.RECENT_SEARCHES_TTL)
+    pipe.execute()
+
+
+def load_from_db(user_id, client) -> list:
+    history = (
+        SearchHistory.objects.filter(user_id=user_id, searched_user__profile__isnull=False)
+        .select_related("searched_user__profile")
+        .order_by("-searched_at")[:settings.RECENT_SEARCHES_CAP]
+    )
+    cards = [card(entry.searched_user.profile) for entry in history]
+    _store(user_id, cards, client)
+    return cards
+
+
+def _decode(raw) -> list:
+    return [json.loads(entry) for entry in raw if entry != LOADED_MARKER.encode()]
+
+
+def _load(user_id, client) -> list:
+    raw = client.lrange(recent_key(user_id), 0, -1)
+    if not raw:
+        return load_from_db(user_id, client)
+    return _decode(raw)
+
+
+def get_recent(user_id, limit=None) -> list:
+    """Cards of the users ``user_id`` searched for most recently, newest first."""
+    limit = limit or settings.RECENT_SEARCHES_LIMIT
+    client = get_redis()
+    # One past the limit, so a shorter list's marker shows it is loaded
+    raw = client.lrange(recent_key(user_id), 0, limit)
+    if not raw:
+        return load_from_db(user_id, client)[:limit]
+    return _decode(raw)[:limit]
+
+
+def _in_background(func, *args):
+    try:
+        submit("background", func, *args)
+    except ExecutorSaturated:
+        func(*args)
+
+
+def _save_history(user_id, searched_user_id, searched_at):
+    SearchHistory.objects.update_or_create(
+        user_id=user_id,
+        searched_user_id=searched_user_id,
+        defaults={"searched_at": searched_at},
+    )
+
+
+def _delete_history(user_id, searched_user_id):
+    SearchHistory.objects.filter(user_id=user_id, searched_user_id=searched_user_id).delete()
+
+
+def remember(user_id, profile, searched_at):
+    """Put ``profile``'s card at the top of the user's recent searches."""
+    client = get_redis()
+    cards = [entry for entry in _load(user_id, client) if entry["id"] != profile.user_id]
+    # Drop the oldest entries past the cap
+    _store(user_id, [card(profile), *cards][:settings.RECENT_SEARCHES_CAP], client)
+
+    _in_background(_save_history, user_id, profile.user_id, searched_at)
+
+
+def forget(user_id, searched_user_id):
+    client = get_redis()
+    cards = _load(user_id, client)
+    _store(user_id, [entry for entry in cards if entry["id"] != searched_user_id], client)
+    _in_background(_delete_history, user_id, searched_user_id)
+
+
+def evict(searched_user_id):
+    """Drop every cached list showing ``searched_user_id``'s card; they reload on the next read."""
+    client = get_redis()
+    key = searched_by_key(searched_user_id)
+    user_ids = client.smembers(key)
+    pipe = client.pipeline()
+    for user_id in user_ids:
+        pipe.delete(recent_key(int(user_id)))
+    pipe.delete(key)
+    pipe.execute()
+
+
+def _clear_history(user_id):
+    SearchHistory.objects.filter(user_id=user_id).delete()
+
+
+def forget_all(user_id) -> int:
+    """Empty the user's recent searches; return how many entries they had."""
+    client = get_redis()
+    count = len(_load(user_id, client))
+    _store(user_id, [], client)
+
+    _in_background(_clear_history, user_id)
+    return count
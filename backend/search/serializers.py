@@ -23,6 +23,10 @@ class RecentSearchUserSerializer(serializers.ModelSerializer):
         return url
 
     def get_is_following(self, obj):
+        # Views pass the viewer's followed ids for the whole page to avoid a query per user
+        following_ids = self.context.get('following_ids')
+        if following_ids is not None:
+            return obj.user_id in following_ids
         request_user = self.context.get('request').user
         return obj.is_following(request_user) if request_user.is_authenticated else False
 
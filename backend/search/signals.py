@@ -0,0 +1,106 @@
+import logging
+
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from search import autocomplete, recent, typeahead
+from users.models import Follow, Profile
+
+logger = logging.getLogger("django")
+
+
+def _indexes(update_fields, field):
+    # Saves limited to other fields (last_login, avatar, theme, ...) can't change the indexed terms
+    return update_fields is None or field in update_fields
+
+
+@receiver(post_save, sender=Profile)
+def index_profile(sender, instance, update_fields=None, **kwargs):
+    if not _indexes(update_fields, "full_name"):
+        return
+    try:
+        autocomplete.index_user(
+            instance.user_id,
+            instance.user.username,
+            instance.full_name,
+            instance.follower_count,
+        )
+    except Exception as e:
+        logger.error(f"Autocomplete index update failed for user {instance.user_id}: {e}")
+
+
+@receiver(post_save, sender=User)
+def index_username(sender, instance, created, update_fields=None, **kwargs):
+    # New users are indexed once their profile is created
+    if created or not _indexes(update_fields, "username"):
+        return
+    profile = Profile.objects.filter(user=instance).first()
+    if profile is not None:
+        index_profile(Profile, profile)
+
+
+@receiver(post_delete, sender=Profile)
+def unindex_profile(sender, instance, **kwargs):
+    try:
+        autocomplete.remove_user(instance.user_id)
+    except Exception as e:
+        logger.error(f"Autocomplete index removal failed for user {instance.user_id}: {e}")
+
+
+# Profile fields shown on recent search cards
+CARD_FIELDS = {"full_name", "avatar", "is_verified"}
+
+
+def _evict_recent(user_id):
+    try:
+        recent.evict(user_id)
+    except Exception as e:
+        logger.error(f"Recent searches eviction failed for user {user_id}: {e}")
+
+
+@receiver(post_save, sender=Profile)
+def refresh_recent_card(sender, instance, created, update_fields=None, **kwargs):
+    if not created and (update_fields is None or CARD_FIELDS & set(update_fields)):
+        _evict_recent(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def refresh_recent_username(sender, instance, created, update_fields=None, **kwargs):
+    if not created and _indexes(update_fields, "username"):
+        _evict_recent(instance.id)
+
+
+@receiver(post_delete, sender=Profile)
+def drop_recent_card(sender, instance, **kwargs):
+    _evict_recent(instance.user_id)
+
+
+def _add_followers(user_id, delta):
+    try:
+        autocomplete.add_followers(user_id, delta)
+    except Exception as e:
+        logger.error(f"Autocomplete rank update failed for user {user_id}: {e}")
+
+
+@receiver(post_save, sender=Follow)
+def rank_new_follower(sender, instance, created, **kwargs):
+    if created:
+        _add_followers(instance.following_id, 1)
+
+
+@receiver(post_delete, sender=Follow)
+def rank_lost_follower(sender, instance, **kwargs):
+    _add_followers(instance.following_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def refresh_typeahead_graph(sender, instance, **kwargs):
+    # The follower's followed set and the followed user's mutuals both change
+    typeahead.forget_index(instance.follower_id)
+    typeahead.forget_index(instance.following_id)
+    try:
+        typeahead.bump_graph(instance.follower_id, instance.following_id)
+    except Exception as e:
+        logger.error(f"Typeahead graph invalidation failed for {instance.follower_id} -> {instance.following_id}: {e}")
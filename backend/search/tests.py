@@ -1,3 +1,285 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from backend.executors import ExecutorSaturated
+from backend.redis_client import get_redis
+from search import autocomplete, recent, typeahead
+from search.models import SearchHistory
+from search.views import get_recent_searches
+from posts.models import Post
+from users.models import Follow, Profile
+
+
+def make_user(username, **profile_fields):
+    user = User.objects.create_user(username=username, password="x")
+    Profile.objects.create(user=user, **profile_fields)
+    return user
+
+
+def auth_headers(user) -> dict:
+    return {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(user)}"}
+
+
+# Run the queued SearchHistory writes inline, inside the test's transaction
+@mock.patch("search.recent.submit", side_effect=ExecutorSaturated("background"))
+class RecentSearchesTests(TestCase):
+    def setUp(self):
+        get_redis().flushdb()
+        typeahead._indexes.clear()
+        self.viewer = make_user("viewer")
+        self.others = [make_user(f"user{i}", full_name=f"User {i}") for i in range(3)]
+
+    def add(self, user):
+        response = self.client.post("/api/search/recent/add/", {"user_id": user.id}, **auth_headers(self.viewer))
+        self.assertEqual(response.status_code, 200)
+
+    def drawer(self):
+        request = RequestFactory().get("/api/search/", HTTP_HOST="localhost")
+        request.user = self.viewer
+        return get_recent_searches(request)
+
+    def test_newest_first_and_written_through_to_history(self, _submit):
+        for user in self.others:
+            self.add(user)
+        self.add(self.others[0])
+
+        self.assertEqual([card["username"] for card in self.drawer()], ["user0", "user2", "user1"])
+        self.assertEqual(SearchHistory.objects.filter(user=self.viewer).count(), 3)
+
+    def test_cards_reflect_current_profiles_and_follows(self, _submit):
+        self.add(self.others[0])
+        self.drawer()
+        self.others[0].username = "renamed"
+        self.others[0].save()
+        profile = Profile.objects.get(user=self.others[0])
+        profile.full_name = "New Name"
+        profile.is_verified = True
+        profile.save()
+        Follow.objects.create(follower=self.viewer, following=self.others[0])
+
+        [card] = self.drawer()
+        self.assertEqual(
+            (card["username"], card["full_name"], card["is_verified"], card["is_following"]),
+            ("renamed", "New Name", True, True),
+        )
+
+        Follow.objects.filter(follower=self.viewer).delete()
+        self.assertFalse(self.drawer()[0]["is_following"])
+
+    def test_deleted_accounts_drop_out(self, _submit):
+        self.add(self.others[0])
+        self.add(self.others[1])
+        deleted_id = self.others[1].id
+        self.others[1].delete()
+
+        self.assertEqual([card["id"] for card in self.drawer()], [self.others[0].id])
+        self.assertFalse(get_redis().exists(recent.searched_by_key(deleted_id)))
+
+    def test_opening_the_drawer_is_one_cache_read(self, _submit):
+        for user in self.others:
+            self.add(user)
+        Follow.objects.create(follower=self.viewer, following=self.others[1])
+        # Load the viewer's follow graph, which the drawer shares with the typeahead
+        self.drawer()
+
+        client = mock.Mock(wraps=get_redis())
+        with mock.patch("search.recent.get_redis", return_value=client), self.assertNumQueries(0):
+            cards = self.drawer()
+
+        self.assertEqual([call[0] for call in client.method_calls], ["lrange"])
+        self.assertEqual([card["is_following"] for card in cards], [False, True, False])
+        self.assertEqual(cards[0]["avatar"], "http://localhost/static/images/default.jpg")
+
+    def test_missing_cache_is_rebuilt_from_history(self, _submit):
+        now = timezone.now()
+        for age, user in enumerate(self.others):
+            # searched_at is auto_now_add, so backdate with update()
+            history = SearchHistory.objects.create(user=self.viewer, searched_user=user)
+            SearchHistory.objects.filter(id=history.id).update(searched_at=now - timedelta(minutes=age))
+
+        self.assertEqual([card["id"] for card in self.drawer()], [user.id for user in self.others])
+        # Cached from here on
+        SearchHistory.objects.all().delete()
+        self.assertEqual(len(self.drawer()), 3)
+
+    @override_settings(RECENT_SEARCHES_CAP=2)
+    def test_oldest_entries_past_the_cap_are_evicted(self, _submit):
+        for user in self.others:
+            self.add(user)
+
+        self.assertEqual(
+            [card["id"] for card in recent.get_recent(self.viewer.id)], [self.others[2].id, self.others[1].id]
+        )
+
+    def test_forget_and_forget_all(self, _submit):
+        for user in self.others:
+            self.add(user)
+
+        recent.forget(self.viewer.id, self.others[0].id)
+        self.assertEqual(len(self.drawer()), 2)
+        self.assertEqual(recent.forget_all(self.viewer.id), 2)
+        self.assertEqual(self.drawer(), [])
+        self.assertFalse(SearchHistory.objects.filter(user=self.viewer).exists())
+
+
+class UserAutocompleteTests(TestCase):
+    def setUp(self):
+        get_redis().flushdb()
+        self.nguyen = make_user("nguyen.van_a", full_name="Nguyễn Văn An")
+        self.ngo = make_user("ngo_bao", full_name="Ngô Bảo")
+        self.other = make_user("someone", full_name="Other Person")
+
+    def search(self, query, **kwargs):
+        return autocomplete.search_user_ids(query, **kwargs)
+
+    def test_matches_username_parts_and_full_name_words(self):
+        self.assertEqual(self.search("van"), [self.nguyen.id])
+        self.assertEqual(self.search("nguyen.v"), [self.nguyen.id])
+        self.assertEqual(set(self.search("ng")), {self.nguyen.id, self.ngo.id})
+        self.assertEqual(self.search("zz"), [])
+
+    def test_accents_and_case_are_ignored(self):
+        self.assertEqual(self.search("NGUYỄN"), [self.nguyen.id])
+        self.assertEqual(self.search("bảo"), [self.ngo.id])
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.search("nguyen an"), [self.nguyen.id])
+        self.assertEqual(self.search("nguyen bao"), [])
+
+    def test_more_followed_users_rank_first(self):
+        self.assertEqual(len(self.search("ng")), 2)
+        Follow.objects.create(follower=self.other, following=self.ngo)
+        self.assertEqual(self.search("ng"), [self.ngo.id, self.nguyen.id])
+
+        Follow.objects.filter(following=self.ngo).delete()
+        Follow.objects.create(follower=self.other, following=self.nguyen)
+        self.assertEqual(self.search("ng"), [self.nguyen.id, self.ngo.id])
+
+    def test_renames_and_deletes_update_the_index(self):
+        self.ngo.username = "bao.tran"
+        self.ngo.save()
+        self.assertEqual(self.search("tran"), [self.ngo.id])
+
+        profile = Profile.objects.get(user=self.nguyen)
+        profile.full_name = "Le Thi"
+        profile.save()
+        self.assertEqual(self.search("an"), [])
+        self.assertEqual(self.search("thi"), [self.nguyen.id])
+
+        profile.delete()
+        self.assertEqual(self.search("nguyen"), [])
+
+    def test_words_longer_than_indexed_prefixes_are_checked_against_terms(self):
+        long_name = make_user("a" * 25)
+        make_user("a" * 22 + "bcd")
+        self.assertEqual(self.search("a" * 25), [long_name.id])
+
+    def test_exclude_and_offset(self):
+        self.assertEqual(len(self.search("ng", exclude_id=self.ngo.id)), 1)
+        self.assertNotIn(self.ngo.id, self.search("ng", exclude_id=self.ngo.id))
+        self.assertEqual(self.search("ng", limit=1, offset=1), self.search("ng")[1:])
+
+    def test_rebuild_command_restores_the_index(self):
+        Profile.objects.filter(user=self.ngo).update(full_name="Changed Behind Signals")
+        get_redis().flushdb()
+        call_command("rebuild_user_autocomplete", stdout=StringIO())
+
+        self.assertEqual(self.search("behind"), [self.ngo.id])
+        self.assertEqual(self.search("van"), [self.nguyen.id])
+
+    def test_rebuild_serves_the_old_index_until_the_swap(self):
+        Profile.objects.filter(user=self.ngo).update(full_name="Changed Behind Signals")
+        # A user the table no longer has, indexed under prefixes nobody else uses
+        autocomplete.index_user(10**6, "ghost_user", "", 0)
+        seen = []
+        build_users = autocomplete.build_users
+
+        def build_and_search(rows):
+            build_users(rows)
+            seen.append((self.search("van"), self.search("behind")))
+
+        with mock.patch.object(autocomplete, "build_users", side_effect=build_and_search):
+            call_command("rebuild_user_autocomplete", stdout=StringIO())
+
+        self.assertEqual(seen, [([self.nguyen.id], [])])
+        self.assertEqual(self.search("behind"), [self.ngo.id])
+        self.assertEqual(self.search("ghost"), [])
+        self.assertFalse(get_redis().exists(autocomplete.PREFIX_KEY + "ghost"))
+        self.assertFalse(get_redis().hexists(autocomplete.TERMS_KEY, 10**6))
+        self.assertEqual(list(get_redis().scan_iter(match="search:users:build:*")), [])
+
+
+class TypeaheadTests(TestCase):
+    def setUp(self):
+        get_redis().flushdb()
+        typeahead._indexes.clear()
+        self.viewer = make_user("viewer")
+        self.mutual = make_user("ngoc", full_name="Ngoc Anh")
+        self.followed = make_user("nguyen_van", full_name="Nguyen Van")
+        self.stranger = make_user("ngo_famous")
+        fans = [make_user(f"fan{i}") for i in range(3)]
+
+        Follow.objects.create(follower=self.viewer, following=self.mutual)
+        Follow.objects.create(follower=self.mutual, following=self.viewer)
+        Follow.objects.create(follower=self.viewer, following=self.followed)
+        Follow.objects.create(follower=fans[0], following=self.followed)
+        for fan in fans:
+            Follow.objects.create(follower=fan, following=self.stranger)
+
+    def typeahead(self, query, **params):
+        response = self.client.get("/api/search/typeahead/", {"q": query, **params}, **auth_headers(self.viewer))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_mentions_rank_mutuals_then_followed_then_everyone(self):
+        users = self.typeahead("@ng")["users"]
+
+        self.assertEqual([user["username"] for user in users], ["ngoc", "nguyen_van", "ngo_famous"])
+        self.assertEqual([(user["is_following"], user["is_mutual"]) for user in users], [
+            (True, True), (True, False), (False, False),
+        ])
+        self.assertEqual([user["username"] for user in self.typeahead("@ng", limit=1)["users"]], ["ngoc"])
+
+    def test_every_word_must_match_a_followed_user(self):
+        self.assertEqual([user["username"] for user in self.typeahead("@nguyen va")["users"]], ["nguyen_van"])
+        self.assertEqual([user["username"] for user in self.typeahead("@anh")["users"]], ["ngoc"])
+
+    def test_hashtags_and_plain_text(self):
+        Post.objects.create(user=self.viewer, caption="#ngoclan #ngoclan2")
+        Post.objects.create(user=self.viewer, caption="#ngoclan")
+
+        result = self.typeahead("#ngoc")
+        self.assertEqual(result["users"], [])
+        self.assertEqual([tag["name"] for tag in result["tags"]], ["ngoclan", "ngoclan2"])
+
+        result = self.typeahead("ngoc")
+        self.assertEqual([user["username"] for user in result["users"]], ["ngoc"])
+        self.assertEqual(len(result["tags"]), 2)
+
+    def test_follow_changes_refresh_the_index(self):
+        users = self.typeahead("@famous")["users"]
+        self.assertEqual([(user["username"], user["is_following"]) for user in users], [("ngo_famous", False)])
+
+        Follow.objects.create(follower=self.viewer, following=self.stranger)
+        users = self.typeahead("@famous")["users"]
+        self.assertEqual([(user["username"], user["is_following"]) for user in users], [("ngo_famous", True)])
+
+    def test_indexes_are_rebuilt_when_another_process_bumps_the_version(self):
+        index = typeahead.get_index(self.viewer.id)
+        self.assertIs(typeahead.get_index(self.viewer.id), index)
+
+        typeahead.bump_graph(self.viewer.id)
+        self.assertIsNot(typeahead.get_index(self.viewer.id), index)
+
+    @override_settings(TYPEAHEAD_INDEX_SIZE=1)
+    def test_least_recently_used_indexes_are_evicted(self):
+        typeahead.get_index(self.viewer.id)
+        typeahead.get_index(self.mutual.id)
+        self.assertEqual(list(typeahead._indexes), [self.mutual.id])
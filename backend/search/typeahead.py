@@ -0,0 +1,169 @@
+"""Composer typeahead for @mentions, ranked by the viewer's follow graph.
+
+Each viewer's followed users are loaded once into a ``GraphIndex``: a sorted
+list of the normalized terms ``autocomplete.user_terms`` indexes (username,
+username parts, name words), so a prefix lookup is a bisect instead of a
+query. Indexes are built lazily on a viewer's first lookup and kept in a
+per-process LRU of ``TYPEAHEAD_INDEX_SIZE`` viewers for at most
+``TYPEAHEAD_INDEX_TTL`` seconds.
+
+Follow changes bump ``typeahead:graph:<user_id>`` in Redis for both users
+(``search.signals``); every process compares it with the version its index
+was built at and rebuilds a stale index on the next lookup.
+
+Mutual follows rank first, then other followed users, each by follower
+count; remaining slots are filled from the global prefix index.
+"""
+import bisect
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+
+from backend.redis_client import get_redis
+from search import autocomplete
+from users.models import Follow, Profile
+
+# Followed users loaded per viewer (most recently followed first)
+MAX_GRAPH_SIZE = 5000
+VERSION_TTL = 24 * 3600
+
+# Returned when Redis can't be read: keep using the cached index until it expires
+UNKNOWN_VERSION = object()
+
+
+def version_key(user_id) -> str:
+    return f"typeahead:graph:{user_id}"
+
+
+def graph_version(user_id):
+    try:
+        return get_redis().get(version_key(user_id))
+    except Exception:
+        return UNKNOWN_VERSION
+
+
+def bump_graph(*user_ids):
+    """Mark the graph indexes of ``user_ids`` stale in every process."""
+    pipe = get_redis().pipeline(transaction=False)
+    for user_id in user_ids:
+        pipe.incr(version_key(user_id))
+        pipe.expire(version_key(user_id), VERSION_TTL)
+    pipe.execute()
+
+
+def load_graph(user_id) -> list:
+    """Cards of the users ``user_id`` follows, with mutual flags and follower counts."""
+    profiles = (
+        Profile.objects.filter(user__followers__follower_id=user_id)
+        .select_related("user")
+        .annotate(
+            is_mutual=Exists(Follow.objects.filter(follower=OuterRef("user"), following_id=user_id)),
+        )
+        .order_by("-user__followers__followed_at")[:MAX_GRAPH_SIZE]
+    )
+    return [
+        {
+            "id": profile.user_id,
+            "username": profile.user.username,
+            "full_name": profile.full_name,
+            "avatar": profile.get_avatar,
+            "is_verified": profile.is_verified,
+            "is_following": True,
+            "is_mutual": profile.is_mutual,
+            "followers": profile.follower_count,
+        }
+        for profile in profiles
+    ]
+
+
+class GraphIndex:
+    """Prefix index over one viewer's followed users."""
+
+    def __init__(self, users, version):
+        self.version = version
+        self.built_at = time.monotonic()
+        # Mutuals first, then most followed: positions double as ranks
+        self.users = sorted(users, key=lambda user: (not user["is_mutual"], -user["followers"]))
+        self.followed_ids = frozenset(user["id"] for user in self.users)
+        self.user_terms = [autocomplete.user_terms(user["username"], user["full_name"]) for user in self.users]
+        entries = sorted((term, position) for position, terms in enumerate(self.user_terms) for term in terms)
+        self.terms = [term for term, _ in entries]
+        self.positions = [position for _, position in entries]
+
+    def expired(self) -> bool:
+        return time.monotonic() - self.built_at > settings.TYPEAHEAD_INDEX_TTL
+
+    def search(self, words, limit) -> list:
+        """Best-ranked users whose terms start with every word (everyone when ``words`` is empty)."""
+        if not words:
+            return self.users[:limit]
+        first, rest = words[0], words[1:]
+        matches = set()
+        start = bisect.bisect_left(self.terms, first)
+        end = bisect.bisect_left(self.terms, first + "\uffff", start)
+        for position in self.positions[start:end]:
+            if all(any(term.startswith(word) for term in self.user_terms[position]) for word in rest):
+                matches.add(position)
+        return [self.users[position] for position in sorted(matches)[:limit]]
+
+
+# user_id -> GraphIndex, least recently used first
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_index(user_id) -> GraphIndex:
+    version = graph_version(user_id)
+    with _indexes_lock:
+        index = _indexes.get(user_id)
+        if index is not None:
+            _indexes.move_to_end(user_id)
+    if index is not None and not index.expired() and (version is UNKNOWN_VERSION or version == index.version):
+        return index
+
+    index = GraphIndex(load_graph(user_id), version)
+    with _indexes_lock:
+        _indexes[user_id] = index
+        _indexes.move_to_end(user_id)
+        while len(_indexes) > settings.TYPEAHEAD_INDEX_SIZE:
+            _indexes.popitem(last=False)
+    return index
+
+
+def forget_index(user_id):
+    with _indexes_lock:
+        _indexes.pop(user_id, None)
+
+
+def suggest_users(user_id, query, limit) -> list:
+    """Mention candidates for ``query``: the viewer's graph first, then everyone else."""
+    words = autocomplete.query_words(query)
+    users = get_index(user_id).search(words, limit)
+    if len(users) >= limit or not words:
+        return users
+
+    seen = {user["id"] for user in users}
+    seen.add(user_id)
+    try:
+        other_ids = autocomplete.search_user_ids(query, limit + len(seen))
+    except Exception:
+        return users
+    other_ids = [other_id for other_id in other_ids if other_id not in seen][:limit - len(users)]
+    profiles = Profile.objects.select_related("user").in_bulk(other_ids, field_name="user_id")
+    users.extend(
+        {
+            "id": profile.user_id,
+            "username": profile.user.username,
+            "full_name": profile.full_name,
+            "avatar": profile.get_avatar,
+            "is_verified": profile.is_verified,
+            "is_following": False,
+            "is_mutual": False,
+            "followers": profile.follower_count,
+        }
+        for profile in (profiles[other_id] for other_id in other_ids if other_id in profiles)
+    )
+    return users
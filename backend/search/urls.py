@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import SearchAllAPIView, ClearAllRecentSearchAPIView, DeleteRecentSearchAPIView, AddRecentSearchAPIView, SearchUserAPIView
+from .views import SearchAllAPIView, ClearAllRecentSearchAPIView, DeleteRecentSearchAPIView, AddRecentSearchAPIView, SearchUserAPIView, TypeaheadAPIView
 
 urlpatterns = [
     path("", SearchAllAPIView.as_view(), name="search-all"),
@@ -7,4 +7,5 @@ urlpatterns = [
     path("recent/clear/", ClearAllRecentSearchAPIView.as_view(), name="clear_all_searches"),
     path("recent/<int:user_id>/delete/", DeleteRecentSearchAPIView.as_view(), name="delete_recent_search"),
     path("users/", SearchUserAPIView.as_view(), name="search_users"),
+    path("typeahead/", TypeaheadAPIView.as_view(), name="search_typeahead"),
 ]
\ No newline at end of file
@@ -1,16 +1,199 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from django.db.models import Q, Count
+from django.db.models import Q, Count, Exists, OuterRef
 from django.utils import timezone
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
 
-from users.models import Profile
+from users import mutuals
+from users.models import Profile, Follow
 from posts.models import Post, Tag
 from search.models import SearchHistory
+from search import autocomplete, recent, typeahead
 from search.serializers import RecentSearchUserSerializer, MinimalUserSerializer
+from backend.db_router import replica_reads
+from backend.async_views import AsyncAPIView, run_in_worker
+from backend.caching import acached_json, cached_json
+from backend.executors import run_concurrently
+from django.conf import settings
+from django.http import JsonResponse
+import asyncio
+import hashlib
+import logging
 
+logger = logging.getLogger("django")
 
+
+def profiles_in_order(user_ids):
+    profiles = Profile.objects.select_related("user").in_bulk(user_ids, field_name="user_id")
+    return [profiles[user_id] for user_id in user_ids if user_id in profiles]
+
+
+def matching(profiles, query):
+    return profiles.filter(
+        Q(user__username__icontains=query) |
+        Q(full_name__icontains=query)
+    )
+
+
+def find_profiles(query, limit, exclude_user=None, offset=0):
+    """Profiles matching ``query`` from the prefix index, most followed first.
+
+    Falls back to scanning ``Profile`` with ``icontains`` when Redis is unavailable.
+    """
+    try:
+        user_ids = autocomplete.search_user_ids(
+            query, limit, exclude_id=exclude_user.id if exclude_user else None, offset=offset
+        )
+    except Exception as e:
+        logger.error(f"User autocomplete lookup failed, scanning profiles instead: {e}")
+        profiles = matching(Profile.objects.select_related("user"), query)
+        if exclude_user is not None:
+            profiles = profiles.exclude(user=exclude_user)
+        return list(profiles[offset:offset + limit])
+
+    return profiles_in_order(user_ids)
+
+
+def find_mutual_profiles(user, query, limit, offset=0):
+    """``user``'s mutual follows matching ``query`` (all of them when empty).
+
+    Reads the maintained mutual-follow sets; falls back to EXISTS subqueries
+    on ``Follow`` when Redis is unavailable.
+    """
+    try:
+        if query:
+            user_ids = autocomplete.search_user_ids(query, limit, offset=offset, within=mutuals.mutuals_key(user.id))
+        else:
+            user_ids = mutuals.get_mutual_ids(user.id, offset, limit)
+    except Exception as e:
+        logger.error(f"Mutual follow lookup failed for user {user.id}, querying follows instead: {e}")
+        profiles = Profile.objects.filter(
+            Exists(Follow.objects.filter(follower=user, following=OuterRef("user"))),
+            Exists(Follow.objects.filter(follower=OuterRef("user"), following=user)),
+        ).select_related("user")
+        if query:
+            profiles = matching(profiles, query)
+        return list(profiles.order_by("user_id")[offset:offset + limit])
+
+    return profiles_in_order(user_ids)
+
+
+def format_count(count) -> str:
+    return f"{count/1_000_000:.1f}M" if count > 1_000_000 else str(count)
+
+
+def search_users(request, query):
+    profiles = find_profiles(query, 10)
+
+    # is_following depends on the viewer: filled in by apply_follow_status after caching
+    return RecentSearchUserSerializer(
+        profiles,  # ✅ Truyền Profile objects
+        many=True,
+        context={"request": request, "following_ids": frozenset()}
+    ).data
+
+
+def search_tags(query):
+    tags = Tag.objects.filter(name__istartswith=query.lstrip("#")).order_by("-post_count")[:10]
+    return [
+        {
+            "id": tag.id,
+            "name": tag.name,
+            "postCount": format_count(tag.post_count)
+        }
+        for tag in tags
+    ]
+
+
+def search_places(query):
+    places_qs = Post.objects.filter(
+        location__icontains=query
+    ).values("location").annotate(count=Count("id")).order_by("-count").distinct()[:10]
+
+    return [
+        {
+            "id": str(index),
+            "name": place["location"],
+            "postCount": format_count(place["count"])
+        }
+        for index, place in enumerate(places_qs, 1)
+    ]
+
+
+def search_sections(request, query):
+    """The viewer-independent sections of search/all, loaded concurrently."""
+    users, tags, places = run_concurrently(
+        "http",
+        (search_users, request, query),
+        (search_tags, query),
+        (search_places, query),
+    )
+    return {"users": users, "tags": tags, "places": places}
+
+
+async def asearch_sections(request, query):
+    users, tags, places = await asyncio.gather(
+        run_in_worker(search_users, request, query),
+        run_in_worker(search_tags, query),
+        run_in_worker(search_places, query),
+    )
+    return {"users": users, "tags": tags, "places": places}
+
+
+def search_cache_key(request, query) -> str:
+    # Typeahead repeats the same prefixes: case and spacing don't change the results
+    normalized = " ".join(query.lower().split())
+    # Avatar URLs are absolute, so results are per host
+    digest = hashlib.md5(f"{request.get_host()}|{normalized}".encode()).hexdigest()
+    return f"search:all:{digest}"
+
+
+def get_following_ids(user, user_ids) -> set:
+    if not user.is_authenticated or not user_ids:
+        return set()
+    return set(
+        Follow.objects.filter(follower=user, following_id__in=user_ids).values_list("following_id", flat=True)
+    )
+
+
+def apply_follow_status(request, users):
+    following_ids = get_following_ids(request.user, [user["id"] for user in users])
+    return [{**user, "is_following": user["id"] in following_ids} for user in users]
+
+
+def get_recent_searches(request):
+    try:
+        cards = recent.get_recent(request.user.id)
+    except Exception as e:
+        logger.error(f"Recent searches cache read failed for user {request.user.id}, querying history instead: {e}")
+        return load_recent_searches(request)
+
+    # The viewer's typeahead index already holds who they follow
+    following_ids = typeahead.get_index(request.user.id).followed_ids if cards else frozenset()
+    return [
+        {**card, "avatar": request.build_absolute_uri(card["avatar"]), "is_following": card["id"] in following_ids}
+        for card in cards
+    ]
+
+
+def load_recent_searches(request):
+    recent_history = SearchHistory.objects.filter(
+        user=request.user
+    ).select_related("searched_user", "searched_user__profile").order_by("-searched_at")[:settings.RECENT_SEARCHES_LIMIT]
+
+    recent_profiles = [r.searched_user.profile for r in recent_history]
+    return RecentSearchUserSerializer(
+        recent_profiles,
+        many=True,
+        context={
+            "request": request,
+            "following_ids": get_following_ids(request.user, [p.user_id for p in recent_profiles]),
+        }
+    ).data
+
+
+@replica_reads
 class SearchAllAPIView(APIView):
     def get(self, request):
         query = request.GET.get("q", "").strip()
@@ -20,64 +203,62 @@ class SearchAllAPIView(APIView):
         place_results = []
 
         if query:
-            # USERS
-            profiles = Profile.objects.filter(
-                Q(user__username__icontains=query) |
-                Q(full_name__icontains=query)
-            ).select_related("user")[:10]
-
-            user_results = RecentSearchUserSerializer(
-                profiles,  # ✅ Truyền Profile objects
-                many=True,
-                context={"request": request}
-            ).data
-
-            # TAGS
-            tags = Tag.objects.filter(name__icontains=query)[:10]
-            tag_results = [
-                {
-                    "id": tag.id,
-                    "name": tag.name,
-                    "postCount": f"{tag.posts.count()/1_000_000:.1f}M" if tag.posts.count() > 1_000_000 else str(tag.posts.count())
-                }
-                for tag in tags
-            ]
+            sections = cached_json(
+                search_cache_key(request, query),
+                lambda: search_sections(request, query),
+                settings.SEARCH_RESULTS_CACHE_TTL,
+            )
+            user_results = apply_follow_status(request, sections["users"])
+            tag_results = sections["tags"]
+            place_results = sections["places"]
 
-            # PLACES
-            places_qs = Post.objects.filter(
-                location__icontains=query
-            ).values("location").annotate(count=Count("id")).order_by("-count").distinct()[:10]
+        # RECENT SEARCHES
+        recent_searches = []
+        if request.user.is_authenticated and not query:
+            recent_searches = get_recent_searches(request)
 
-            place_results = [
-                {
-                    "id": str(index),
-                    "name": place["location"],
-                    "postCount": f"{place['count']/1_000_000:.1f}M" if place["count"] > 1_000_000 else str(place["count"])
-                }
-                for index, place in enumerate(places_qs, 1)
-            ]
+        return Response({
+            "users": user_results,
+            "tags": tag_results,
+            "places": place_results,
+            "recent_searches": recent_searches
+        })
+
+
+@replica_reads
+class SearchAllAsyncView(AsyncAPIView):
+    """Async SearchAllAPIView: the user, tag and place sections load concurrently."""
+    authentication_required = False
+
+    async def get(self, request):
+        query = request.GET.get("q", "").strip()
+
+        user_results = []
+        tag_results = []
+        place_results = []
+
+        if query:
+            sections = await acached_json(
+                search_cache_key(request, query),
+                lambda: asearch_sections(request, query),
+                settings.SEARCH_RESULTS_CACHE_TTL,
+            )
+            user_results = await run_in_worker(apply_follow_status, request, sections["users"])
+            tag_results = sections["tags"]
+            place_results = sections["places"]
 
         # RECENT SEARCHES
         recent_searches = []
         if request.user.is_authenticated and not query:
-            recent = SearchHistory.objects.filter(
-                user=request.user
-            ).select_related("searched_user", "searched_user__profile").order_by("-searched_at")[:5]
-
-            recent_profiles = [r.searched_user.profile for r in recent]
-            recent_searches = RecentSearchUserSerializer(
-                recent_profiles,
-                many=True,
-                context={"request": request}
-            ).data
+            recent_searches = await run_in_worker(get_recent_searches, request)
 
-        return Response({
+        return JsonResponse({
             "users": user_results,
             "tags": tag_results,
             "places": place_results,
             "recent_searches": recent_searches
         })
-        
+
 
 class AddRecentSearchAPIView(APIView):
     permission_classes = [IsAuthenticated]
@@ -87,34 +268,50 @@ class AddRecentSearchAPIView(APIView):
         if not searched_user_id:
             return Response({"detail": "user_id is required."}, status=status.HTTP_400_BAD_REQUEST)
 
-        if int(searched_user_id) == request.user.id:
+        try:
+            searched_user_id = int(searched_user_id)
+        except (TypeError, ValueError):
+            return Response({"detail": "user_id must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if searched_user_id == request.user.id:
             return Response({"detail": "Cannot search yourself."}, status=status.HTTP_400_BAD_REQUEST)
 
+        profile = Profile.objects.select_related("user").filter(user_id=searched_user_id).first()
+        if profile is None:
+            return Response({"detail": "User not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        searched_at = timezone.now()
         try:
+            recent.remember(request.user.id, profile, searched_at)
+        except Exception as e:
+            logger.error(f"Recent searches cache write failed for user {request.user.id}: {e}")
             SearchHistory.objects.update_or_create(
                 user=request.user,
                 searched_user_id=searched_user_id,
-                defaults={"searched_at": timezone.now()}
+                defaults={"searched_at": searched_at}
             )
-            return Response({"detail": "Search recorded."}, status=status.HTTP_200_OK)
-        except Exception as e:
-            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"detail": "Search recorded."}, status=status.HTTP_200_OK)
 
 class DeleteRecentSearchAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
     def delete(self, request, user_id):
         try:
+            recent.forget(request.user.id, user_id)
+        except Exception as e:
+            logger.error(f"Recent searches cache delete failed for user {request.user.id}: {e}")
             SearchHistory.objects.filter(user=request.user, searched_user_id=user_id).delete()
-            return Response({"detail": "Recent search deleted."})
-        except Exception:
-            return Response({"detail": "Error deleting search."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"detail": "Recent search deleted."})
         
 class ClearAllRecentSearchAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
     def delete(self, request):
-        deleted_count, _ = SearchHistory.objects.filter(user=request.user).delete()
+        try:
+            deleted_count = recent.forget_all(request.user.id)
+        except Exception as e:
+            logger.error(f"Recent searches cache clear failed for user {request.user.id}: {e}")
+            deleted_count, _ = SearchHistory.objects.filter(user=request.user).delete()
         return Response(
             {"detail": f"Deleted {deleted_count} recent search{'es' if deleted_count != 1 else ''}."},
             status=status.HTTP_200_OK
@@ -122,40 +319,68 @@ class ClearAllRecentSearchAPIView(APIView):
         
 class SearchUserAPIView(APIView):
     permission_classes = [IsAuthenticated]
+    page_size = 20
 
     def get(self, request):
         query = request.GET.get("q", "").strip()
         mutual_only = request.GET.get("mutual", "false").lower() == "true"
-        
-        # Base query - exclude current user
-        profiles = Profile.objects.exclude(user=request.user).select_related("user")
-        
-        # Filter for mutual followers if requested
+        try:
+            page = max(int(request.GET.get("page", 1)), 1)
+        except ValueError:
+            page = 1
+        offset = (page - 1) * self.page_size
+
         if mutual_only:
-            from users.models import Follow
-            # Users that current user follows
-            following_ids = list(Follow.objects.filter(
-                follower=request.user
-            ).values_list('following_id', flat=True))
-            
-            # Users that follow current user
-            follower_ids = list(Follow.objects.filter(
-                following=request.user
-            ).values_list('follower_id', flat=True))
-            
-            # Mutual followers (intersection of both sets)
-            mutual_ids = set(following_ids) & set(follower_ids)
-            
-            # Filter profiles to only mutual followers
-            profiles = profiles.filter(user_id__in=mutual_ids)
-        
-        # Apply search query if provided
-        if query:
-            profiles = profiles.filter(
-                Q(user__username__icontains=query) |
-                Q(full_name__icontains=query)
-            )
+            profiles = find_mutual_profiles(request.user, query, self.page_size, offset)
+        elif query:
+            profiles = find_profiles(query, self.page_size, exclude_user=request.user, offset=offset)
+        else:
+            profiles = Profile.objects.exclude(user=request.user).select_related("user").order_by("user_id")
+            profiles = profiles[offset:offset + self.page_size]
 
-        profiles = profiles[:20]
         serializer = MinimalUserSerializer(profiles, many=True, context={"request": request})
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(serializer.data)
+
+
+class TypeaheadAPIView(APIView):
+    """Composer suggestions: ``?q=@ng`` for mentions, ``?q=#tra`` for hashtags, plain text for both."""
+    permission_classes = [IsAuthenticated]
+    default_limit = 8
+    max_limit = 20
+
+    def get(self, request):
+        query = request.GET.get("q", "").strip()
+        try:
+            limit = min(max(int(request.GET.get("limit", self.default_limit)), 1), self.max_limit)
+        except ValueError:
+            limit = self.default_limit
+
+        want_users = not query.startswith("#")
+        want_tags = not query.startswith("@")
+        term = query.lstrip("@#")
+
+        users = []
+        if want_users:
+            users = [
+                {
+                    "id": user["id"],
+                    "username": user["username"],
+                    "full_name": user["full_name"],
+                    "avatar": request.build_absolute_uri(user["avatar"]),
+                    "is_verified": user["is_verified"],
+                    "is_following": user["is_following"],
+                    "is_mutual": user["is_mutual"],
+                }
+                for user in typeahead.suggest_users(request.user.id, term, limit)
+            ]
+
+        tags = []
+        if want_tags and term:
+            # Tags are the same for every viewer: share them briefly per prefix
+            tags = cached_json(
+                f"typeahead:tags:{hashlib.md5(term.lower().encode()).hexdigest()}",
+                lambda: search_tags(term),
+                settings.SEARCH_RESULTS_CACHE_TTL,
+            )[:limit]
+
+        return Response({"users": users, "tags": tags})
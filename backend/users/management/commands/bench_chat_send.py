@@ -0,0 +1,79 @@
+import asyncio
+import statistics
+import time
+
+from channels.layers import get_channel_layer
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from chats.consumers import ChatThreadMixin
+from chats.models import Message, Thread
+
+User = get_user_model()
+
+
+class BenchSender(ChatThreadMixin):
+    """The consumers' send path without a socket: persist, broadcast, inbox updates."""
+
+    def __init__(self, channel_layer):
+        self.channel_layer = channel_layer
+
+
+class Command(BaseCommand):
+    help = "Measure chat message send latency through the consumers' send path."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", required=True, help="Username sending the messages")
+        parser.add_argument("--thread", type=int, required=True, help="Thread id the user belongs to")
+        parser.add_argument("--messages", type=int, default=200, help="Messages to send")
+        parser.add_argument("--concurrency", type=int, default=1, help="Sends in flight at once")
+        parser.add_argument("--keep", action="store_true", help="Keep the sent messages instead of deleting them")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["user"])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user']} does not exist")
+        if not Thread.objects.filter(id=options["thread"], users=user).exists():
+            raise CommandError(f"User {user.username} is not in thread {options['thread']}")
+
+        last_id = Message.objects.order_by("-id").values_list("id", flat=True).first() or 0
+        try:
+            latencies, errors, elapsed = asyncio.run(self.run(user, options))
+        finally:
+            if not options["keep"]:
+                Message.objects.filter(thread_id=options["thread"], sender=user, id__gt=last_id).delete()
+
+        if errors:
+            self.stderr.write(f"{len(errors)} sends failed, first error: {errors[0]!r}")
+        if not latencies:
+            raise CommandError("No message was sent")
+
+        latencies.sort()
+        self.stdout.write(
+            f"{len(latencies)} messages in {elapsed:.2f}s: {len(latencies) / elapsed:.1f} msg/s, "
+            f"p50 {statistics.median(latencies):.1f} ms, p95 {latencies[max(int(len(latencies) * 0.95) - 1, 0)]:.1f} ms, "
+            f"max {latencies[-1]:.1f} ms"
+        )
+
+    async def run(self, user, options):
+        sender = BenchSender(get_channel_layer())
+        await sender.load_sender(user)
+        semaphore = asyncio.Semaphore(options["concurrency"])
+        latencies = []
+        errors = []
+
+        async def send_one(index):
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    await sender.handle_chat_text(options["thread"], user, f"bench message {index}")
+                except Exception as e:
+                    # e.g. ExecutorSaturated at high concurrency: report it, keep measuring the rest
+                    errors.append(e)
+                    return
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(send_one(index) for index in range(options["messages"])))
+        return latencies, errors, time.perf_counter() - started
@@ -0,0 +1,92 @@
+import asyncio
+import statistics
+import time
+
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from chats.views import ConversationListView, ConversationListAsyncView
+from posts.views import PostViewSet, FeedView, ExploreView
+from search.views import SearchAllAPIView, SearchAllAsyncView
+
+User = get_user_model()
+
+# name -> (path, sync view, async view)
+ENDPOINTS = {
+    "feed": ("/api/posts/feed/", PostViewSet.as_view({"get": "feed"}), FeedView.as_view()),
+    "explore": ("/api/posts/explore/", PostViewSet.as_view({"get": "explore"}), ExploreView.as_view()),
+    "conversations": ("/api/chats/conversations/", ConversationListView.as_view(), ConversationListAsyncView.as_view()),
+    "search": ("/api/search/", SearchAllAPIView.as_view(), SearchAllAsyncView.as_view()),
+}
+
+
+class Command(BaseCommand):
+    help = "Compare throughput of the sync (DRF) and async implementations of the heavy read endpoints."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", required=True, help="Username to authenticate as")
+        parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="Comma-separated subset of: " + ", ".join(ENDPOINTS))
+        parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint and mode")
+        parser.add_argument("--concurrency", type=int, default=20, help="Requests in flight at once")
+        parser.add_argument("--query", default="a", help="Search query used for the search endpoint")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["user"])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user']} does not exist")
+
+        names = [name.strip() for name in options["endpoints"].split(",") if name.strip()]
+        unknown = set(names) - set(ENDPOINTS)
+        if unknown:
+            raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+        token = str(AccessToken.for_user(user))
+        self.stdout.write(f"{'endpoint':<15}{'mode':<7}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}")
+        for name in names:
+            path, sync_view, async_view = ENDPOINTS[name]
+            data = {"q": options["query"]} if name == "search" else {}
+            for mode, view in (("sync", sync_view), ("async", async_view)):
+                result = asyncio.run(self.run_mode(view, mode == "async", path, data, token, options))
+                self.stdout.write(
+                    f"{name:<15}{mode:<7}{result['throughput']:>10.1f}{result['p50']:>10.1f}{result['p95']:>10.1f}{result['errors']:>8}"
+                )
+
+    async def run_mode(self, view, is_async, path, data, token, options):
+        # RequestFactory's default "testserver" host is usually not in ALLOWED_HOSTS
+        host = next((h for h in settings.ALLOWED_HOSTS if h and "*" not in h), "localhost")
+        factory = RequestFactory(HTTP_HOST=host)
+        semaphore = asyncio.Semaphore(options["concurrency"])
+        latencies = []
+        errors = 0
+
+        async def one_request():
+            nonlocal errors
+            request = factory.get(path, data, HTTP_AUTHORIZATION=f"Bearer {token}")
+            async with semaphore:
+                started = time.perf_counter()
+                if is_async:
+                    response = await view(request)
+                else:
+                    # How Django's ASGI handler runs a sync view (rendering included)
+                    async with ThreadSensitiveContext():
+                        response = await sync_to_async(lambda: view(request).render())()
+                latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one_request() for _ in range(options["requests"])))
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            "throughput": len(latencies) / elapsed if elapsed else 0.0,
+            "p50": statistics.median(latencies),
+            "p95": latencies[int(len(latencies) * 0.95) - 1] if latencies else 0.0,
+            "errors": errors,
+        }
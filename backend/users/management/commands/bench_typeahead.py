@@ -0,0 +1,54 @@
+import random
+import statistics
+import string
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from rest_framework_simplejwt.tokens import AccessToken
+
+from search import typeahead
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Time the composer typeahead endpoint for one viewer, cold and warm."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", required=True, help="Username of the viewer")
+        parser.add_argument("--runs", type=int, default=500, help="Timed requests")
+        parser.add_argument("--host", default="localhost", help="Host header for the test client")
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options["user"]).first()
+        if user is None:
+            raise CommandError(f"No user named {options['user']}")
+
+        client = Client(HTTP_HOST=options["host"], HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+        random.seed(42)
+        queries = [
+            f"{random.choice('@#')}{''.join(random.choices(string.ascii_lowercase, k=random.randint(1, 3)))}"
+            for _ in range(options["runs"])
+        ]
+
+        typeahead.forget_index(user.id)
+        started = time.perf_counter()
+        client.get("/api/search/typeahead/", {"q": "@"})
+        cold = (time.perf_counter() - started) * 1000
+        self.stdout.write(f"{len(typeahead.get_index(user.id).users)} followed users, cold request {cold:.1f} ms")
+
+        latencies = []
+        for query in queries:
+            started = time.perf_counter()
+            response = client.get("/api/search/typeahead/", {"q": query})
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f"{query!r} returned {response.status_code}")
+        latencies.sort()
+        p99 = latencies[max(int(len(latencies) * 0.99) - 1, 0)]
+        self.stdout.write(
+            f"{len(latencies)} warm requests: p50 {statistics.median(latencies):.1f} ms, "
+            f"p99 {p99:.1f} ms, max {latencies[-1]:.1f} ms"
+        )
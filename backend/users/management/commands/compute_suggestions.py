@@ -0,0 +1,67 @@
+import os
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+
+from users.models import Profile, Suggestion
+from users.recommendations import friend_of_friend, load_graph, reason
+
+POPULAR_REASON = "Suggested for you"
+
+
+class Command(BaseCommand):
+    help = "Recompute every user's friend-of-friend suggestions and store them for ProfileViewSet.suggested."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=20, help="Suggestions stored per user")
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Users scored per sparse product")
+        parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Scoring processes (1 runs inline)")
+
+    def handle(self, *args, **options):
+        top_n = options["top"]
+        started = time.perf_counter()
+        user_ids, following = load_graph()
+        self.stdout.write(
+            f"Loaded {len(user_ids)} users and {following.nnz} follows in {time.perf_counter() - started:.1f}s"
+        )
+        if not len(user_ids):
+            return
+
+        usernames = dict(Profile.objects.values_list("user_id", "user__username"))
+        # Users without enough friend-of-friend candidates are topped up with popular accounts
+        popular_ids = list(
+            Profile.objects.order_by("-follower_count").values_list("user_id", flat=True)[:top_n * 5]
+        )
+
+        # Workers are forked: don't let them inherit open database connections
+        connections.close_all()
+        stored = 0
+        for start, stop, results in friend_of_friend(following, top_n, options["chunk_size"], options["workers"]):
+            by_user = defaultdict(list)
+            for user, candidate, score, intermediary in results:
+                by_user[user].append((int(user_ids[candidate]), score, reason(usernames[int(user_ids[intermediary])], score)))
+
+            suggestions = []
+            for user in range(start, stop):
+                user_id = int(user_ids[user])
+                picks = by_user[user]
+                if len(picks) < top_n:
+                    followed = set(user_ids[following.indices[following.indptr[user]:following.indptr[user + 1]]].tolist())
+                    taken = {suggested_id for suggested_id, _, _ in picks} | followed | {user_id}
+                    picks += [(popular_id, 0, POPULAR_REASON) for popular_id in popular_ids if popular_id not in taken]
+                suggestions.extend(
+                    Suggestion(user_id=user_id, suggested_user_id=suggested_id, score=score, rank=rank, reason=text)
+                    for rank, (suggested_id, score, text) in enumerate(picks[:top_n])
+                )
+
+            with transaction.atomic():
+                Suggestion.objects.filter(user__gte=int(user_ids[start]), user__lte=int(user_ids[stop - 1])).delete()
+                Suggestion.objects.bulk_create(suggestions, batch_size=5000)
+            stored += len(suggestions)
+            self.stdout.write(f"  {stop}/{len(user_ids)} users")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored {stored} suggestions in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,184 @@
+import signal
+import time
+import logging
+
+from channels.layers import get_channel_layer
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.db.models import Case, When, Value, DateTimeField
+from django.utils import timezone
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from backend.events import publish_user_event, INBOX
+from backend.redis_client import get_redis
+from users.models import Profile
+from users.presence import get_presence_audience, user_id_from_key
+
+logger = logging.getLogger("django")
+
+
+class PresenceExpiryListener:
+    """Turn expired ``presence:<user_id>`` keys into offline transitions.
+
+    A presence key only expires when no connection refreshed it within
+    ``PRESENCE_TTL`` (e.g. the socket died without a clean ``disconnect``),
+    so every expiry event means the user went offline. Offline broadcasts are
+    sent immediately; ``Profile.last_seen`` writes are buffered and flushed in
+    a single UPDATE per batch.
+    """
+
+    def __init__(self, redis, channel_layer=None, batch_size=200, flush_interval=2.0):
+        self.redis = redis
+        self.channel_layer = channel_layer or get_channel_layer()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = {}
+        self.last_flush = time.monotonic()
+        self.running = True
+
+    @property
+    def db(self) -> int:
+        return int(self.redis.connection_pool.connection_kwargs.get("db", 0) or 0)
+
+    @property
+    def channel(self) -> str:
+        return f"__keyevent@{self.db}__:expired"
+
+    def ensure_keyspace_events(self):
+        """Enable expired-key notifications if the server has them switched off."""
+        current = self.redis.config_get("notify-keyspace-events").get("notify-keyspace-events", "")
+        if isinstance(current, bytes):
+            current = current.decode()
+        if "E" in current and ("x" in current or "A" in current):
+            return current
+        flags = "".join(sorted(set(current) | {"E", "x"}))
+        self.redis.config_set("notify-keyspace-events", flags)
+        logger.info(f"Enabled Redis keyspace events: {flags}")
+        return flags
+
+    def handle_expired_key(self, key):
+        user_id = user_id_from_key(key)
+        if user_id is None:
+            return None
+
+        # The user may have reconnected between expiry and delivery of the event
+        if self.redis.exists(key):
+            return None
+
+        now = timezone.now()
+        self.pending[user_id] = now
+        self.broadcast_offline(user_id, now)
+        return user_id
+
+    def broadcast_offline(self, user_id, at_time):
+        try:
+            close_old_connections()
+            audience = get_presence_audience(user_id)
+        except Exception as e:
+            logger.error(f"Failed to load presence audience for user {user_id}: {e}")
+            return
+
+        last_active_iso = at_time.isoformat()
+        for partner_id in audience:
+            try:
+                publish_user_event(
+                    partner_id,
+                    INBOX,
+                    {
+                        "type": "presence_update",
+                        "user_id": user_id,
+                        "online": False,
+                        "last_active": last_active_iso,
+                    },
+                    self.channel_layer,
+                )
+            except Exception as e:
+                logger.error(f"Failed to broadcast offline status of user {user_id} to {partner_id}: {e}")
+
+    def should_flush(self) -> bool:
+        if not self.pending:
+            return False
+        if len(self.pending) >= self.batch_size:
+            return True
+        return time.monotonic() - self.last_flush >= self.flush_interval
+
+    def flush(self) -> int:
+        self.last_flush = time.monotonic()
+        if not self.pending:
+            return 0
+
+        batch, self.pending = self.pending, {}
+        try:
+            close_old_connections()
+            updated = Profile.objects.filter(user_id__in=batch.keys()).update(
+                last_seen=Case(
+                    *[When(user_id=user_id, then=Value(seen_at)) for user_id, seen_at in batch.items()],
+                    output_field=DateTimeField(),
+                )
+            )
+            logger.info(f"Flushed last_seen for {updated} users")
+            return updated
+        except Exception as e:
+            logger.error(f"Failed to flush last_seen batch: {e}")
+            # Keep the newest timestamp per user and retry on the next flush
+            for user_id, seen_at in batch.items():
+                self.pending.setdefault(user_id, seen_at)
+            return 0
+
+    def stop(self, *args):
+        self.running = False
+
+    def run(self, poll_timeout=1.0):
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+        logger.info(f"Presence listener subscribed to {self.channel}")
+        try:
+            while self.running:
+                message = pubsub.get_message(timeout=poll_timeout)
+                if message and message.get("type") == "message":
+                    self.handle_expired_key(message["data"])
+                if self.should_flush():
+                    self.flush()
+        finally:
+            self.flush()
+            pubsub.close()
+
+
+class Command(BaseCommand):
+    help = "Listen for expired presence keys, broadcast offline status and batch last_seen writes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--redis-url", default=None, help="Redis URL to listen on (defaults to the 'default' cache connection)")
+        parser.add_argument("--batch-size", type=int, default=200, help="Flush last_seen once this many users are pending")
+        parser.add_argument("--flush-interval", type=float, default=2.0, help="Max seconds between last_seen flushes")
+        parser.add_argument("--configure", action="store_true", help="Enable 'notify-keyspace-events Ex' on the server if needed")
+        parser.add_argument("--retry-delay", type=float, default=5.0, help="Seconds to wait before reconnecting to Redis")
+
+    def get_redis(self, url):
+        if url:
+            import redis
+
+            return redis.Redis.from_url(url)
+        return get_redis()
+
+    def handle(self, *args, **options):
+        listener = PresenceExpiryListener(
+            self.get_redis(options["redis_url"]),
+            batch_size=options["batch_size"],
+            flush_interval=options["flush_interval"],
+        )
+        signal.signal(signal.SIGTERM, listener.stop)
+        signal.signal(signal.SIGINT, listener.stop)
+
+        self.stdout.write(f"Listening for presence expiries on {listener.channel}...")
+        while listener.running:
+            try:
+                if options["configure"]:
+                    listener.ensure_keyspace_events()
+                listener.run()
+            except RedisConnectionError as e:
+                logger.error(f"Presence listener lost Redis connection: {e}")
+                if listener.running:
+                    time.sleep(options["retry_delay"])
+
+        self.stdout.write(self.style.SUCCESS("Presence listener stopped."))
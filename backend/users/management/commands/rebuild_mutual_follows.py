@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, OuterRef, Subquery
+
+from users import mutuals
+from users.models import Follow
+
+
+class Command(BaseCommand):
+    help = "Rebuild the Redis mutual-follow sets from the Follow table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000, help="Pairs written per Redis pipeline")
+
+    def handle(self, *args, **options):
+        deleted = mutuals.clear_mutuals()
+        self.stdout.write(f"Cleared {deleted} mutual-follow sets")
+
+        # Each mutual pair once: the follow from the lower id, joined to its reverse
+        reverse = Follow.objects.filter(follower=OuterRef("following"), following=OuterRef("follower"))
+        pairs = Follow.objects.filter(follower_id__lt=F("following_id")).annotate(
+            reverse_at=Subquery(reverse.values("followed_at")[:1])
+        ).filter(reverse_at__isnull=False).order_by("id").values_list("follower_id", "following_id", "followed_at", "reverse_at")
+
+        batch = []
+        total = 0
+        for follower_id, following_id, followed_at, reverse_at in pairs.iterator(chunk_size=options["batch_size"]):
+            # Mutual since the later of the two follows
+            batch.append((follower_id, following_id, max(followed_at, reverse_at).timestamp()))
+            if len(batch) >= options["batch_size"]:
+                mutuals.add_pairs(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            mutuals.add_pairs(batch)
+            total += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} mutual follow pairs"))
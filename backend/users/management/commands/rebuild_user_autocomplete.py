@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from search import autocomplete
+from users.models import Profile
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the Redis prefix index used by user search from the Profile table. "
+        "Searches keep using the old index until the new one is swapped in."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Profiles indexed per Redis pipeline")
+
+    def handle(self, *args, **options):
+        autocomplete.start_rebuild()
+        rows = Profile.objects.order_by("user_id").values_list("user_id", "user__username", "full_name", "follower_count")
+
+        batch = []
+        total = 0
+        for row in rows.iterator(chunk_size=options["batch_size"]):
+            batch.append(row)
+            if len(batch) >= options["batch_size"]:
+                autocomplete.build_users(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            autocomplete.build_users(batch)
+            total += len(batch)
+
+        prefix_count = autocomplete.finish_rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} users under {prefix_count} prefixes"))
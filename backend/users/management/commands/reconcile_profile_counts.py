@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Post
+from users.models import Follow, Profile
+
+
+def count(model, field):
+    rows = model.objects.filter(**{field: OuterRef("user_id")}).order_by().values(field).annotate(n=Count("id")).values("n")
+    return Coalesce(Subquery(rows), 0)
+
+
+class Command(BaseCommand):
+    help = "Recompute Profile post, follower and following counts and fix any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only report profiles whose stored counts are wrong")
+
+    def handle(self, *args, **options):
+        counts = {
+            "post_count": lambda: count(Post, "user"),
+            "follower_count": lambda: count(Follow, "following"),
+            "following_count": lambda: count(Follow, "follower"),
+        }
+        drifted = Profile.objects.annotate(
+            **{f"actual_{field}": expression() for field, expression in counts.items()}
+        ).filter(
+            ~Q(post_count=F("actual_post_count"))
+            | ~Q(follower_count=F("actual_follower_count"))
+            | ~Q(following_count=F("actual_following_count"))
+        ).select_related("user")
+
+        fixed = 0
+        for profile in drifted.iterator():
+            changes = ", ".join(
+                f"{field} {getattr(profile, field)} -> {getattr(profile, f'actual_{field}')}"
+                for field in counts
+                if getattr(profile, field) != getattr(profile, f"actual_{field}")
+            )
+            self.stdout.write(f"{profile.user.username}: {changes}")
+            if not options["dry_run"]:
+                # Recount at write time so follows and posts since the scan are included
+                Profile.objects.filter(pk=profile.pk).update(
+                    **{field: expression() for field, expression in counts.items()}
+                )
+            fixed += 1
+
+        action = "Found" if options["dry_run"] else "Fixed"
+        self.stdout.write(self.style.SUCCESS(f"{action} {fixed} profiles with wrong counts"))
@@ -0,0 +1,54 @@
+# Generated by Django 5.1.2 on 2026-10-19 10:18
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counts(apps, schema_editor):
+    Profile = apps.get_model('users', 'Profile')
+    Follow = apps.get_model('users', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+
+    def count(model, field):
+        rows = model.objects.filter(**{field: OuterRef('user_id')}).order_by().values(field).annotate(n=Count('id')).values('n')
+        return Coalesce(Subquery(rows), 0)
+
+    Profile.objects.update(
+        post_count=count(Post, 'user'),
+        follower_count=count(Follow, 'following'),
+        following_count=count(Follow, 'follower'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_tag_post_count'),
+        ('users', '0004_add_theme_field'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='follower_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['-follower_count'], name='users_profile_followers_idx'),
+        ),
+    ]
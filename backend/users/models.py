@@ -1,7 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.templatetags.static import static
-from posts.models import Post
 from PIL import Image
 import os
 
@@ -20,6 +19,9 @@ ALLOW_CHOICES = [
 def user_directory_path(instance, filename):
     return f'user_{instance.user.id}/{filename}'
 
+COUNT_FIELDS = ('post_count', 'follower_count', 'following_count')
+
+
 class Profile(models.Model):
     user = models.OneToOneField(User, related_name='profile', on_delete=models.CASCADE)
     full_name = models.CharField(max_length=400, null=True, blank=True)
@@ -46,7 +48,23 @@ class Profile(models.Model):
     # Saved posts (bookmarks)
     saved_posts = models.ManyToManyField('posts.Post', related_name='saved_by', blank=True)
 
+    # Maintained by users.signals with F() updates; reconcile with `manage.py reconcile_profile_counts`
+    post_count = models.PositiveIntegerField(default=0)
+    follower_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-follower_count'], name='users_profile_followers_idx'),
+        ]
+
     def save(self, *args, **kwargs):
+        # A full save of an instance loaded earlier must not overwrite counts changed since
+        if not self._state.adding and not args and not kwargs.get('update_fields') and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in COUNT_FIELDS
+            ]
         super().save(*args, **kwargs)
         if self.avatar and os.path.exists(self.avatar.path):
             img = Image.open(self.avatar.path)
@@ -65,15 +83,15 @@ class Profile(models.Model):
 
     @property
     def get_post_count(self):
-        return Post.objects.filter(user=self.user).count()
+        return self.post_count
 
     @property
     def get_follower_count(self):
-        return self.user.followers.count()
+        return self.follower_count
 
     @property
     def get_following_count(self):
-        return self.user.following.count()
+        return self.following_count
     
     def is_self(self, request_user):
         return self.user == request_user
@@ -91,6 +109,31 @@ class Follow(models.Model):
 
     class Meta:
         unique_together = ('follower', 'following')
+        indexes = [
+            # Followers / following lists page newest-first (users.pagination)
+            models.Index(fields=['following', '-followed_at'], name='users_follow_following_at_idx'),
+            models.Index(fields=['follower', '-followed_at'], name='users_follow_follower_at_idx'),
+        ]
 
     def __str__(self):
         return f"{self.follower.username} → {self.following.username}"
+
+
+class Suggestion(models.Model):
+    """A precomputed "suggested for you" entry, written by ``manage.py compute_suggestions``."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='suggestions')
+    suggested_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='suggested_to')
+    # Followed users of ``user`` who follow ``suggested_user`` (0 for popular fill-ins)
+    score = models.PositiveIntegerField(default=0)
+    rank = models.PositiveSmallIntegerField()
+    reason = models.CharField(max_length=200)
+    computed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'suggested_user')
+        indexes = [
+            models.Index(fields=['user', 'rank'], name='users_suggestion_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.suggested_user_id} for {self.user_id}"
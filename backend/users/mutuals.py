@@ -0,0 +1,64 @@
+"""Each user's mutual follows, kept in Redis sorted sets.
+
+``mutuals:<user_id>`` holds the ids of users who follow ``user_id`` and are
+followed back, scored by when the follow became mutual (newest first when
+listed). ``users.signals`` keeps the sets current on follow and unfollow, and
+the ``rebuild_mutual_follows`` command rebuilds them from the ``Follow`` table.
+Search intersects a set with the prefix index (``search.autocomplete``), so
+accounts with huge follower lists are filtered inside Redis.
+"""
+from backend.redis_client import get_redis
+
+KEY_PREFIX = "mutuals:"
+
+
+def mutuals_key(user_id) -> str:
+    return f"{KEY_PREFIX}{user_id}"
+
+
+def add_mutual(user_id, other_id, since, client=None):
+    """Record that ``user_id`` and ``other_id`` follow each other since ``since`` (a timestamp)."""
+    client = client or get_redis()
+    pipe = client.pipeline(transaction=False)
+    pipe.zadd(mutuals_key(user_id), {other_id: since})
+    pipe.zadd(mutuals_key(other_id), {user_id: since})
+    pipe.execute()
+
+
+def remove_mutual(user_id, other_id, client=None):
+    client = client or get_redis()
+    pipe = client.pipeline(transaction=False)
+    pipe.zrem(mutuals_key(user_id), other_id)
+    pipe.zrem(mutuals_key(other_id), user_id)
+    pipe.execute()
+
+
+def get_mutual_ids(user_id, offset=0, limit=20) -> list:
+    """A page of ``user_id``'s mutual follows, most recent first."""
+    ids = get_redis().zrevrange(mutuals_key(user_id), offset, offset + limit - 1)
+    return [int(mutual_id) for mutual_id in ids]
+
+
+def add_pairs(pairs, client=None):
+    """Bulk-add ``(user_id, other_id, since)`` mutual pairs."""
+    client = client or get_redis()
+    pipe = client.pipeline(transaction=False)
+    for user_id, other_id, since in pairs:
+        pipe.zadd(mutuals_key(user_id), {other_id: since})
+        pipe.zadd(mutuals_key(other_id), {user_id: since})
+    pipe.execute()
+
+
+def clear_mutuals(client=None) -> int:
+    """Delete every mutual-follow set; return how many were removed."""
+    client = client or get_redis()
+    deleted = 0
+    batch = []
+    for key in client.scan_iter(match=f"{KEY_PREFIX}*", count=1000):
+        batch.append(key)
+        if len(batch) >= 1000:
+            deleted += client.delete(*batch)
+            batch = []
+    if batch:
+        deleted += client.delete(*batch)
+    return deleted
@@ -0,0 +1,14 @@
+from rest_framework.pagination import CursorPagination
+
+
+class FollowCursorPagination(CursorPagination):
+    """Keyset pagination over ``Follow`` rows, most recent follow first.
+
+    Pages walk the ``(following, followed_at)`` and ``(follower, followed_at)``
+    indexes; ``next`` and ``previous`` carry an opaque cursor and no COUNT
+    query is issued.
+    """
+    page_size = 30
+    max_page_size = 100
+    page_size_query_param = 'limit'
+    ordering = ('-followed_at', '-id')
@@ -1,56 +1,97 @@
 from django.conf import settings
-from django_redis import get_redis_connection
+
+from backend.redis_client import get_redis
+
+
+PRESENCE_KEY_PREFIX = "presence:"
+
+# Lua scripts shared by the sync API below and users.presence_async, so both
+# update counters and TTLs atomically with identical semantics.
+INCREMENT_SCRIPT = """
+local val = redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return val
+"""
+
+DECREMENT_SCRIPT = """
+local val = redis.call('DECR', KEYS[1])
+if val <= 0 then
+    redis.call('DEL', KEYS[1])
+    return 0
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return val
+"""
+
+# Returns {count, created}: created is 1 when the key was missing and got set to 1
+REFRESH_SCRIPT = """
+if redis.call('EXPIRE', KEYS[1], ARGV[1]) == 1 then
+    return {tonumber(redis.call('GET', KEYS[1])) or 0, 0}
+end
+redis.call('SET', KEYS[1], 1, 'EX', ARGV[1])
+return {1, 1}
+"""
 
 
 def _key(user_id: int) -> str:
-    return f"presence:{user_id}"
+    return f"{PRESENCE_KEY_PREFIX}{user_id}"
+
+
+def user_id_from_key(key) -> int | None:
+    """Return the user id encoded in a presence key, or None if it is not one."""
+    if isinstance(key, bytes):
+        key = key.decode()
+    if not key.startswith(PRESENCE_KEY_PREFIX):
+        return None
+    try:
+        return int(key[len(PRESENCE_KEY_PREFIX):])
+    except ValueError:
+        return None
+
+
+def _run(script: str, user_id: int):
+    return get_redis().register_script(script)(keys=[_key(user_id)], args=[settings.PRESENCE_TTL])
 
 
 def increment_presence(user_id: int) -> int:
     """Increment presence counter for a user and return new count. Also (re)set TTL."""
-    key = _key(user_id)
-    redis = get_redis_connection("default")
-    # Use pipeline to make INCR and EXPIRE happen together
-    with redis.pipeline() as pipe:
-        pipe.incr(key)
-        pipe.expire(key, settings.PRESENCE_TTL)
-        val, _ = pipe.execute()
-    return int(val)
+    return int(_run(INCREMENT_SCRIPT, user_id))
 
 
 def decrement_presence(user_id: int) -> int:
     """Decrement presence counter for a user and return new count (>=0)."""
-    key = _key(user_id)
-    redis = get_redis_connection("default")
-    val = redis.decr(key)
-    if val <= 0:
-        redis.delete(key)
-        return 0
-    # keep TTL up-to-date when user remains present
-    redis.expire(key, settings.PRESENCE_TTL)
-    return int(val)
+    return int(_run(DECREMENT_SCRIPT, user_id))
 
 
 def refresh_presence(user_id: int) -> int:
     """Refresh presence TTL without incrementing connection count. If key doesn't exist set it to 1."""
-    key = _key(user_id)
-    redis = get_redis_connection("default")
-    # If key exists, just update TTL
-    if redis.exists(key):
-        redis.expire(key, settings.PRESENCE_TTL)
-        try:
-            return int(redis.get(key) or 0)
-        except Exception:
-            val = redis.get(key)
-            return int(val) if val is not None else 0
-
-    # Key didn't exist: set to 1 with TTL
-    redis.set(key, 1, ex=settings.PRESENCE_TTL)
-    return 1
+    count, _created = _run(REFRESH_SCRIPT, user_id)
+    return int(count)
 
 
 def is_user_online(user_id: int) -> bool:
-    # keep using Django cache API for reads
-    from django.core.cache import cache
+    # Counters are written with the raw client (no cache key prefix), so read them the same way
+    return bool(get_redis().exists(_key(user_id)))
+
+
+def get_online_user_ids(user_ids) -> set[int]:
+    """Return the subset of ``user_ids`` that is online, in one round trip."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return set()
+    pipe = get_redis().pipeline(transaction=False)
+    for user_id in user_ids:
+        pipe.exists(_key(user_id))
+    return {user_id for user_id, online in zip(user_ids, pipe.execute()) if online}
+
+
+def get_presence_audience(user_id: int) -> list[int]:
+    """Return ids of users sharing at least one thread with ``user_id`` (single query)."""
+    from chats.models import Thread
 
-    return bool(cache.get(_key(user_id), 0))
+    return list(
+        Thread.users.through.objects.filter(thread__users__id=user_id)
+        .exclude(user_id=user_id)
+        .values_list("user_id", flat=True)
+        .distinct()
+    )
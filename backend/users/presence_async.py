@@ -0,0 +1,69 @@
+"""asyncio-native presence API for WebSocket consumers.
+
+Mirrors ``users.presence`` but talks to Redis through ``redis.asyncio`` so
+connect, disconnect and heartbeat handling never block the event loop. Views
+and other sync code keep using ``users.presence``; both share the same keys
+and Lua scripts.
+"""
+from django.conf import settings
+
+from backend.redis_client import get_async_redis, get_async_script
+from users.presence import (
+    INCREMENT_SCRIPT,
+    DECREMENT_SCRIPT,
+    REFRESH_SCRIPT,
+    _key,
+)
+
+
+async def _run(script: str, user_id: int):
+    return await get_async_script(script)(keys=[_key(user_id)], args=[settings.PRESENCE_TTL])
+
+
+async def increment_presence(user_id: int) -> int:
+    """Increment presence counter for a user and return new count. Also (re)set TTL."""
+    return int(await _run(INCREMENT_SCRIPT, user_id))
+
+
+async def decrement_presence(user_id: int) -> int:
+    """Decrement presence counter for a user and return new count (>=0)."""
+    return int(await _run(DECREMENT_SCRIPT, user_id))
+
+
+async def refresh_presence(user_id: int) -> tuple[int, bool]:
+    """Refresh presence TTL without incrementing the count.
+
+    Returns ``(count, created)``; ``created`` is True when the key had expired
+    and was recreated with a count of 1 (i.e. the user just came back online).
+    """
+    count, created = await _run(REFRESH_SCRIPT, user_id)
+    return int(count), bool(created)
+
+
+async def is_user_online(user_id: int) -> bool:
+    return bool(await get_async_redis().exists(_key(user_id)))
+
+
+async def get_online_user_ids(user_ids) -> set[int]:
+    """Async counterpart of ``users.presence.get_online_user_ids``."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return set()
+    async with get_async_redis().pipeline(transaction=False) as pipe:
+        for user_id in user_ids:
+            pipe.exists(_key(user_id))
+        results = await pipe.execute()
+    return {user_id for user_id, online in zip(user_ids, results) if online}
+
+
+async def get_presence_audience(user_id: int) -> list[int]:
+    """Async counterpart of ``users.presence.get_presence_audience``."""
+    from chats.models import Thread
+
+    queryset = (
+        Thread.users.through.objects.filter(thread__users__id=user_id)
+        .exclude(user_id=user_id)
+        .values_list("user_id", flat=True)
+        .distinct()
+    )
+    return [partner_id async for partner_id in queryset]
@@ -0,0 +1,106 @@
+"""Offline friend-of-friend suggestions over a sparse follow graph.
+
+The graph is loaded into a CSR adjacency matrix ``following`` (row ``i``
+holds the users ``i`` follows). For a chunk of users, ``following[rows] @
+following`` counts, for every candidate, how many of the user's followed
+accounts follow it; the user themself and accounts they already follow are
+dropped and the ``top_n`` best kept, ties going to the most followed.
+Chunks bound the memory of each product and run in a process pool whose
+workers inherit the matrices once, at start-up.
+
+Each suggestion also names its most-followed intermediary, for the
+"Followed by X + N more" reason. ``compute_suggestions`` stores the results
+as ``Suggestion`` rows and ``ProfileViewSet.suggested`` reads them back.
+"""
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy import sparse
+
+from users.models import Follow, Profile
+
+
+def load_graph():
+    """Return ``(user_ids, following)``: profile user ids (sorted) and the CSR adjacency matrix over them."""
+    user_ids = np.fromiter(Profile.objects.order_by("user_id").values_list("user_id", flat=True), dtype=np.int64)
+    edges = np.fromiter(
+        itertools.chain.from_iterable(
+            Follow.objects.values_list("follower_id", "following_id").iterator(chunk_size=10000)
+        ),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+
+    # Map user ids to matrix indices, dropping edges to users without a profile
+    positions = np.searchsorted(user_ids, edges).clip(max=max(len(user_ids) - 1, 0))
+    valid = (user_ids[positions] == edges).all(axis=1) if len(user_ids) else np.zeros(len(edges), dtype=bool)
+    rows, cols = positions[valid, 0], positions[valid, 1]
+    following = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.int32), (rows, cols)),
+        shape=(len(user_ids), len(user_ids)),
+    )
+    following.sort_indices()
+    return user_ids, following
+
+
+def reason(intermediary, score) -> str:
+    if score > 1:
+        return f"Followed by {intermediary} + {score - 1} more"
+    return f"Followed by {intermediary}"
+
+
+# Matrices inherited by pool workers (see _init_worker)
+_graph = {}
+
+
+def _init_worker(following, followers):
+    _graph["following"] = following
+    _graph["followers"] = followers
+    _graph["follower_totals"] = np.diff(followers.indptr)
+
+
+def score_chunk(start, stop, top_n) -> list:
+    """``(user, candidate, score, intermediary)`` index tuples for users ``start``..``stop - 1``, best first."""
+    following = _graph["following"]
+    followers = _graph["followers"]
+    follower_totals = _graph["follower_totals"]
+
+    block = (following[start:stop] @ following).tocsr()
+    results = []
+    for offset, user in enumerate(range(start, stop)):
+        candidates = block.indices[block.indptr[offset]:block.indptr[offset + 1]]
+        scores = block.data[block.indptr[offset]:block.indptr[offset + 1]]
+        followed = following.indices[following.indptr[user]:following.indptr[user + 1]]
+
+        keep = (candidates != user) & ~np.isin(candidates, followed, assume_unique=True)
+        candidates, scores = candidates[keep], scores[keep]
+        if len(candidates) > top_n:
+            top = np.argpartition(-scores, top_n - 1)[:top_n]
+            candidates, scores = candidates[top], scores[top]
+        order = np.lexsort((-follower_totals[candidates], -scores))
+
+        for candidate, score in zip(candidates[order], scores[order]):
+            candidate_followers = followers.indices[followers.indptr[candidate]:followers.indptr[candidate + 1]]
+            via = np.intersect1d(followed, candidate_followers, assume_unique=True)
+            intermediary = via[np.argmax(follower_totals[via])]
+            results.append((user, int(candidate), int(score), int(intermediary)))
+    return results
+
+
+def friend_of_friend(following, top_n=20, chunk_size=2000, workers=None):
+    """Yield ``(start, stop, results)`` per chunk of users, in order; see ``score_chunk``."""
+    followers = following.T.tocsr()
+    followers.sort_indices()
+    size = following.shape[0]
+    starts = list(range(0, size, chunk_size))
+    stops = [min(start + chunk_size, size) for start in starts]
+
+    if workers == 1:
+        _init_worker(following, followers)
+        for start, stop in zip(starts, stops):
+            yield start, stop, score_chunk(start, stop, top_n)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(following, followers)) as pool:
+        for start, stop, results in zip(starts, stops, pool.map(score_chunk, starts, stops, itertools.repeat(top_n))):
+            yield start, stop, results
@@ -173,14 +173,32 @@ class ProfileShortSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(url) 
         return url
 
+class FollowListSerializer(ProfileShortSerializer):
+    """Followers / following rows with the viewer's relationship to each user.
+
+    Views pass ``following_ids`` and ``follower_ids`` for the whole page.
+    """
+    id = serializers.IntegerField(source='user_id', read_only=True)
+    is_following = serializers.SerializerMethodField()
+    follows_you = serializers.SerializerMethodField()
+
+    class Meta(ProfileShortSerializer.Meta):
+        fields = ['id', 'username', 'full_name', 'avatar', 'is_verified', 'is_following', 'follows_you']
+
+    def get_is_following(self, obj):
+        return obj.user_id in self.context['following_ids']
+
+    def get_follows_you(self, obj):
+        return obj.user_id in self.context['follower_ids']
+
 class ProfileSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
     email = serializers.EmailField(source='user.email', read_only=True)
     avatar = serializers.SerializerMethodField()
     avatarFile = serializers.ImageField(write_only=True, required=False)
-    posts_count = serializers.SerializerMethodField()
-    followers_count = serializers.SerializerMethodField()
-    following_count = serializers.SerializerMethodField()
+    posts_count = serializers.IntegerField(source='post_count', read_only=True)
+    followers_count = serializers.IntegerField(source='follower_count', read_only=True)
+    following_count = serializers.IntegerField(read_only=True)
     is_following = serializers.SerializerMethodField()
     is_self = serializers.SerializerMethodField()
     mutual_followers_count = serializers.SerializerMethodField()
@@ -223,15 +241,6 @@ class ProfileSerializer(serializers.ModelSerializer):
         instance.save()
         return instance
     
-    def get_posts_count(self, obj):
-        return obj.get_post_count
-    
-    def get_followers_count(self, obj):
-        return obj.get_follower_count
-    
-    def get_following_count(self, obj):
-        return obj.get_following_count
-    
     def get_is_following(self, obj):
         request_user = self.context.get('request').user
         return obj.is_following(request_user) if request_user.is_authenticated else False
@@ -245,15 +254,11 @@ class ProfileSerializer(serializers.ModelSerializer):
         if not request_user.is_authenticated or request_user == obj.user:
             return 0
 
-        # Người mà request_user đang theo dõi
-        request_user_following_ids = request_user.following.values_list('following_id', flat=True)
-
-        # Người mà profile user đang theo dõi
-        profile_user_following_ids = obj.user.following.values_list('following_id', flat=True)
-
-        # Mutual = cùng follow một số người
-        mutual_ids = set(request_user_following_ids).intersection(profile_user_following_ids)
-        return len(mutual_ids)
+        # Users both follow, counted by the database in one semi-join
+        return Follow.objects.filter(
+            follower=request_user,
+            following_id__in=Follow.objects.filter(follower=obj.user).values('following_id'),
+        ).count()
     
     def get_join_date(self, obj):
         joined = obj.user.date_joined
@@ -284,9 +289,17 @@ class SuggestedUserSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
             return False
+        following_ids = self.context.get('following_ids')
+        if following_ids is not None:
+            return obj.user_id in following_ids
         return Follow.objects.filter(follower=request.user, following=obj.user).exists()
 
     def get_reason(self, obj):
+        # Stored suggestions come with their precomputed reasons
+        reasons = self.context.get('reasons')
+        if reasons is not None:
+            return reasons.get(obj.user_id, "Suggested for you")
+
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
             return "Suggested for you"
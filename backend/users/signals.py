@@ -1,9 +1,19 @@
+import logging
+
+from django.db.models import F
 from django.db.models.signals import post_save, post_delete
+from django.contrib.auth.models import User
 from django.dispatch import receiver
-from .models import Follow
+from rest_framework_simplejwt.settings import api_settings
+from backend.auth import invalidate_cached_user
+from posts.models import Post
+from .models import Follow, Profile
+from . import mutuals
 from notifications.models import Notification
 from notifications.utils import create_notification
 
+logger = logging.getLogger("django")
+
 
 @receiver(post_save, sender=Follow)
 def create_follow_notification(sender, instance, created, **kwargs):
@@ -25,3 +35,62 @@ def delete_follow_notification(sender, instance, **kwargs):
     ).delete()
 
 
+
+
+@receiver(post_save, sender=Follow)
+def add_mutual_follow(sender, instance, created, **kwargs):
+    if not created:
+        return
+    if not Follow.objects.filter(follower_id=instance.following_id, following_id=instance.follower_id).exists():
+        return
+    try:
+        mutuals.add_mutual(instance.follower_id, instance.following_id, instance.followed_at.timestamp())
+    except Exception as e:
+        logger.error(f"Mutual follow update failed for {instance.follower_id} <-> {instance.following_id}: {e}")
+
+
+@receiver(post_delete, sender=Follow)
+def remove_mutual_follow(sender, instance, **kwargs):
+    try:
+        mutuals.remove_mutual(instance.follower_id, instance.following_id)
+    except Exception as e:
+        logger.error(f"Mutual follow removal failed for {instance.follower_id} <-> {instance.following_id}: {e}")
+
+
+# Keep the Profile counts current; the > 0 guards absorb deletes that race or follow a bulk insert
+def _shift_count(user_id, field, delta):
+    profiles = Profile.objects.filter(user_id=user_id)
+    if delta < 0:
+        profiles = profiles.filter(**{f"{field}__gt": 0})
+    profiles.update(**{field: F(field) + delta})
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, **kwargs):
+    if created:
+        _shift_count(instance.following_id, "follower_count", 1)
+        _shift_count(instance.follower_id, "following_count", 1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_removed_follow(sender, instance, **kwargs):
+    _shift_count(instance.following_id, "follower_count", -1)
+    _shift_count(instance.follower_id, "following_count", -1)
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, **kwargs):
+    if created:
+        _shift_count(instance.user_id, "post_count", 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_removed_post(sender, instance, **kwargs):
+    _shift_count(instance.user_id, "post_count", -1)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_auth_user_cache(sender, instance, **kwargs):
+    # Password, is_active and permission changes must not be served from the auth cache
+    invalidate_cached_user(getattr(instance, api_settings.USER_ID_FIELD))
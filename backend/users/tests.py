@@ -1,3 +1,360 @@
-from django.test import TestCase
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from backend.redis_client import get_redis
+from chats.models import Thread
+from users import mutuals, recommendations
+from users.management.commands.presence_listener import PresenceExpiryListener
+from posts.models import Post
+from users.models import Follow, Profile, Suggestion
+
+
+def make_user(username):
+    user = User.objects.create_user(username=username, password="x")
+    Profile.objects.create(user=user)
+    return user
+
+
+def auth_headers(user) -> dict:
+    return {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(user)}"}
+
+
+class PresenceExpiryListenerTests(TransactionTestCase):
+    """Drives the listener loop with the ``__keyevent@<db>__:expired`` messages Redis publishes."""
+
+    def setUp(self):
+        get_redis().flushdb()
+        self.user = make_user("alice")
+        self.partner = make_user("bob")
+        self.outsider = make_user("carol")
+        thread = Thread.objects.create()
+        thread.users.add(self.user, self.partner)
+        self.layer = get_channel_layer()
+        self.inbox = async_to_sync(self.layer.new_channel)()
+        async_to_sync(self.layer.group_add)(f"conversations_{self.partner.id}", self.inbox)
+
+    def run_listener(self, expired_keys, wait_for):
+        """Publish ``expired_keys`` to a running listener; stop once ``wait_for``'s event log exists."""
+        redis = get_redis()
+        listener = PresenceExpiryListener(redis, channel_layer=self.layer, flush_interval=0)
+        worker = threading.Thread(target=listener.run, kwargs={"poll_timeout": 0.05})
+        worker.start()
+        try:
+            deadline = time.monotonic() + 5
+            while not redis.pubsub_numsub(listener.channel)[0][1] and time.monotonic() < deadline:
+                time.sleep(0.01)
+            for key in expired_keys:
+                redis.publish(listener.channel, key)
+            while not redis.exists(f"events:{wait_for.id}") and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            listener.stop()
+            worker.join(timeout=5)
+        return listener
+
+    def test_expiry_broadcasts_offline_to_thread_partners(self):
+        self.run_listener([f"presence:{self.user.id}"], wait_for=self.partner)
+
+        event = async_to_sync(self.layer.receive)(self.inbox)
+        self.assertEqual(event["type"], "presence_update")
+        self.assertEqual(event["user_id"], self.user.id)
+        self.assertFalse(event["online"])
+        self.assertEqual(event["seq"], 1)
+        self.assertIsNotNone(Profile.objects.get(user=self.user).last_seen)
+        self.assertFalse(get_redis().exists(f"events:{self.outsider.id}"))
+
+    def test_reconnected_user_is_not_reported_offline(self):
+        get_redis().set(f"presence:{self.user.id}", 1, ex=60)
+
+        # bob's expiry is published last, so once alice gets it the earlier keys were handled
+        self.run_listener(
+            [f"presence:{self.user.id}", "session:123", f"presence:{self.partner.id}"],
+            wait_for=self.user,
+        )
+
+        self.assertFalse(get_redis().exists(f"events:{self.partner.id}"))
+        self.assertIsNone(Profile.objects.get(user=self.user).last_seen)
+        self.assertIsNotNone(Profile.objects.get(user=self.partner).last_seen)
+
+
+class PresenceFlushTests(TestCase):
+    def setUp(self):
+        get_redis().flushdb()
+
+    def test_flush_writes_every_pending_last_seen_in_one_update(self):
+        users = [make_user(f"user{i}") for i in range(3)]
+        listener = PresenceExpiryListener(get_redis(), channel_layer=get_channel_layer())
+        for user in users:
+            listener.handle_expired_key(f"presence:{user.id}".encode())
+
+        with self.assertNumQueries(1):
+            updated = listener.flush()
+
+        self.assertEqual(updated, 3)
+        self.assertEqual(listener.pending, {})
+        self.assertEqual(Profile.objects.filter(last_seen__isnull=False).count(), 3)
+
+
+class MutualFollowTests(TestCase):
+    def setUp(self):
+        get_redis().flushdb()
+        self.alice, self.bob, self.carol, self.dave = (make_user(name) for name in ("alice", "bob", "carol", "dave"))
+
+    def follow_back(self, user, other):
+        Follow.objects.create(follower=user, following=other)
+        Follow.objects.create(follower=other, following=user)
+
+    def test_pairs_are_added_on_follow_back_and_removed_on_unfollow(self):
+        Follow.objects.create(follower=self.alice, following=self.bob)
+        self.assertEqual(mutuals.get_mutual_ids(self.alice.id), [])
+
+        Follow.objects.create(follower=self.bob, following=self.alice)
+        self.assertEqual(mutuals.get_mutual_ids(self.alice.id), [self.bob.id])
+        self.assertEqual(mutuals.get_mutual_ids(self.bob.id), [self.alice.id])
+
+        Follow.objects.filter(follower=self.alice, following=self.bob).delete()
+        self.assertEqual(mutuals.get_mutual_ids(self.alice.id), [])
+        self.assertEqual(mutuals.get_mutual_ids(self.bob.id), [])
+
+    def test_rebuild_scores_pairs_by_the_later_follow(self):
+        self.follow_back(self.alice, self.bob)
+        self.follow_back(self.alice, self.carol)
+        Follow.objects.create(follower=self.dave, following=self.alice)
+        now = timezone.now()
+        # alice <-> carol became mutual first, so bob is the newest mutual
+        Follow.objects.filter(follower=self.alice, following=self.bob).update(followed_at=now - timedelta(days=5))
+        Follow.objects.filter(follower=self.bob, following=self.alice).update(followed_at=now - timedelta(days=1))
+        Follow.objects.filter(follower=self.alice, following=self.carol).update(followed_at=now - timedelta(days=3))
+        Follow.objects.filter(follower=self.carol, following=self.alice).update(followed_at=now - timedelta(days=4))
+        get_redis().flushdb()
+
+        out = StringIO()
+        call_command("rebuild_mutual_follows", stdout=out)
+
+        self.assertIn("Indexed 2 mutual follow pairs", out.getvalue())
+        self.assertEqual(mutuals.get_mutual_ids(self.alice.id), [self.bob.id, self.carol.id])
+        self.assertEqual(mutuals.get_mutual_ids(self.dave.id), [])
+
+    def test_mutual_user_search(self):
+        self.follow_back(self.alice, self.bob)
+        self.follow_back(self.alice, self.carol)
+        Follow.objects.create(follower=self.dave, following=self.alice)
+
+        def search(**params):
+            response = self.client.get(
+                "/api/search/users/", {"mutual": "true", **params}, **auth_headers(self.alice)
+            )
+            self.assertEqual(response.status_code, 200)
+            return sorted(user["username"] for user in response.json())
+
+        self.assertEqual(search(), ["bob", "carol"])
+        self.assertEqual(search(q="ca"), ["carol"])
+        self.assertEqual(search(q="da"), [])
+        self.assertEqual(search(page=2), [])
+
+        # Without Redis the same answer comes from Follow
+        with mock.patch("users.mutuals.get_redis", side_effect=ConnectionError("down")), \
+                self.assertLogs("django", "ERROR"):
+            self.assertEqual(search(), ["bob", "carol"])
+
+
+class ProfileCountTests(TestCase):
+    def setUp(self):
+        get_redis().flushdb()
+        self.alice, self.bob, self.carol = (make_user(name) for name in ("alice", "bob", "carol"))
+
+    def counts(self, user):
+        return Profile.objects.values_list("post_count", "follower_count", "following_count").get(user=user)
+
+    def test_counts_follow_creates_and_deletes(self):
+        Follow.objects.create(follower=self.bob, following=self.alice)
+        Follow.objects.create(follower=self.carol, following=self.alice)
+        Follow.objects.create(follower=self.alice, following=self.bob)
+        post = Post.objects.create(user=self.alice, caption="hi")
+        Post.objects.create(user=self.alice, caption="again")
+        self.assertEqual(self.counts(self.alice), (2, 2, 1))
+        self.assertEqual(self.counts(self.bob), (0, 1, 1))
+
+        post.delete()
+        Follow.objects.filter(follower=self.bob, following=self.alice).delete()
+        self.assertEqual(self.counts(self.alice), (1, 1, 1))
+        self.assertEqual(self.counts(self.bob), (0, 1, 0))
+
+        # Deleting an account cascades to its follows
+        self.carol.delete()
+        self.assertEqual(self.counts(self.alice), (1, 0, 1))
+
+    def test_stale_profile_saves_keep_current_counts(self):
+        stale = Profile.objects.get(user=self.alice)
+        Follow.objects.create(follower=self.bob, following=self.alice)
+
+        stale.full_name = "Alice"
+        stale.save()
+
+        self.assertEqual(self.counts(self.alice), (0, 1, 0))
+        self.assertEqual(Profile.objects.get(user=self.alice).full_name, "Alice")
+
+    def test_counts_never_go_negative(self):
+        Follow.objects.create(follower=self.bob, following=self.alice)
+        Profile.objects.update(follower_count=0, following_count=0)
+        Follow.objects.all().delete()
+        self.assertEqual(self.counts(self.alice), (0, 0, 0))
+        self.assertEqual(self.counts(self.bob), (0, 0, 0))
+
+    def test_reconcile_repairs_drift(self):
+        Follow.objects.create(follower=self.bob, following=self.alice)
+        Post.objects.create(user=self.alice, caption="hi")
+        Profile.objects.filter(user=self.alice).update(post_count=5, follower_count=0)
+        Profile.objects.filter(user=self.carol).update(following_count=3)
+
+        out = StringIO()
+        call_command("reconcile_profile_counts", "--dry-run", stdout=out)
+        self.assertIn("alice: post_count 5 -> 1, follower_count 0 -> 1", out.getvalue())
+        self.assertIn("Found 2 profiles", out.getvalue())
+        self.assertEqual(self.counts(self.alice), (5, 0, 0))
+
+        call_command("reconcile_profile_counts", stdout=StringIO())
+        self.assertEqual(self.counts(self.alice), (1, 1, 0))
+        self.assertEqual(self.counts(self.bob), (0, 0, 1))
+        self.assertEqual(self.counts(self.carol), (0, 0, 0))
+
+        out = StringIO()
+        call_command("reconcile_profile_counts", stdout=out)
+        self.assertIn("Fixed 0 profiles", out.getvalue())
+
+
+class FollowListPaginationTests(TestCase):
+    def setUp(self):
+        get_redis().flushdb()
+        self.viewer = make_user("viewer")
+        self.star = make_user("star")
+        self.fans = [make_user(f"fan{i}") for i in range(7)]
+        for fan in self.fans:
+            Follow.objects.create(follower=fan, following=self.star)
+        # Several follows share a timestamp, so page boundaries fall inside ties
+        moment = timezone.now()
+        Follow.objects.filter(follower__in=self.fans[:4]).update(followed_at=moment - timedelta(hours=1))
+        Follow.objects.filter(follower__in=self.fans[4:]).update(followed_at=moment)
+
+    def get(self, url, **params):
+        response = self.client.get(url, params, **auth_headers(self.viewer))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def walk(self, url, **params):
+        """Usernames on every page, following ``next`` links."""
+        pages = []
+        data = self.get(url, **params)
+        pages.append([user["username"] for user in data["results"]])
+        while data["next"]:
+            data = self.get(data["next"])
+            pages.append([user["username"] for user in data["results"]])
+        return pages
+
+    def test_pages_cover_every_follower_once_newest_first(self):
+        pages = self.walk("/api/profiles/star/followers/", limit=2)
+
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+        # Newest follow first; ties go to the later follow row
+        self.assertEqual(sum(pages, []), [fan.username for fan in reversed(self.fans[4:])] +
+                         [fan.username for fan in reversed(self.fans[:4])])
+
+    def test_cursor_is_stable_across_inserts_and_deletes(self):
+        first = self.get("/api/profiles/star/followers/", limit=3)
+        seen = [user["username"] for user in first["results"]]
+
+        # A new follow lands before the cursor and an already-seen one goes away
+        Follow.objects.create(follower=self.viewer, following=self.star)
+        Follow.objects.filter(follower__username=seen[0]).delete()
+
+        rest = sum(self.walk(first["next"]), [])
+        self.assertEqual(sorted(seen + rest), sorted(fan.username for fan in self.fans))
+
+    def test_previous_link_returns_to_the_first_page(self):
+        first = self.get("/api/profiles/star/followers/", limit=3)
+        second = self.get(first["next"])
+        self.assertIsNone(first["previous"])
+        self.assertEqual(self.get(second["previous"])["results"], first["results"])
+
+    def test_rows_carry_the_viewers_relationship(self):
+        Follow.objects.create(follower=self.viewer, following=self.fans[6])
+        Follow.objects.create(follower=self.fans[5], following=self.viewer)
+
+        rows = {user["username"]: user for user in self.get("/api/profiles/star/followers/", limit=3)["results"]}
+        self.assertEqual((rows["fan6"]["is_following"], rows["fan6"]["follows_you"]), (True, False))
+        self.assertEqual((rows["fan5"]["is_following"], rows["fan5"]["follows_you"]), (False, True))
+
+    def test_following_list(self):
+        data = self.get("/api/profiles/fan0/following/")
+        self.assertEqual([user["username"] for user in data["results"]], ["star"])
+        self.assertIsNone(data["next"])
+
+
+class SuggestionTests(TransactionTestCase):
+    # compute_suggestions closes the database connections before forking workers
+
+    def setUp(self):
+        get_redis().flushdb()
+        self.viewer, self.amy, self.ben, self.cat, self.dan, self.eve = (
+            make_user(name) for name in ("viewer", "amy", "ben", "cat", "dan", "eve")
+        )
+        for follower, following in [
+            (self.viewer, self.amy), (self.viewer, self.ben),
+            (self.amy, self.ben), (self.amy, self.cat), (self.amy, self.dan),
+            (self.ben, self.cat), (self.ben, self.viewer),
+        ]:
+            Follow.objects.create(follower=follower, following=following)
+
+    def suggestions(self, user):
+        return list(
+            Suggestion.objects.filter(user=user).order_by("rank").values_list("suggested_user__username", "score", "reason")
+        )
+
+    def test_friend_of_friend_excludes_self_and_followed(self):
+        user_ids, following = recommendations.load_graph()
+        position = {int(user_id): index for index, user_id in enumerate(user_ids)}
+        [(start, stop, results)] = recommendations.friend_of_friend(following, top_n=10, workers=1)
+
+        picks = [(candidate, score) for user, candidate, score, _via in results if user == position[self.viewer.id]]
+        # ben and viewer are reachable through amy and ben, but are already followed or the viewer themself
+        self.assertEqual(picks, [(position[self.cat.id], 2), (position[self.dan.id], 1)])
+
+    def test_users_without_profiles_are_left_out(self):
+        Profile.objects.filter(user=self.cat).delete()
+        user_ids, following = recommendations.load_graph()
+        self.assertNotIn(self.cat.id, user_ids.tolist())
+        self.assertEqual(following.nnz, 5)
+
+    def test_compute_suggestions_stores_ranked_picks_with_reasons(self):
+        call_command("compute_suggestions", "--workers", "1", "--top", "3", stdout=StringIO())
+
+        self.assertEqual(self.suggestions(self.viewer), [
+            # ben has more followers than amy, so he names the shared connection
+            ("cat", 2, "Followed by ben + 1 more"),
+            ("dan", 1, "Followed by amy"),
+            ("eve", 0, "Suggested for you"),
+        ])
+        for user in (self.viewer, self.amy, self.ben, self.eve):
+            suggested = {username for username, _score, _reason in self.suggestions(user)}
+            followed = set(Follow.objects.filter(follower=user).values_list("following__username", flat=True))
+            self.assertNotIn(user.username, suggested)
+            self.assertFalse(suggested & followed, user.username)
+
+    def test_suggested_endpoint_drops_users_followed_since(self):
+        call_command("compute_suggestions", "--workers", "1", "--top", "3", stdout=StringIO())
+        Follow.objects.create(follower=self.viewer, following=self.cat)
+
+        response = self.client.get("/api/profiles/suggested/", **auth_headers(self.viewer))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([user["username"] for user in response.json()], ["dan", "eve"])
@@ -11,20 +11,37 @@ from django.utils.decorators import method_decorator
 from rest_framework_simplejwt.views import TokenViewBase
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
-from django.db.models import Q
+from django.db.models import Exists, OuterRef, Q
 from users.models import Profile
 from posts.models import Tag, Post
 
 
-from users.models import Profile, Follow
+from users.models import Profile, Follow, Suggestion
 from users.serializers import (
     UserSerializer, 
     UserRegistrationSerializer,
     ProfileSerializer, 
     PasswordChangeSerializer,
     CustomTokenObtainPairSerializer,
-    ProfileShortSerializer,
+    FollowListSerializer,
 )
+from users.pagination import FollowCursorPagination
+
+
+def get_relationship_ids(viewer, user_ids):
+    """Which of ``user_ids`` the viewer follows, and which follow the viewer, in one query."""
+    if not viewer.is_authenticated or not user_ids:
+        return set(), set()
+    rows = Follow.objects.filter(
+        Q(follower=viewer, following_id__in=user_ids) | Q(follower_id__in=user_ids, following=viewer)
+    ).values_list('follower_id', 'following_id')
+    following_ids, follower_ids = set(), set()
+    for follower_id, following_id in rows:
+        if follower_id == viewer.id:
+            following_ids.add(following_id)
+        else:
+            follower_ids.add(follower_id)
+    return following_ids, follower_ids
 
 class CustomTokenObtainPairView(TokenViewBase):
     serializer_class = CustomTokenObtainPairSerializer
@@ -103,8 +120,7 @@ class ProfileViewSet(viewsets.ModelViewSet):
         pk = self.kwargs.get("pk")
         if pk == "me":
             return self.request.user.profile
-        user = get_object_or_404(User, username=pk)
-        return user.profile
+        return get_object_or_404(self.get_queryset(), user__username=pk)
 
     @action(detail=True, methods=["post"], permission_classes=[permissions.IsAuthenticated])
     def toggle_follow(self, request, pk=None):
@@ -130,26 +146,57 @@ class ProfileViewSet(viewsets.ModelViewSet):
         Follow.objects.filter(follower=follower_user, following=target_user).delete()
         return Response({"detail": "Follower removed"})
 
+    def follow_page(self, request, follows, side):
+        paginator = FollowCursorPagination()
+        page = paginator.paginate_queryset(follows, request, view=self)
+        profiles = [getattr(follow, side).profile for follow in page]
+        following_ids, follower_ids = get_relationship_ids(request.user, [profile.user_id for profile in profiles])
+        serializer = FollowListSerializer(
+            profiles,
+            many=True,
+            context={'request': request, 'following_ids': following_ids, 'follower_ids': follower_ids}
+        )
+        return paginator.get_paginated_response(serializer.data)
+
     @action(detail=True, methods=["get"])
     def followers(self, request, pk=None):
         user = get_object_or_404(User, username=pk)
-        followers = User.objects.filter(following__following=user)
-        profiles = Profile.objects.filter(user__in=followers)
-        serializer = ProfileShortSerializer(profiles, many=True, context={'request': request})
-        return Response(serializer.data)
+        follows = Follow.objects.filter(following=user, follower__profile__isnull=False)\
+            .select_related('follower__profile')
+        return self.follow_page(request, follows, 'follower')
 
     @action(detail=True, methods=["get"])
     def following(self, request, pk=None):
         user = get_object_or_404(User, username=pk)
-        following = User.objects.filter(followers__follower=user)
-        profiles = Profile.objects.filter(user__in=following)
-        serializer = ProfileShortSerializer(profiles, many=True, context={'request': request})
-        return Response(serializer.data)
+        follows = Follow.objects.filter(follower=user, following__profile__isnull=False)\
+            .select_related('following__profile')
+        return self.follow_page(request, follows, 'following')
     
     @action(detail=False, methods=["get"])
     def suggested(self, request):
         user = request.user
+        from users.serializers import SuggestedUserSerializer  # Đảm bảo import
 
+        # Precomputed by `manage.py compute_suggestions`; drop anyone followed since
+        stored = list(
+            Suggestion.objects.filter(user=user, suggested_user__profile__isnull=False)
+            .exclude(Exists(Follow.objects.filter(follower=user, following=OuterRef('suggested_user'))))
+            .select_related('suggested_user__profile')
+            .order_by('rank')[:20]
+        )
+        if stored:
+            serializer = SuggestedUserSerializer(
+                [suggestion.suggested_user.profile for suggestion in stored],
+                many=True,
+                context={
+                    'request': request,
+                    'following_ids': frozenset(),
+                    'reasons': {suggestion.suggested_user_id: suggestion.reason for suggestion in stored},
+                }
+            )
+            return Response(serializer.data)
+
+        # Not computed yet (e.g. a new account): build them live
         following_ids = Follow.objects.filter(
             follower=user
         ).values_list('following_id', flat=True)
@@ -173,7 +220,6 @@ class ProfileViewSet(viewsets.ModelViewSet):
         extra_profiles = Profile.objects.exclude(
             user__in=following_ids
         ).exclude(user=user)\
-        .annotate(follower_count=models.Count('user__followers'))\
         .order_by('-follower_count')[:20].select_related('user')
 
         # Gộp và loại trùng
@@ -187,7 +233,6 @@ class ProfileViewSet(viewsets.ModelViewSet):
             if len(all_profiles) >= 20:
                 break
 
-        from users.serializers import SuggestedUserSerializer  # Đảm bảo import
         serializer = SuggestedUserSerializer(
             all_profiles,
             many=True,
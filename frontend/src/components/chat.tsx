@@ -16,8 +16,6 @@ import { deleteThread, sendMessageWithFile } from "@/lib/services/chats"
 import { useConversationStore } from "@/stores/useConversationStore"
 import type { ChatProps, MessageType, MessageListType } from "@/types/chat"
 
-const PAGE_SIZE = 20
-
 export function Chat({
   chatId,
   username,
@@ -32,7 +30,7 @@ export function Chat({
   const [messages, setMessages] = useState<MessageType[]>([])
   const [newMessage, setNewMessage] = useState("")
   const [isConnected, setIsConnected] = useState(false)
-  const [offset, setOffset] = useState(0)
+  const [oldestId, setOldestId] = useState<number | null>(null)
   const [hasMore, setHasMore] = useState(true)
   const [isLoadingMore, setIsLoadingMore] = useState(false)
   const [shouldScrollToBottom, setShouldScrollToBottom] = useState(true)
@@ -296,20 +294,10 @@ export function Chat({
 
   useEffect(() => {
     async function init() {
-      const firstPage = await getMessages(chatId, 0)
-      const totalCount = firstPage.count
-      const startOffset = Math.max(0, totalCount - PAGE_SIZE)
-
-      if (startOffset === 0) {
-        setMessages(firstPage.results)
-        setOffset(0)
-        setHasMore(false)
-      } else {
-        const lastPage = await getMessages(chatId, startOffset)
-        setMessages(lastPage.results)
-        setOffset(startOffset)
-        setHasMore(true)
-      }
+      const firstPage = await getMessages(chatId)
+      setMessages(firstPage.results)
+      setOldestId(firstPage.results.length > 0 ? firstPage.results[0].id : null)
+      setHasMore(firstPage.has_older)
 
       // Scroll to bottom on initial load
       setShouldScrollToBottom(true)
@@ -345,7 +333,7 @@ export function Chat({
       }
       
       // No need to access messages state here, just use the loaded messages
-      const loadedMessages = startOffset === 0 ? firstPage.results : [];
+      const loadedMessages = firstPage.results;
       
       // Try to find partner ID from messages
       for (const msg of loadedMessages) {
@@ -375,9 +363,7 @@ export function Chat({
     
     // Store scroll height before loading
     const previousScrollHeight = container.scrollHeight
-    const newOffset = Math.max(0, offset - PAGE_SIZE)
-    
-    if (newOffset === offset) {
+    if (oldestId === null) {
       setIsLoadingMore(false)
       return
     }
@@ -386,12 +372,12 @@ export function Chat({
       // Wait a bit before loading to show spinner
       await new Promise(resolve => setTimeout(resolve, 200))
       
-      const data = await getMessages(chatId, newOffset)
+      const data = await getMessages(chatId, oldestId)
       if (data.results.length > 0) {
         setShouldScrollToBottom(false)
         setMessages(prev => [...data.results, ...prev])
-        setOffset(newOffset)
-        setHasMore(newOffset > 0)
+        setOldestId(data.results[0].id)
+        setHasMore(data.has_older)
 
         // After state update, adjust scroll to maintain position
         requestAnimationFrame(() => {
@@ -407,7 +393,7 @@ export function Chat({
     } finally {
       setIsLoadingMore(false)
     }
-  }, [chatId, offset, hasMore, isLoadingMore])
+  }, [chatId, oldestId, hasMore, isLoadingMore])
 
   // Removed auto-scroll loading - now using "Load more" button instead
 
@@ -6,8 +6,8 @@ import { Input } from "@/components/ui/input"
 import { Avatar, AvatarFallback, AvatarImage } from "@/components/ui/avatar"
 import { Button } from "@/components/ui/button"
 import { ScrollArea } from "@/components/ui/scroll-area"
-import { getFollowers, getFollowing, toggleFollowUser, removeFollower } from "@/lib/services/profile"
-import type { ProfileType } from "@/types/profile"
+import { getFollowers, getFollowing, toggleFollowUser, removeFollower, nextCursor } from "@/lib/services/profile"
+import type { FollowUserType } from "@/types/profile"
 import Link from "next/link"
 
 interface FollowersFollowingModalProps {
@@ -25,37 +25,49 @@ export function FollowersFollowingModal({
   type,
   currentUsername
 }: FollowersFollowingModalProps) {
-  const [users, setUsers] = useState<ProfileType[]>([])
-  const [filteredUsers, setFilteredUsers] = useState<ProfileType[]>([])
+  const [users, setUsers] = useState<FollowUserType[]>([])
+  const [filteredUsers, setFilteredUsers] = useState<FollowUserType[]>([])
   const [searchQuery, setSearchQuery] = useState('')
   const [loading, setLoading] = useState(false)
+  const [cursor, setCursor] = useState<string | null>(null)
+  const [isFetchingMore, setIsFetchingMore] = useState(false)
   const [followingMap, setFollowingMap] = useState<Record<string, boolean>>({})
 
+  const filterUsers = (list: FollowUserType[], query: string) => {
+    const q = query.toLowerCase()
+    return list.filter(user => {
+      const username = (user.username || "").toLowerCase()
+      const fullName = (user.full_name || "").toLowerCase()
+      return username.includes(q) || fullName.includes(q)
+    })
+  }
+
+  const fetchPage = (pageCursor?: string | null) =>
+    type === 'followers' ? getFollowers(username, pageCursor) : getFollowing(username, pageCursor)
+
+  // Whether the viewer follows each user comes with every page
+  const addToFollowingMap = (list: FollowUserType[]) => {
+    setFollowingMap(prev => {
+      const map = { ...prev }
+      list.forEach(user => {
+        map[user.username] = user.is_following
+      })
+      return map
+    })
+  }
+
   useEffect(() => {
     if (!isOpen) return
 
     const fetchUsers = async () => {
       try {
         setLoading(true)
-        let data: ProfileType[]
-        
-        if (type === 'followers') {
-          data = await getFollowers(username)
-        } else {
-          data = await getFollowing(username)
-        }
-        
-        setUsers(data)
-        setFilteredUsers(data)
-        
-        // Create following map
-        const map: Record<string, boolean> = {}
-        data.forEach(user => {
-          // For 'following' modal, everyone is following (that's why they appear in this list)
-          // For 'followers' modal, use the actual is_following value from the API
-          map[user.username] = type === 'following' ? true : user.is_following
-        })
-        setFollowingMap(map)
+        const data = await fetchPage()
+        setUsers(data.results)
+        setFilteredUsers(filterUsers(data.results, searchQuery))
+        setCursor(nextCursor(data))
+        setFollowingMap({})
+        addToFollowingMap(data.results)
       } catch (error) {
         console.error(`Failed to fetch ${type}:`, error)
       } finally {
@@ -66,15 +78,27 @@ export function FollowersFollowingModal({
     fetchUsers()
   }, [isOpen, username, type])
 
+  const handleLoadMore = async () => {
+    if (isFetchingMore || !cursor) return
+
+    setIsFetchingMore(true)
+    try {
+      const data = await fetchPage(cursor)
+      const merged = [...users, ...data.results]
+      setUsers(merged)
+      setFilteredUsers(filterUsers(merged, searchQuery))
+      setCursor(nextCursor(data))
+      addToFollowingMap(data.results)
+    } catch (error) {
+      console.error(`Failed to fetch more ${type}:`, error)
+    } finally {
+      setIsFetchingMore(false)
+    }
+  }
+
   const handleSearch = (query: string) => {
     setSearchQuery(query)
-    const q = query.toLowerCase()
-    const filtered = users.filter(user => {
-      const username = (user.username || "").toLowerCase()
-      const fullName = (user.full_name || "").toLowerCase()
-      return username.includes(q) || fullName.includes(q)
-    })
-    setFilteredUsers(filtered)
+    setFilteredUsers(filterUsers(users, query))
   }
 
   const handleToggleFollow = async (targetUsername: string) => {
@@ -178,6 +202,19 @@ export function FollowersFollowingModal({
                     )}
                   </div>
                 ))}
+                {cursor && (
+                  <div className="flex justify-center pt-1">
+                    <Button
+                      variant="ghost"
+                      size="sm"
+                      onClick={handleLoadMore}
+                      disabled={isFetchingMore}
+                      className="text-sm text-muted-foreground"
+                    >
+                      {isFetchingMore ? "Loading..." : "Load more"}
+                    </Button>
+                  </div>
+                )}
               </div>
             )}
         </ScrollArea>
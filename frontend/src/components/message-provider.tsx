@@ -1,7 +1,7 @@
 "use client"
 
 import React, { createContext, useContext, useEffect, useRef } from 'react'
-import { createConversationsSocket } from '@/lib/services/messages'
+import { createConversationsSocket, getConversations } from '@/lib/services/messages'
 import { useConversationStore } from '@/stores/useConversationStore'
 import { useAuth } from '@/components/auth-provider'
 
@@ -66,6 +66,8 @@ export function MessageProvider({ children }: WebSocketProviderProps) {
   const { updateConversation } = useConversationStore()
   const socketRef = useRef<WebSocket | null>(null)
   const reconnectTimeoutRef = useRef<NodeJS.Timeout | null>(null)
+  // Last event seq seen, sent as ?since= on reconnect so missed events are replayed
+  const lastSeqRef = useRef<number | null>(null)
   const [isConnected, setIsConnected] = React.useState(false)
   const [isConnecting, setIsConnecting] = React.useState(false)
 
@@ -113,7 +115,7 @@ export function MessageProvider({ children }: WebSocketProviderProps) {
     setIsConnecting(true)
 
     try {
-      const socket = createConversationsSocket()
+      const socket = createConversationsSocket(lastSeqRef.current)
       socketRef.current = socket
 
       socket.onopen = () => {
@@ -130,6 +132,27 @@ export function MessageProvider({ children }: WebSocketProviderProps) {
         try {
           const data = JSON.parse(event.data)
 
+          // The missed events were trimmed from the server's log: refetch the list instead
+          if (data.type === "resync_required") {
+            lastSeqRef.current = typeof data.seq === 'number' ? data.seq : null
+            getConversations()
+              .then((conversations) => useConversationStore.getState().setConversations(conversations))
+              .catch((error) => console.error("Failed to resync conversations:", error))
+            return
+          }
+          // Replay finished; everything up to data.seq has been delivered
+          if (data.type === "sync") {
+            lastSeqRef.current = data.seq
+            return
+          }
+          // A replayed event can arrive again live; skip anything already seen
+          if (typeof data.seq === 'number') {
+            if (lastSeqRef.current !== null && data.seq <= lastSeqRef.current) {
+              return
+            }
+            lastSeqRef.current = data.seq
+          }
+
           // Handle mark_read_update events to update conversation list immediately
           if (data.type === "mark_read_update" && typeof data.chat_id !== 'undefined') {
             console.log("📖 Received mark_read_update event for chat:", data.chat_id, "unread_count:", data.unread_count);
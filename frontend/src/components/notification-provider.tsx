@@ -3,7 +3,7 @@
 import React, { useRef, useCallback, useEffect } from 'react'
 import { useAuth } from '@/components/auth-provider'
 import { useNotificationStore } from '@/stores/useNotificationStore'
-import { connectNotificationSocket } from '@/lib/services/notifications'
+import { connectNotificationSocket, getNotifications } from '@/lib/services/notifications'
 import { NotificationType } from '@/types/notification'
 
 interface NotificationProviderProps {
@@ -32,6 +32,8 @@ export function NotificationProvider({ children }: NotificationProviderProps) {
   const { addNotification, unreadCount } = useNotificationStore()
   const socketRef = useRef<WebSocket | null>(null)
   const reconnectTimeoutRef = useRef<NodeJS.Timeout | null>(null)
+  // Last event seq seen, sent as ?since= on reconnect so missed notifications are replayed
+  const lastSeqRef = useRef<number | null>(null)
   const [isConnected, setIsConnected] = React.useState(false)
   const [isConnecting, setIsConnecting] = React.useState(false)
 
@@ -81,7 +83,7 @@ export function NotificationProvider({ children }: NotificationProviderProps) {
     setIsConnecting(true)
 
     try {
-      const socket = await connectNotificationSocket()
+      const socket = await connectNotificationSocket(lastSeqRef.current)
       socketRef.current = socket
 
       socket.onopen = () => {
@@ -96,7 +98,29 @@ export function NotificationProvider({ children }: NotificationProviderProps) {
 
       socket.onmessage = (event) => {
         try {
-          const data = JSON.parse(event.data) as NotificationType
+          const frame = JSON.parse(event.data)
+
+          // The missed notifications were trimmed from the server's log: refetch the list instead
+          if (frame.type === 'resync_required') {
+            lastSeqRef.current = typeof frame.seq === 'number' ? frame.seq : null
+            getNotifications()
+              .then((notifications) => useNotificationStore.getState().setNotifications(notifications))
+              .catch((error) => console.error("Failed to resync notifications:", error))
+            return
+          }
+          // Replay finished; everything up to frame.seq has been delivered
+          if (frame.type === 'sync') {
+            lastSeqRef.current = frame.seq
+            return
+          }
+          // A replayed notification can arrive again live; skip anything already seen
+          if (typeof frame.seq === 'number') {
+            if (lastSeqRef.current !== null && frame.seq <= lastSeqRef.current) {
+              return
+            }
+            lastSeqRef.current = frame.seq
+          }
+          const data = frame as NotificationType
 
           // Add notification to store
           addNotification(data)
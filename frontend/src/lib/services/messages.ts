@@ -1,5 +1,5 @@
 import api from "@/lib/api";
-import { MessageType, MessageListType, PaginatedResponse } from "@/types/chat";
+import { MessageType, MessageListType, MessagePage } from "@/types/chat";
 import type { MarkReadResponse, SendFirstMessageResponse } from "@/types/chat";
 
 type ConversationsResponse = MessageListType[] | { conversations: MessageListType[]; errors?: unknown[] }
@@ -31,8 +31,10 @@ export async function createConversation(userId: number): Promise<{ thread_id: n
 }
 
 // Lấy tin nhắn trong một cuộc trò chuyện
-export async function getMessages(threadId: number, offset = 0): Promise<PaginatedResponse<MessageType>> {
-    const res = await api.get<PaginatedResponse<MessageType>>(`/chats/threads/${threadId}/messages/?offset=${offset}`)
+// Without a cursor the latest page is returned; pass beforeId to load older messages
+export async function getMessages(threadId: number, beforeId?: number): Promise<MessagePage<MessageType>> {
+    const params = beforeId ? { before_id: beforeId } : {}
+    const res = await api.get<MessagePage<MessageType>>(`/chats/threads/${threadId}/messages/`, { params })
     return res.data
 }
 export function createChatSocket(chatId: number): WebSocket {
@@ -70,7 +72,8 @@ export function createChatSocket(chatId: number): WebSocket {
     return socket;
 }
 
-export function createConversationsSocket(): WebSocket {
+// Pass the last seq seen on a previous connection to get the missed events replayed
+export function createConversationsSocket(since?: number | null): WebSocket {
   const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
   const host = process.env.NEXT_PUBLIC_WS_HOST || window.location.host;
 
@@ -83,7 +86,8 @@ export function createConversationsSocket(): WebSocket {
 
   // Properly URL encode the token to handle special characters
   const encodedToken = encodeURIComponent(token);
-  const url = `${protocol}://${host}/ws/conversations/?token=${encodedToken}`;
+  const sinceParam = since != null ? `&since=${since}` : '';
+  const url = `${protocol}://${host}/ws/conversations/?token=${encodedToken}${sinceParam}`;
   
   const socket = new WebSocket(url);
 
@@ -99,7 +103,7 @@ export function createConversationsSocket(): WebSocket {
       setTimeout(() => {
         console.log("Reconnecting to WebSocket...");
         // Return value not used here since we're just reconnecting automatically
-        createConversationsSocket();
+        createConversationsSocket(since);
       }, 3000);
     }
   };
@@ -67,7 +67,8 @@ async function refreshAccessTokenIfNeeded(): Promise<string> {
     return token
 }
 
-export async function connectNotificationSocket(): Promise<WebSocket> {
+// Pass the last seq seen on a previous connection to get the missed notifications replayed
+export async function connectNotificationSocket(since?: number | null): Promise<WebSocket> {
     const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws'
     const host = process.env.NEXT_PUBLIC_WS_HOST || window.location.host
 
@@ -83,7 +84,8 @@ export async function connectNotificationSocket(): Promise<WebSocket> {
     }
 
     const encodedToken = encodeURIComponent(token)
-    const url = `${protocol}://${host}/ws/notifications/?token=${encodedToken}`
+    const sinceParam = since != null ? `&since=${since}` : ''
+    const url = `${protocol}://${host}/ws/notifications/?token=${encodedToken}${sinceParam}`
 
     const socket = new WebSocket(url)
 
@@ -1,5 +1,5 @@
 import api from "@/lib/api"
-import type { ProfileType, UpdateProfileInput, SuggestedUserType } from "@/types/profile"
+import type { ProfileType, UpdateProfileInput, SuggestedUserType, FollowPage } from "@/types/profile"
 
 export async function getMyProfile(): Promise<ProfileType> {
   const res = await api.get<ProfileType>("/profiles/me/")
@@ -33,15 +33,20 @@ export async function removeFollower(username: string): Promise<{ detail: string
   return res.data
 }
 
-// get list of followers 
-export async function getFollowers(username: string): Promise<ProfileType[]> {
-  const res = await api.get<ProfileType[]>(`/profiles/${username}/followers/`)
+// cursor of the page after `page`, or null on the last page
+export function nextCursor(page: FollowPage): string | null {
+  return page.next ? new URL(page.next).searchParams.get("cursor") : null
+}
+
+// get a page of followers, newest first
+export async function getFollowers(username: string, cursor?: string | null): Promise<FollowPage> {
+  const res = await api.get<FollowPage>(`/profiles/${username}/followers/`, { params: cursor ? { cursor } : {} })
   return res.data
 }
 
-// get list of following
-export async function getFollowing(username: string): Promise<ProfileType[]> {
-  const res = await api.get<ProfileType[]>(`/profiles/${username}/following/`)
+// get a page of following, newest first
+export async function getFollowing(username: string, cursor?: string | null): Promise<FollowPage> {
+  const res = await api.get<FollowPage>(`/profiles/${username}/following/`, { params: cursor ? { cursor } : {} })
   return res.data
 }
 
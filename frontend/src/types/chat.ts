@@ -50,6 +50,15 @@ export interface PaginatedResponse<T> {
   results: T[]
 }
 
+// Keyset page of thread history (oldest-first); use before_id / after_id to move
+export interface MessagePage<T> {
+  next: string | null
+  previous: string | null
+  has_older: boolean
+  has_newer: boolean
+  results: T[]
+}
+
 export interface MarkReadResponse {
   status: string
   marked_read: number
@@ -39,4 +39,18 @@ export type SuggestedUserType = {
   isVerified: boolean
   reason: string
   isFollowing: boolean
-}
\ No newline at end of file
+}
+export type FollowUserType = {
+  id: number
+  username: string
+  full_name?: string
+  avatar: string
+  is_verified: boolean
+  is_following: boolean
+  follows_you: boolean
+}
+export type FollowPage = {
+  next: string | null
+  previous: string | null
+  results: FollowUserType[]
+}